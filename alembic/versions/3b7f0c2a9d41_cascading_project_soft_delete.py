@@ -0,0 +1,30 @@
+"""Cascading project soft delete
+
+Revision ID: 3b7f0c2a9d41
+Revises: d95b479b8fe9
+Create Date: 2026-10-18 15:02:44.180316
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b7f0c2a9d41'
+down_revision = 'd95b479b8fe9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # a constant server default is a catalog-only change on postgres 11+, the table is not rewritten
+    op.add_column('issue', sa.Column('deleted_with_project', sa.Boolean(), server_default=sa.false(), nullable=False))
+    with op.get_context().autocommit_block():
+        op.create_index('ix_issue_project_id_cascaded', 'issue', ['project_id'], unique=False,
+                        postgresql_where=sa.text('deleted_with_project IS true'), postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_issue_project_id_cascaded', table_name='issue', postgresql_concurrently=True)
+    op.drop_column('issue', 'deleted_with_project')
@@ -0,0 +1,38 @@
+"""Issue title search
+
+Revision ID: 5d2a9c4e7f13
+Revises: 8c1e5f7a2b60
+Create Date: 2026-10-18 19:02:41.318504
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '5d2a9c4e7f13'
+down_revision = '8c1e5f7a2b60'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # a stored generated column is computed for every existing row: this rewrites issue once under
+    # an exclusive lock, so schedule it with the table's size in mind
+    op.add_column('issue', sa.Column(
+        'title_search',
+        postgresql.TSVECTOR(),
+        sa.Computed("to_tsvector('simple'::regconfig, coalesce(title, ''))", persisted=True),
+        nullable=True,
+    ))
+    with op.get_context().autocommit_block():
+        op.create_index('ix_issue_title_search', 'issue', ['title_search'], unique=False,
+                        postgresql_using='gin', postgresql_where=sa.text("is_deleted IS false"),
+                        postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_issue_title_search', table_name='issue', postgresql_concurrently=True)
+    op.drop_column('issue', 'title_search')
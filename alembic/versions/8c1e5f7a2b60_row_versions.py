@@ -0,0 +1,27 @@
+"""Row versions
+
+Revision ID: 8c1e5f7a2b60
+Revises: 3b7f0c2a9d41
+Create Date: 2026-10-18 15:48:12.604187
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c1e5f7a2b60'
+down_revision = '3b7f0c2a9d41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # constant server defaults, existing rows start at version 1 without a table rewrite
+    op.add_column('project', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('issue', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    op.drop_column('issue', 'version')
+    op.drop_column('project', 'version')
@@ -0,0 +1,38 @@
+"""Issue counters
+
+Revision ID: a4e8d1b6c372
+Revises: 5d2a9c4e7f13
+Create Date: 2026-10-18 20:11:27.904615
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4e8d1b6c372'
+down_revision = '5d2a9c4e7f13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('issue_counter',
+    sa.Column('project_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('type', sa.String(), nullable=False),
+    sa.Column('count', sa.Integer(), server_default='0', nullable=False),
+    sa.ForeignKeyConstraint(['project_id'], ['project.id'], ),
+    sa.PrimaryKeyConstraint('project_id', 'status', 'type')
+    )
+    # same rule as IssueCounterCrud.reconcile: an issue counts until it is deleted on its own
+    op.execute(
+        "INSERT INTO issue_counter (project_id, status, type, count) "
+        "SELECT project_id, status, type, count(*) FROM issue "
+        "WHERE NOT (is_deleted IS true AND deleted_with_project IS false) "
+        "GROUP BY project_id, status, type"
+    )
+
+
+def downgrade():
+    op.drop_table('issue_counter')
@@ -0,0 +1,49 @@
+"""Soft delete aware indexes
+
+Revision ID: d95b479b8fe9
+Revises: ece4c41357ec
+Create Date: 2026-10-18 13:21:07.552914
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd95b479b8fe9'
+down_revision = 'ece4c41357ec'
+branch_labels = None
+depends_on = None
+
+LIVE_ROWS = sa.text("is_deleted IS false")
+
+
+def upgrade():
+    # CONCURRENTLY cannot run inside a transaction, but keeps the tables writable while indexes build
+    with op.get_context().autocommit_block():
+        op.create_index('ix_issue_project_id_id', 'issue', ['project_id', 'id'], unique=False,
+                        postgresql_where=LIVE_ROWS, postgresql_concurrently=True)
+        op.create_index('ix_project_owner_id_id', 'project', ['owner_id', 'id'], unique=False,
+                        postgresql_where=LIVE_ROWS, postgresql_concurrently=True)
+        op.create_index('ix_project_assigned_id_id', 'project', ['assigned_id', 'id'], unique=False,
+                        postgresql_where=LIVE_ROWS, postgresql_concurrently=True)
+
+        # duplicates of the primary keys and title indexes no query filters or sorts on
+        op.drop_index('ix_user_id', table_name='user', postgresql_concurrently=True)
+        op.drop_index('ix_project_id', table_name='project', postgresql_concurrently=True)
+        op.drop_index('ix_issue_id', table_name='issue', postgresql_concurrently=True)
+        op.drop_index('ix_project_title', table_name='project', postgresql_concurrently=True)
+        op.drop_index('ix_issue_title', table_name='issue', postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.create_index('ix_issue_title', 'issue', ['title'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_project_title', 'project', ['title'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_issue_id', 'issue', ['id'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_project_id', 'project', ['id'], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_user_id', 'user', ['id'], unique=False, postgresql_concurrently=True)
+
+        op.drop_index('ix_project_assigned_id_id', table_name='project', postgresql_concurrently=True)
+        op.drop_index('ix_project_owner_id_id', table_name='project', postgresql_concurrently=True)
+        op.drop_index('ix_issue_project_id_id', table_name='issue', postgresql_concurrently=True)
@@ -0,0 +1,60 @@
+"""
+Issue import throughput: one POST /api/issue/ per issue versus POST /api/issue/bulk.
+
+    python -m benchmarks.bulk_issue_create --issues 2000 --batch 1000
+
+Runs the app in-process against the database configured in settings.toml.
+"""
+import argparse
+import random
+import string
+import time
+
+from fastapi.testclient import TestClient
+
+from test_project import app
+from test_project.core.db import SessionLocal
+from test_project.crud.project import project as crud_project
+from test_project.crud.user import user as crud_user
+from test_project.models.schemas import ProjectCreate, UserCreate
+
+
+def random_string() -> str:
+    return "".join(random.choices(string.ascii_lowercase, k=32))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--issues", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args()
+
+    with SessionLocal() as db, TestClient(app) as client:
+        user_in = UserCreate(email=f"{random_string()}@bench.com", password=random_string())
+        user = crud_user.create(db, obj=user_in)
+        project = crud_project.create_with_owner(db=db, obj=ProjectCreate(title=random_string()), owner_id=user.id)
+
+        r = client.post("/api/auth/login/token", json={"email": user_in.email, "password": user_in.password})
+        headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+        issues = [
+            {"title": random_string(), "type": "Bug", "status": "To Do", "project_id": project.id}
+            for _ in range(args.issues)
+        ]
+
+        start = time.perf_counter()
+        for issue in issues:
+            client.post("/api/issue/", headers=headers, json=issue).raise_for_status()
+        single_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for i in range(0, len(issues), args.batch):
+            client.post("/api/issue/bulk", headers=headers, json={"issues": issues[i:i + args.batch]}).raise_for_status()
+        bulk_seconds = time.perf_counter() - start
+
+    print(f"single: {args.issues / single_seconds:10.0f} issues/s ({single_seconds:.2f}s)")
+    print(f"bulk:   {args.issues / bulk_seconds:10.0f} issues/s ({bulk_seconds:.2f}s, batch {args.batch})")
+    print(f"speedup: {single_seconds / bulk_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Single-row writes: the old read/encode/setattr/commit/refresh update and query.get delete
+versus CRUDBase.update and CRUDBase.delete, which send one UPDATE ... RETURNING each.
+
+    python -m benchmarks.crud_write --writes 2000
+
+Runs against the database configured in settings.toml.
+"""
+import argparse
+import random
+import string
+import time
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from test_project.core.db import SessionLocal, engine
+from test_project.crud.issue import issue as crud_issue
+from test_project.crud.project import project as crud_project
+from test_project.crud.user import user as crud_user
+from test_project.models.models import Issue
+from test_project.models.schemas import IssueCreate, IssueUpdate, ProjectCreate, UserCreate
+
+
+def random_string() -> str:
+    return "".join(random.choices(string.ascii_lowercase, k=32))
+
+
+def legacy_update(db: Session, *, id: int, obj: IssueUpdate) -> Issue:
+    db_obj = crud_issue.retrieve(db, id=id)
+    obj_data = jsonable_encoder(db_obj)
+    update_data = obj.dict(exclude_unset=True)
+    for field in obj_data:
+        if field in update_data:
+            setattr(db_obj, field, update_data[field])
+    db.add(db_obj)
+    db.commit()
+    db.refresh(db_obj)
+    return db_obj
+
+
+def legacy_delete(db: Session, *, id: int) -> Issue:
+    db_obj = db.query(Issue).get(id)
+    db_obj.is_deleted = True
+    db.commit()
+    return db_obj
+
+
+def current_update(db: Session, *, id: int, obj: IssueUpdate) -> Issue:
+    return crud_issue.update_by_id(db, id=id, obj=obj)
+
+
+def current_delete(db: Session, *, id: int) -> Issue:
+    return crud_issue.delete(db, id=id)
+
+
+def measure(db: Session, ids, update, delete):
+    round_trips = 0
+
+    def count(*args):
+        nonlocal round_trips
+        round_trips += 1
+
+    event.listen(engine, "before_cursor_execute", count)
+    event.listen(engine, "commit", count)
+    try:
+        start = time.perf_counter()
+        for id in ids:
+            update(db, id=id, obj=IssueUpdate(title=random_string()))
+            # a fresh identity map per write, as in a request
+            db.expunge_all()
+        for id in ids:
+            delete(db, id=id)
+            db.expunge_all()
+        seconds = time.perf_counter() - start
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+        event.remove(engine, "commit", count)
+    return seconds, round_trips / (2 * len(ids))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--writes", type=int, default=2000)
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        user = crud_user.create(db, obj=UserCreate(email=f"{random_string()}@bench.com", password=random_string()))
+        project = crud_project.create_with_owner(db=db, obj=ProjectCreate(title=random_string()), owner_id=user.id)
+        issues = [
+            IssueCreate(title=random_string(), type="Bug", status="To Do", project_id=project.id)
+            for _ in range(2 * args.writes)
+        ]
+        ids = crud_issue.create_bulk(db, objs=issues)
+
+        legacy_seconds, legacy_trips = measure(db, ids[:args.writes], legacy_update, legacy_delete)
+        current_seconds, current_trips = measure(db, ids[args.writes:], current_update, current_delete)
+
+    writes = 2 * args.writes
+    print(f"legacy:    {writes / legacy_seconds:8.0f} writes/s, {legacy_trips:.1f} round trips/write")
+    print(f"returning: {writes / current_seconds:8.0f} writes/s, {current_trips:.1f} round trips/write")
+    print(f"speedup: {legacy_seconds / current_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
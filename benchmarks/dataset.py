@@ -0,0 +1,251 @@
+"""
+Synthetic data at production volume: users, projects, issues and sent notifications written with COPY,
+skewed the way real tenants are. Project ownership and issue counts follow a Zipf law, so a few users own
+many projects and a few projects hold most issues while the long tail holds one or none.
+
+    python -m benchmarks.dataset --users 10000 --projects 100000 --issues 2000000 --notifications 500000
+
+Writes to the database configured in settings.toml and commits. Every generated user logs in with
+PASSWORD. tests/test_query_plans.py calls generate() on a connection it rolls back.
+"""
+import argparse
+import csv
+import io
+import itertools
+import json
+import random
+import time
+
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.engine import Connection
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from test_project.core.auth import get_password_hash
+from test_project.core.db import engine
+from test_project.crud.issue_counter import counted
+from test_project.models.models import Issue, IssueCounter
+
+PASSWORD = "password"
+
+# (value, weight)
+STATUSES = [("Done", 60), ("To Do", 25), ("In Progress", 15)]
+TYPES = [("Bug", 50), ("Task", 35), ("Story", 15)]
+# the outbox is mostly delivered history, the worker keeps the pending tail short
+NOTIFICATION_STATUSES = [("sent", 97), ("pending", 2), ("failed", 1)]
+
+COPY_CHUNK = 100000
+
+
+class Dataset:
+    """What generate() wrote: id ranges, and live rows at both ends of the skew to aim queries at."""
+
+    def __init__(
+        self, users: range, projects: range, issues: range, notifications: range, *, heavy_user: int,
+        light_user: int,
+        big_project: int, small_project: int, deleted_project: int, big_project_issue: int,
+        project_sizes: Counter, words: List[str],
+    ):
+        self.users = users
+        self.projects = projects
+        self.issues = issues
+        self.notifications = notifications
+        self.heavy_user = heavy_user
+        self.light_user = light_user
+        self.big_project = big_project
+        self.small_project = small_project
+        self.deleted_project = deleted_project
+        self.big_project_issue = big_project_issue
+        self.project_sizes = project_sizes
+        # title words, most frequent first
+        self.words = words
+
+
+def zipf_weights(n: int, skew: float) -> List[float]:
+    return list(itertools.accumulate(1 / rank ** skew for rank in range(1, n + 1)))
+
+
+def weighted(rng: random.Random, choices: Sequence[Tuple[str, int]], k: int) -> List[str]:
+    return rng.choices([value for value, _ in choices], [weight for _, weight in choices], k=k)
+
+
+def words(rng: random.Random, count: int) -> List[str]:
+    syllables = ["ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "ze", "pa", "do", "gu"]
+    vocabulary = set()
+    while len(vocabulary) < count:
+        vocabulary.add("".join(rng.choices(syllables, k=rng.randint(2, 4))))
+    # in draw order, so which words are frequent doesn't follow the alphabet
+    return rng.sample(sorted(vocabulary), count)
+
+
+def copy(conn: Connection, table: str, columns: Sequence[str], rows: Iterable[Sequence]) -> None:
+    # COPY FROM STDIN in chunks, so a few million rows never sit in one buffer
+    with conn.connection.cursor() as cursor:
+        rows = iter(rows)
+        while True:
+            chunk = list(itertools.islice(rows, COPY_CHUNK))
+            if not chunk:
+                return
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(chunk)
+            buffer.seek(0)
+            cursor.copy_expert(f'COPY "{table}" ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)', buffer)
+
+
+def next_id(conn: Connection, table: str) -> int:
+    return conn.exec_driver_sql(f'SELECT coalesce(max(id), 0) + 1 FROM "{table}"').scalar()
+
+
+def generate(
+    conn: Connection,
+    *,
+    users: int,
+    projects: int,
+    issues: int,
+    notifications: int = 0,
+    skew: float = 1.1,
+    first_id: Optional[int] = None,
+    seed: int = 0,
+) -> Dataset:
+    """
+    Write the rows on `conn` without committing, with ids from `first_id` or past the existing ones.
+    The same arguments always produce the same rows. 10% of projects are soft deleted (their live issues
+    with them), 5% of issues on their own, and a third of projects have an assignee; issue counters for
+    the new projects are written too. Notifications go to the same users and span the last 30 days.
+    """
+    rng = random.Random(seed)
+    user_ids, project_ids, issue_ids, notification_ids = (
+        range(start, start + count)
+        for start, count in (
+            (first_id or next_id(conn, "user"), users),
+            (first_id or next_id(conn, "project"), projects),
+            (first_id or next_id(conn, "issue"), issues),
+            (first_id or next_id(conn, "notification_outbox"), notifications),
+        )
+    )
+
+    hashed_password = get_password_hash(PASSWORD)
+    copy(conn, "user", ["id", "email", "hashed_password", "is_admin", "is_deleted"], (
+        (user_id, f"user{user_id}@example.com", hashed_password, False, False) for user_id in user_ids
+    ))
+
+    owners = rng.choices(user_ids, cum_weights=zipf_weights(users, skew), k=projects)
+    assignees = rng.choices(user_ids, k=projects)
+    deleted_projects = set(rng.sample(project_ids, projects // 10))
+    # the biggest projects stay live, the plans worth watching are theirs
+    deleted_projects -= set(project_ids[:10])
+    copy(conn, "project", ["id", "title", "owner_id", "assigned_id", "is_deleted"], (
+        (
+            project_id, f"project {project_id}", owner, assignee if rng.random() < 1 / 3 else None,
+            project_id in deleted_projects,
+        )
+        for project_id, owner, assignee in zip(project_ids, owners, assignees)
+    ))
+
+    issue_projects = rng.choices(project_ids, cum_weights=zipf_weights(projects, skew), k=issues)
+    statuses = weighted(rng, STATUSES, issues)
+    types = weighted(rng, TYPES, issues)
+    vocabulary = words(rng, 5000)
+    vocabulary_weights = zipf_weights(len(vocabulary), skew)
+
+    big_project_issue = None
+
+    def issue_rows() -> Iterable[Sequence]:
+        nonlocal big_project_issue
+        for issue_id, project_id, status, type in zip(issue_ids, issue_projects, statuses, types):
+            title = " ".join(rng.choices(vocabulary, cum_weights=vocabulary_weights, k=rng.randint(3, 8)))
+            deleted_alone = rng.random() < 0.05
+            with_project = project_id in deleted_projects and not deleted_alone
+            if big_project_issue is None and project_id == project_ids[0] and not deleted_alone:
+                big_project_issue = issue_id
+            yield issue_id, title, type, status, project_id, deleted_alone or with_project, with_project
+
+    copy(
+        conn, "issue", ["id", "title", "type", "status", "project_id", "is_deleted", "deleted_with_project"],
+        issue_rows(),
+    )
+
+    now = datetime.now(timezone.utc)
+    recipients = rng.choices(user_ids, cum_weights=zipf_weights(users, skew), k=notifications)
+    notification_statuses = weighted(rng, NOTIFICATION_STATUSES, notifications)
+
+    def notification_rows() -> Iterable[Sequence]:
+        for notification_id, recipient, status in zip(notification_ids, recipients, notification_statuses):
+            created_at = now - timedelta(seconds=rng.uniform(0, 30 * 24 * 3600))
+            payload = {"issue_id": rng.choice(issue_ids), "from_status": "To Do", "to_status": "Done"}
+            yield (
+                notification_id, f"user{recipient}@example.com", json.dumps(payload), status,
+                {"sent": 1, "failed": 8}.get(status, 0), created_at, created_at,
+                created_at if status == "sent" else None,
+            )
+
+    copy(
+        conn, "notification_outbox",
+        ["id", "recipient", "payload", "status", "attempts", "available_at", "created_at", "sent_at"],
+        notification_rows(),
+    )
+
+    # same rule as IssueCounterCrud.reconcile, over the new projects only
+    conn.execute(insert(IssueCounter).from_select(
+        ["project_id", "status", "type", "count"],
+        select(Issue.project_id, Issue.status, Issue.type, func.count())
+        .where(counted(), Issue.project_id.between(project_ids[0], project_ids[-1]))
+        .group_by(Issue.project_id, Issue.status, Issue.type),
+    ))
+    conn.execute(text('ANALYZE "user", project, issue, issue_counter, notification_outbox'))
+
+    sizes = Counter(issue_projects)
+    return Dataset(
+        user_ids, project_ids, issue_ids, notification_ids,
+        # Zipf rank 1 owns the most projects, the last rank few or none
+        heavy_user=user_ids[0],
+        light_user=user_ids[-1],
+        big_project=project_ids[0],
+        small_project=min(
+            (project_id for project_id in sizes if project_id not in deleted_projects),
+            key=lambda project_id: (sizes[project_id], project_id),
+        ),
+        deleted_project=min(deleted_projects),
+        big_project_issue=big_project_issue,
+        project_sizes=sizes,
+        words=vocabulary,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--projects", type=int, default=100000)
+    parser.add_argument("--issues", type=int, default=2000000)
+    parser.add_argument("--notifications", type=int, default=500000)
+    parser.add_argument(
+        "--skew", type=float, default=1.1, help="Zipf exponent of projects per owner and issues per project"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    with engine.connect() as conn, conn.begin():
+        data = generate(
+            conn, users=args.users, projects=args.projects, issues=args.issues, notifications=args.notifications,
+            skew=args.skew, seed=args.seed,
+        )
+        # explicit ids leave the serial sequences behind, move them past the new rows
+        for table in ("user", "project", "issue", "notification_outbox"):
+            conn.exec_driver_sql(
+                f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), (SELECT max(id) FROM \"{table}\"))"
+            )
+    sizes = [size for _, size in data.project_sizes.most_common()]
+    print(
+        f"{args.users} users, {args.projects} projects, {args.issues} issues, {args.notifications} notifications "
+        f"in {time.perf_counter() - start:.1f}s"
+    )
+    print(
+        f"largest projects {sizes[:5]} issues, "
+        f"{args.projects - sum(1 for size in sizes if size > 1)} projects with at most one"
+    )
+
+
+if __name__ == '__main__':
+    main()
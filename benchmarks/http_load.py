@@ -0,0 +1,307 @@
+"""
+HTTP load test: mixed traffic from concurrent clients against the app served by uvicorn, reporting
+p50/p95/p99 latency and throughput per endpoint and comparing them with a stored baseline.
+
+    python -m benchmarks.http_load --duration 30 --concurrency 12
+    python -m benchmarks.http_load --out result.json --baseline benchmarks/baselines/http_load.json
+    python -m benchmarks.http_load --save-baseline benchmarks/baselines/http_load.json
+
+Seeds the database configured in settings.toml through the crud modules and serves the app in a child
+process. Status changes queue notifications in the outbox; a worker loop in this process delivers them to
+a local SMTP sink, so no mail server is needed. Exits with status 1 when an endpoint regressed against the
+baseline by more than --tolerance. The load generator shares the machine with the server and the database:
+if its CPU share (printed with the results) nears 100% the numbers measure the client, not the API.
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import string
+import sys
+import threading
+import time
+
+from collections import defaultdict
+from typing import Any, Dict, List
+
+import httpx
+from sqlalchemy import text
+
+from benchmarks.issue_export import start_server
+from benchmarks.smtp_sink import SMTPSink
+from test_project.core.db import SessionLocal
+from test_project.core.mail import SendMail
+from test_project.core.settings import Mail, get_settings
+from test_project.crud.issue import issue as crud_issue
+from test_project.crud.project import project as crud_project
+from test_project.crud.user import user as crud_user
+from test_project.models.schemas import IssueCreate, ProjectCreate, UserCreate
+from test_project.worker import process_batch
+
+STATUSES = ["To Do", "In Progress", "Done"]
+TYPES = ["Bug", "Task", "Story"]
+
+# baseline metrics compared after a run, and whether a higher value is worse
+CHECKED = {"p50_ms": True, "p95_ms": True, "rps": False}
+
+
+def random_string() -> str:
+    return "".join(random.choices(string.ascii_lowercase, k=32))
+
+
+class Account:
+    def __init__(self, user_in: UserCreate, project_ids: List[int], issue_ids: List[int]):
+        self.user_in = user_in
+        self.project_ids = project_ids
+        self.issue_ids = issue_ids
+        self.headers: Dict[str, str] = {}
+
+
+def seed(users: int, projects: int, issues: int) -> List[Account]:
+    accounts = []
+    with SessionLocal() as db:
+        for _ in range(users):
+            user_in = UserCreate(email=f"{random_string()}@bench.com", password=random_string())
+            user = crud_user.create(db, obj=user_in)
+            project_ids, issue_ids = [], []
+            for _ in range(projects):
+                project = crud_project.create_with_owner(
+                    db=db, obj=ProjectCreate(title=random_string()), owner_id=user.id
+                )
+                project_ids.append(project.id)
+                issue_ids.extend(crud_issue.create_bulk(db, objs=[
+                    IssueCreate(
+                        title=random_string(), type=random.choice(TYPES), status=random.choice(STATUSES),
+                        project_id=project.id,
+                    )
+                    for _ in range(issues)
+                ]))
+            accounts.append(Account(user_in, project_ids, issue_ids))
+        db.execute(text("ANALYZE"))
+    return accounts
+
+
+async def list_issues(client: httpx.AsyncClient, account: Account) -> httpx.Response:
+    return await client.get("/api/issue/", params={"limit": 50}, headers=account.headers)
+
+
+async def retrieve_issue(client: httpx.AsyncClient, account: Account) -> httpx.Response:
+    return await client.get(f"/api/issue/{random.choice(account.issue_ids)}", headers=account.headers)
+
+
+async def retrieve_project(client: httpx.AsyncClient, account: Account) -> httpx.Response:
+    return await client.get(f"/api/project/{random.choice(account.project_ids)}", headers=account.headers)
+
+
+async def update_status(client: httpx.AsyncClient, account: Account) -> httpx.Response:
+    return await client.put(
+        f"/api/issue/{random.choice(account.issue_ids)}", json={"status": random.choice(STATUSES)},
+        headers=account.headers,
+    )
+
+
+async def create_issue(client: httpx.AsyncClient, account: Account) -> httpx.Response:
+    response = await client.post("/api/issue/", headers=account.headers, json={
+        "title": random_string(), "type": random.choice(TYPES), "status": STATUSES[0],
+        "project_id": random.choice(account.project_ids),
+    })
+    if response.status_code == 200:
+        account.issue_ids.append(response.json()["id"])
+    return response
+
+
+async def login(client: httpx.AsyncClient, account: Account) -> httpx.Response:
+    return await client.post(
+        "/api/auth/login/token", json={"email": account.user_in.email, "password": account.user_in.password}
+    )
+
+
+# route template -> (weight, request); reads dominate, logins are rare but pay for bcrypt
+OPERATIONS = {
+    "GET /api/issue/": (30, list_issues),
+    "GET /api/issue/{id}": (25, retrieve_issue),
+    "GET /api/project/{id}": (20, retrieve_project),
+    "PUT /api/issue/{id}": (12, update_status),
+    "POST /api/issue/": (8, create_issue),
+    "POST /api/auth/login/token": (5, login),
+}
+
+
+class OutboxDrain(threading.Thread):
+    """The outbox worker's loop, delivering through `sender` until stopped."""
+
+    def __init__(self, sender: SendMail, interval: float = 0.2):
+        super().__init__(daemon=True)
+        self.sender = sender
+        self.interval = interval
+        self._done = threading.Event()
+
+    def run(self) -> None:
+        while not self._done.is_set():
+            with SessionLocal() as db:
+                claimed = process_batch(db, self.sender)
+            if claimed < get_settings().outbox.batch_size:
+                self._done.wait(self.interval)
+
+    def stop(self) -> None:
+        self._done.set()
+        self.join()
+
+
+async def virtual_user(
+        client: httpx.AsyncClient, account: Account, measure_from: float, deadline: float,
+        latencies: Dict[str, List[float]], errors: Dict[str, int],
+) -> None:
+    names = list(OPERATIONS)
+    weights = [weight for weight, _ in OPERATIONS.values()]
+    while time.perf_counter() < deadline:
+        name = random.choices(names, weights)[0]
+        started = time.perf_counter()
+        try:
+            failed = (await OPERATIONS[name][1](client, account)).status_code >= 400
+        except httpx.HTTPError:
+            failed = True
+        elapsed = time.perf_counter() - started
+        # requests started during warmup are not counted
+        if started >= measure_from:
+            latencies[name].append(elapsed)
+            errors[name] += failed
+
+
+async def drive(base: str, accounts: List[Account], concurrency: int, warmup: float, duration: float) -> Dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=30) as client:
+        for account in accounts:
+            r = await login(client, account)
+            r.raise_for_status()
+            account.headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+        latencies: Dict[str, List[float]] = defaultdict(list)
+        errors: Dict[str, int] = defaultdict(int)
+        measure_from = time.perf_counter() + warmup
+        deadline = measure_from + duration
+        cpu_started = time.process_time()
+        await asyncio.gather(*(
+            virtual_user(client, accounts[i % len(accounts)], measure_from, deadline, latencies, errors)
+            for i in range(concurrency)
+        ))
+        # the load generator's own CPU use, a share of one core
+        client_cpu = (time.process_time() - cpu_started) / (warmup + duration)
+    return summarize(latencies, errors, duration, client_cpu)
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    # nearest rank
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def stats(latencies: List[float], errors: int, duration: float) -> Dict[str, Any]:
+    ordered = sorted(latencies)
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "rps": round(len(ordered) / duration, 1),
+        "p50_ms": round(percentile(ordered, 50) * 1000, 2),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+    }
+
+
+def summarize(latencies: Dict[str, List[float]], errors: Dict[str, int], duration: float, client_cpu: float) -> Dict:
+    return {
+        "endpoints": {name: stats(latencies[name], errors[name], duration) for name in OPERATIONS if latencies[name]},
+        "total": stats([t for name in latencies for t in latencies[name]], sum(errors.values()), duration),
+        "client_cpu": round(client_cpu, 2),
+    }
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    regressions = []
+    for name, current in {**results["endpoints"], "total": results["total"]}.items():
+        before = baseline["total"] if name == "total" else baseline["endpoints"].get(name)
+        if before is None:
+            continue
+        for metric, higher_is_worse in CHECKED.items():
+            change = (current[metric] - before[metric]) / before[metric] if before[metric] else 0
+            if (change if higher_is_worse else -change) > tolerance:
+                regressions.append(f"{name}: {metric} {before[metric]} -> {current[metric]} ({change:+.0%})")
+        if current["errors"] and not before["errors"]:
+            regressions.append(f"{name}: {current['errors']} errors, none in the baseline")
+    return regressions
+
+
+def print_results(results: Dict) -> None:
+    print(f"{'endpoint':<28} {'requests':>9} {'errors':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, row in {**results["endpoints"], "total": results["total"]}.items():
+        print(
+            f"{name:<28} {row['requests']:>9} {row['errors']:>7} {row['rps']:>8.1f}"
+            f" {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} {row['p99_ms']:>8.2f}"
+        )
+    print(f"client CPU {results['client_cpu']:.0%} of a core, {results['mail_delivered']} notifications delivered")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--projects", type=int, default=3, help="projects per user")
+    parser.add_argument("--issues", type=int, default=200, help="issues per project")
+    parser.add_argument("--concurrency", type=int, default=12, help="clients sending requests back to back")
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--smtp-latency", type=float, default=0, help="seconds the SMTP sink waits per reply")
+    parser.add_argument("--out", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare with the results stored in this JSON file")
+    parser.add_argument("--save-baseline", help="write the results to this JSON file as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative change before failing")
+    args = parser.parse_args()
+
+    accounts = seed(args.users, args.projects, args.issues)
+    sink = SMTPSink("127.0.0.1", latency=args.smtp_latency)
+    sink.start()
+    sender = SendMail(Mail(host="127.0.0.1", port=sink.port))
+    drain = OutboxDrain(sender)
+    drain.start()
+    server = start_server(args.port, args.workers)
+    try:
+        results = asyncio.run(
+            drive(f"http://127.0.0.1:{args.port}", accounts, args.concurrency, args.warmup, args.duration)
+        )
+    finally:
+        server.terminate()
+        server.wait()
+        # let the notifications of the last writes go out before counting them
+        time.sleep(1)
+        drain.stop()
+        sender.pool.close()
+        sink.stop()
+
+    results["mail_delivered"] = sink.messages
+    results["config"] = {
+        key: getattr(args, key)
+        for key in ("users", "projects", "issues", "concurrency", "warmup", "duration", "workers", "smtp_latency")
+    }
+    print_results(results)
+
+    for path in filter(None, [args.out, args.save_baseline]):
+        with open(path, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("config") != results["config"]:
+            print(f"baseline was recorded with {baseline.get('config')}, numbers may not compare")
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"no regression beyond {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""
+Streaming export: GET /api/issue/project/{id}/export against a project with a million issues,
+watching the server's resident memory while the body streams.
+
+    python -m benchmarks.issue_export --issues 1000000 --format ndjson
+    python -m benchmarks.issue_export --issues 100000 --compare-paging
+
+Seeds the database configured in settings.toml and serves the app with uvicorn in a child
+process, since the in-process TestClient buffers whole response bodies.
+"""
+import argparse
+import os
+import random
+import string
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+from sqlalchemy import text
+
+from test_project.core.db import SessionLocal
+from test_project.crud.project import project as crud_project
+from test_project.crud.user import user as crud_user
+from test_project.models.schemas import ProjectCreate, UserCreate
+
+
+def random_string() -> str:
+    return "".join(random.choices(string.ascii_lowercase, k=32))
+
+
+def rss_kib(pid: int, field: str = "VmRSS") -> int:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return 0
+
+
+class RSSSampler(threading.Thread):
+    def __init__(self, pid: int, interval: float = 0.05):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self._done = threading.Event()
+
+    def run(self) -> None:
+        while not self._done.is_set():
+            self.peak = max(self.peak, rss_kib(self.pid))
+            time.sleep(self.interval)
+
+    def stop(self) -> int:
+        self._done.set()
+        self.join()
+        return self.peak
+
+
+def seed(issues: int):
+    with SessionLocal() as db:
+        user_in = UserCreate(email=f"{random_string()}@bench.com", password=random_string())
+        user = crud_user.create(db, obj=user_in)
+        project = crud_project.create_with_owner(db=db, obj=ProjectCreate(title=random_string()), owner_id=user.id)
+        db.execute(
+            text(
+                "INSERT INTO issue (title, type, status, project_id, is_deleted) "
+                "SELECT 'issue ' || g, 'Bug', 'To Do', :project_id, false FROM generate_series(1, :issues) g"
+            ),
+            {"project_id": project.id, "issues": issues},
+        )
+        db.commit()
+        db.execute(text("ANALYZE issue"))
+        return user_in, project.id
+
+
+def start_server(port: int, workers: int = 1) -> subprocess.Popen:
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "test_project:app", "--port", str(port), "--workers", str(workers),
+            "--log-level", "warning",
+        ],
+        cwd=os.getcwd(),
+    )
+    for _ in range(100):
+        try:
+            requests.get(f"http://127.0.0.1:{port}/docs", timeout=1)
+            return server
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("server did not start")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--issues", type=int, default=1000000)
+    parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--compare-paging", action="store_true", help="also page through the list endpoint")
+    parser.add_argument("--page-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    user_in, project_id = seed(args.issues)
+    server = start_server(args.port)
+    base = f"http://127.0.0.1:{args.port}/api"
+    try:
+        r = requests.post(f"{base}/auth/login/token", json={"email": user_in.email, "password": user_in.password})
+        headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+        idle_rss = rss_kib(server.pid)
+
+        sampler = RSSSampler(server.pid)
+        sampler.start()
+        start = time.perf_counter()
+        size = 0
+        with requests.get(
+            f"{base}/issue/project/{project_id}/export", params={"format": args.format}, headers=headers, stream=True
+        ) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=1 << 16):
+                size += len(chunk)
+        export_seconds = time.perf_counter() - start
+        export_peak = sampler.stop()
+
+        print(f"export ({args.format}): {args.issues} issues, {size / 2 ** 20:.1f} MiB in {export_seconds:.2f}s "
+              f"({args.issues / export_seconds:.0f} issues/s)")
+        print(f"  server RSS idle {idle_rss / 1024:.1f} MiB, peak while streaming {export_peak / 1024:.1f} MiB")
+
+        if args.compare_paging:
+            sampler = RSSSampler(server.pid)
+            sampler.start()
+            start = time.perf_counter()
+            skip, fetched = 0, 0
+            while True:
+                page = requests.get(
+                    f"{base}/issue/project/{project_id}",
+                    params={"skip": skip, "limit": args.page_size},
+                    headers=headers,
+                ).json()
+                fetched += len(page)
+                if len(page) < args.page_size:
+                    break
+                skip += args.page_size
+            paging_seconds = time.perf_counter() - start
+            paging_peak = sampler.stop()
+            print(f"offset paging: {fetched} issues in {paging_seconds:.2f}s "
+                  f"({fetched / paging_seconds:.0f} issues/s), server RSS peak {paging_peak / 1024:.1f} MiB")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
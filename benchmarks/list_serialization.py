@@ -0,0 +1,87 @@
+"""
+List endpoint serialization: ORM entities validated through the response model versus
+rows selected with schema_columns and dumped straight to orjson.
+
+    python -m benchmarks.list_serialization --pages 100 1000 10000 --repeat 20
+
+Runs against the database configured in settings.toml.
+"""
+import argparse
+import random
+import string
+import time
+import tracemalloc
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import ORJSONResponse
+
+from test_project.api.issue import ISSUE_COLUMNS
+from test_project.core.db import SessionLocal
+from test_project.core.serialization import rows_response
+from test_project.crud.issue import issue as crud_issue
+from test_project.crud.project import project as crud_project
+from test_project.crud.user import user as crud_user
+from test_project.models.schemas import Issue, IssueCreate, ProjectCreate, UserCreate
+
+
+def random_string() -> str:
+    return "".join(random.choices(string.ascii_lowercase, k=32))
+
+
+def orm_page(db, project_id, user, limit) -> bytes:
+    _, issues = crud_issue.list_by_project_authorized(db, project_id=project_id, user=user, limit=limit)
+    return ORJSONResponse(jsonable_encoder([Issue.from_orm(issue) for issue in issues])).body
+
+
+def rows_page(db, project_id, user, limit) -> bytes:
+    _, issues = crud_issue.list_by_project_authorized(
+        db, project_id=project_id, user=user, limit=limit, columns=ISSUE_COLUMNS
+    )
+    return rows_response(issues, Issue, limit=limit).body
+
+
+def measure(db, page, project_id, user, limit, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        page(db, project_id, user, limit)
+        db.expunge_all()
+    seconds = (time.perf_counter() - start) / repeat
+
+    tracemalloc.start()
+    body = page(db, project_id, user, limit)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    db.expunge_all()
+    return seconds, peak, body
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        user = crud_user.create(db, obj=UserCreate(email=f"{random_string()}@bench.com", password=random_string()))
+        project = crud_project.create_with_owner(db=db, obj=ProjectCreate(title=random_string()), owner_id=user.id)
+        issues = [
+            IssueCreate(title=random_string(), type="Bug", status="To Do", project_id=project.id)
+            for _ in range(max(args.pages))
+        ]
+        for i in range(0, len(issues), 10000):
+            crud_issue.create_bulk(db, objs=issues[i:i + 10000])
+
+        for limit in args.pages:
+            orm_seconds, orm_peak, orm_body = measure(db, orm_page, project.id, user, limit, args.repeat)
+            rows_seconds, rows_peak, rows_body = measure(db, rows_page, project.id, user, limit, args.repeat)
+            assert orm_body == rows_body
+
+            print(
+                f"{limit:>6} rows: orm {orm_seconds * 1000:8.2f} ms {orm_peak / 2 ** 20:7.2f} MiB | "
+                f"rows {rows_seconds * 1000:8.2f} ms {rows_peak / 2 ** 20:7.2f} MiB | "
+                f"{orm_seconds / rows_seconds:.1f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Notification delivery: a fresh SMTP connection per message (the old SendMail)
+versus the pooled client, against a local sink with injected latency.
+
+    python -m benchmarks.smtp_pool --messages 500 --threads 8 --latency 0.005
+"""
+import argparse
+import smtplib
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.smtp_sink import SMTPSink
+from test_project.core.mail import SendMail
+from test_project.core.settings import Mail
+
+MESSAGE = "Subject: Status issue\r\n\r\nIssue #1 has changed status from To Do to Done\r\n"
+
+
+def send_unpooled(port: int) -> None:
+    smtpObj = smtplib.SMTP("127.0.0.1", port)
+    smtpObj.sendmail("sender", "reciever", MESSAGE)
+    smtpObj.quit()
+
+
+def run(label: str, sink: SMTPSink, fn, calls: int, threads: int) -> None:
+    connections, messages = sink.connections, sink.messages
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        list(executor.map(lambda _: fn(), range(calls)))
+    seconds = time.perf_counter() - start
+    print(
+        f"{label:<10} {(sink.messages - messages) / seconds:8.0f} msg/s"
+        f"  {sink.connections - connections:5d} new connections"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--batch", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.005)
+    args = parser.parse_args()
+
+    sink = SMTPSink(latency=args.latency).start()
+    mail = SendMail(Mail(host="127.0.0.1", port=sink.port, pool_size=args.threads))
+    try:
+        run("unpooled", sink, lambda: send_unpooled(sink.port), args.messages, args.threads)
+        run("pooled", sink, lambda: mail.deliver([MESSAGE]), args.messages, args.threads)
+        run(f"batch x{args.batch}", sink, lambda: mail.deliver([MESSAGE] * args.batch),
+            args.messages // args.batch, args.threads)
+    finally:
+        mail.pool.close()
+        sink.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+import argparse
+import logging
+import sys
+
+import orjson
+
+from test_project.importer import run
+from test_project.models.schemas import ExportFormat
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Load issues from an NDJSON or CSV file with COPY.")
+    parser.add_argument("path", help="file to import, - reads stdin")
+    parser.add_argument("--format", choices=[format.value for format in ExportFormat], default="ndjson")
+    parser.add_argument("--owner", required=True, help="email of the user owning the target projects")
+    args = parser.parse_args()
+
+    report = run(args.path, format=ExportFormat(args.format), email=args.owner)
+    sys.stdout.buffer.write(orjson.dumps(report, option=orjson.OPT_INDENT_2) + b"\n")
@@ -0,0 +1,15 @@
+import argparse
+import logging
+
+from test_project.core.db import SessionLocal
+from test_project.crud.issue_counter import issue_counter
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Rebuild the per-project issue counters from the issue table.")
+    parser.add_argument("--project", type=int, help="only this project's counters")
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        written = issue_counter.reconcile(db, project_id=args.project)
+    logging.info("Rebuilt %s issue counters", written)
@@ -2,12 +2,16 @@ from fastapi import FastAPI, Request, Response
 from fastapi.responses import ORJSONResponse
 from starlette.middleware.cors import CORSMiddleware
 from starlette.exceptions import ExceptionMiddleware
+from starlette_exporter import PrometheusMiddleware, handle_metrics
 
 from test_project.api.auth import router as auth_router
 from test_project.api.issue import router as issue_router
 from test_project.api.project import router as project_router
 from test_project.api.user import router as user_router
+from test_project.core.auth import password_pool
 from test_project.core.exception_handler import custom_exception_handler
+from test_project.core.mail import mail
+from test_project.core.metrics import QueryMetricsMiddleware, mark_process_dead
 from test_project.core.settings import get_settings
 
 
@@ -19,6 +23,7 @@ def make_app() -> FastAPI:
     app.include_router(issue_router, prefix="/api/issue", tags=["Issue"])
     app.include_router(project_router, prefix="/api/project", tags=["Project"])
     app.include_router(user_router, prefix="/api/user", tags=["User"])
+    app.add_route("/metrics", handle_metrics, include_in_schema=False)
 
     @app.options("/{rest_of_path:path}", include_in_schema=False)
     async def preflight_handler(request: Request, rest_of_path: str) -> Response:
@@ -42,9 +47,32 @@ def make_app() -> FastAPI:
         allow_headers=["*"],
     )
 
+    @app.on_event("startup")
+    def start_password_pool() -> None:
+        password_pool.start()
+
+    @app.on_event("shutdown")
+    def shutdown_password_pool() -> None:
+        password_pool.shutdown()
+
+    @app.on_event("shutdown")
+    def close_smtp_pool() -> None:
+        mail.pool.close()
+
+    @app.on_event("shutdown")
+    def close_metrics() -> None:
+        mark_process_dead()
+
     app.add_exception_handler(Exception, custom_exception_handler)
     app.add_middleware(ExceptionMiddleware, handlers=app.exception_handlers)
 
+    # latency and in-flight requests per route template, and the SQL each route runs (logged past the
+    # query budget); outside the exception handlers so they record the status the client got
+    app.add_middleware(QueryMetricsMiddleware, budget=get_settings().query_budget)
+    app.add_middleware(
+        PrometheusMiddleware, app_name="test_project", prefix="http", group_paths=True, filter_unhandled_paths=True
+    )
+
     return app
 
 
@@ -1,15 +1,24 @@
 from fastapi import APIRouter, Depends, status
 from fastapi.responses import ORJSONResponse
 from jose import jwt
-from sqlalchemy.orm import Session
 from typing import Any
 
-from test_project.core.auth import oauth2_scheme, create_oauth_token
+from test_project.core.auth import oauth2_scheme, create_oauth_token, password_pool
+from test_project.core.principal_cache import principal_cache
+from test_project.core.request_cache import request_cache, request_cache_stats
 from test_project.core.settings import get_settings
-from test_project.core.db import get_db
-from test_project.crud.user import user as crud_user
+from test_project.core.db import DBSession, get_session
+from test_project.crud.user import async_user as crud_user
 from test_project.models.models import User as model_user
-from test_project.models.schemas import Token, TokenPayload, UserCreate, User
+from test_project.models.schemas import (
+    PasswordPoolStats,
+    PrincipalCacheStats,
+    RequestCacheStats,
+    Token,
+    TokenPayload,
+    UserCreate,
+    User
+)
 from test_project.core.exceptions import UserNotFoundException, UserNotAdminException
 
 
@@ -17,8 +26,8 @@ router = APIRouter()
 
 
 @router.post("/login/token", response_model=Token)
-def login_access_token(form_data: UserCreate, db: Session = Depends(get_db)) -> Any:
-    user = crud_user.authenticate(
+async def login_access_token(form_data: UserCreate, db: DBSession = Depends(get_session)) -> Any:
+    user = await crud_user.authenticate(
         db, email=form_data.email, password=form_data.password
     )
 
@@ -32,18 +41,28 @@ def login_access_token(form_data: UserCreate, db: Session = Depends(get_db)) ->
     )
 
 
-def get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)) -> model_user:
+async def get_current_user(db: DBSession = Depends(get_session), token: str = Depends(oauth2_scheme)) -> model_user:
+    user = principal_cache.get(token)
+    if user is not None:
+        # a later retrieve of the caller (as an assignee, say) in this request is then free
+        cache = request_cache(db)
+        if cache is not None:
+            cache.add(user)
+        return user
+
+    generation = principal_cache.generation
     payload = jwt.decode(token, get_settings().auth.secret_key, algorithms=[get_settings().auth.algorithm])
     token_data = TokenPayload(**payload)
 
-    user = crud_user.retrieve(db, id=token_data.sub)
+    user = await crud_user.retrieve(db, id=token_data.sub)
     if not user:
         raise UserNotFoundException
 
+    principal_cache.set(token, user, expires_at=token_data.exp, generation=generation)
     return user
 
 
-def get_current_superuser(
+async def get_current_superuser(
     current_user: model_user = Depends(get_current_user),
 ) -> model_user:
     if not crud_user.is_admin(current_user):
@@ -53,8 +72,23 @@ def get_current_superuser(
 
 
 @router.post("/login/test-token", response_model=User)
-def test_token(current_user: model_user = Depends(get_current_user)) -> Any:
+async def test_token(current_user: model_user = Depends(get_current_user)) -> Any:
     """
     Test access token
     """
     return current_user
+
+
+@router.get("/principal-cache", response_model=PrincipalCacheStats)
+async def principal_cache_stats(current_user: model_user = Depends(get_current_superuser)) -> Any:
+    return principal_cache.stats()
+
+
+@router.get("/password-pool", response_model=PasswordPoolStats)
+async def password_pool_stats(current_user: model_user = Depends(get_current_superuser)) -> Any:
+    return password_pool.stats()
+
+
+@router.get("/request-cache", response_model=RequestCacheStats)
+async def request_cache_summary(current_user: model_user = Depends(get_current_superuser)) -> Any:
+    return request_cache_stats.stats()
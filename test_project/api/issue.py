@@ -1,92 +1,178 @@
-from typing import Any, List
+from typing import Any, List, Optional
 
-from fastapi import APIRouter, Depends, BackgroundTasks
+from fastapi import APIRouter, Depends, Header, Query, Request, Response
 from fastapi.encoders import jsonable_encoder
-from sqlalchemy.orm import Session
+from fastapi.responses import StreamingResponse
 
 from test_project.api.auth import get_current_user
-from test_project.core.db import get_db
+from test_project.core.db import DBSession, get_session
 from test_project.core.exceptions import (
     IssueNotFoundException,
     PermissionException,
+    PreconditionFailedException,
     ProjectNotFoundException,
     ProjectRequiredException
 )
-from test_project.core.mail import mail
-from test_project.crud.issue import issue as crud_issue
-from test_project.crud.project import project as crud_project
-from test_project.crud.user import user as crud_user
-from test_project.models.models import User as model_user
-from test_project.models.schemas import Issue, IssueCreate, IssueUpdate
+from test_project.core.etag import etag_matches, not_modified, parse_if_match, version_etag
+from test_project.core.pagination import decode_cursor, decode_rank_cursor
+from test_project.core.serialization import csv_stream, ndjson_stream, rows_response, schema_columns
+from test_project.crud.issue import async_issue as crud_issue
+from test_project.crud.outbox import async_outbox as crud_outbox
+from test_project.crud.project import OWNER, WRITE, async_project as crud_project
+from test_project.crud.user import async_user as crud_user
+from test_project.importer import import_stream
+from test_project.models.models import Issue as model_issue, User as model_user
+from test_project.models.schemas import (
+    ExportFormat,
+    Issue,
+    IssueBulkCreate,
+    IssueBulkCreated,
+    IssueBulkTransition,
+    IssueCreate,
+    IssueImported,
+    IssueSearchResult,
+    IssueUpdate
+)
 
 router = APIRouter()
 
+ISSUE_COLUMNS = schema_columns(model_issue, Issue)
+
+
+@router.get("/search", response_model=List[IssueSearchResult])
+async def search_issues(
+        db: DBSession = Depends(get_session),
+        q: str = Query(..., min_length=1, max_length=256),
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        if_none_match: Optional[str] = Header(None),
+        current_user: model_user = Depends(get_current_user),
+) -> Any:
+    after = decode_rank_cursor(cursor)
+    # the same visibility as list_issues: admins search everything, users the projects they belong to
+    user_id = None if crud_user.is_admin(current_user) else current_user.id
+    issues = await crud_issue.search(
+        db=db, q=q, user_id=user_id, limit=limit, after=after, columns=ISSUE_COLUMNS
+    )
+
+    return rows_response(
+        issues, IssueSearchResult, limit=limit, if_none_match=if_none_match, cursor_keys=("rank",)
+    )
 
 @router.get("/{id}", response_model=Issue)
-def retrieve_issue(
+async def retrieve_issue(
         *,
-        db: Session = Depends(get_db),
+        db: DBSession = Depends(get_session),
         id: int,
+        response: Response,
+        if_none_match: Optional[str] = Header(None),
         current_user: model_user = Depends(get_current_user),
 ) -> Any:
-    issue = crud_issue.retrieve(db=db, id=id)
+    found = await crud_issue.retrieve_authorized(db=db, id=id, user=current_user)
 
-    if not issue:
+    if not found:
         raise IssueNotFoundException
 
-    if all([
-        not crud_user.is_admin(current_user),
-        current_user.id not in [issue.project.owner_id, issue.project.assigned_id]]
-    ):
+    issue, allowed = found
+    if not allowed:
         raise PermissionException
 
+    etag = version_etag(issue.version)
+    if etag_matches(if_none_match, etag):
+        return not_modified(response, etag)
+
+    response.headers["etag"] = etag
     return issue
 
 
 @router.get("/", response_model=List[Issue])
-def list_issues(
-        db: Session = Depends(get_db),
+async def list_issues(
+        db: DBSession = Depends(get_session),
         skip: int = 0,
         limit: int = 100,
+        cursor: Optional[str] = None,
+        count: bool = False,
+        if_none_match: Optional[str] = Header(None),
         current_user: model_user = Depends(get_current_user),
 ) -> Any:
+    after_id = decode_cursor(cursor)
 
+    total = None
     if crud_user.is_admin(current_user):
-        issues = crud_issue.list(db, skip=skip, limit=limit)
+        issues = await crud_issue.list(db, skip=skip, limit=limit, after_id=after_id, columns=ISSUE_COLUMNS)
+        if count:
+            total = await crud_issue.count(db)
     else:
-        issues = crud_issue.list_by_user_projects(db=db, user_id=current_user.id, skip=skip, limit=limit)
+        issues = await crud_issue.list_by_user_projects(
+            db=db, user_id=current_user.id, skip=skip, limit=limit, after_id=after_id, columns=ISSUE_COLUMNS
+        )
+        if count:
+            total = await crud_issue.count_by_user_projects(db, user_id=current_user.id)
 
-    return issues
+    return rows_response(issues, Issue, limit=limit, if_none_match=if_none_match, total=total)
 
 
 @router.get("/project/{id}", response_model=List[Issue])
-def list_issues_by_project(
+async def list_issues_by_project(
         id: int,
-        db: Session = Depends(get_db),
+        db: DBSession = Depends(get_session),
         skip: int = 0,
         limit: int = 100,
+        cursor: Optional[str] = None,
+        count: bool = False,
+        if_none_match: Optional[str] = Header(None),
+        current_user: model_user = Depends(get_current_user),
+) -> Any:
+    after_id = decode_cursor(cursor)
+    found = await crud_issue.list_by_project_authorized(
+        db=db, project_id=id, user=current_user, skip=skip, limit=limit, after_id=after_id, columns=ISSUE_COLUMNS
+    )
+
+    if not found:
+        raise ProjectNotFoundException
+
+    allowed, issues = found
+    if not allowed:
+        raise PermissionException
+
+    total = await crud_issue.count_by_project(db, project_id=id) if count else None
+    return rows_response(issues, Issue, limit=limit, if_none_match=if_none_match, total=total)
+
+
+@router.get("/project/{id}/export")
+async def export_issues_by_project(
+        id: int,
+        format: ExportFormat = ExportFormat.ndjson,
+        db: DBSession = Depends(get_session),
         current_user: model_user = Depends(get_current_user),
 ) -> Any:
-    project = crud_project.retrieve(db=db, id=id)
+    found = await crud_project.retrieve_authorized(db=db, id=id, user=current_user)
 
-    if not project:
+    if not found:
         raise ProjectNotFoundException
 
-    if all([
-        not crud_user.is_admin(current_user),
-        current_user.id not in [project.owner_id, project.assigned_id]]
-    ):
+    _, allowed = found
+    if not allowed:
         raise PermissionException
 
-    issues = crud_issue.list_by_project(db=db, project_id=project.id, skip=skip, limit=limit)
+    # one snapshot read through a server-side cursor instead of OFFSET pages; memory stays at one partition
+    partitions = crud_issue.stream_by_project(db, project_id=id, columns=ISSUE_COLUMNS)
+    if format == ExportFormat.csv:
+        content, media_type = csv_stream(partitions, Issue), "text/csv"
+    else:
+        content, media_type = ndjson_stream(partitions, Issue), "application/x-ndjson"
 
-    return issues
+    return StreamingResponse(
+        content,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="project-{id}-issues.{format.value}"'},
+    )
 
 
 @router.post("/", response_model=Issue)
-def create_issues(
+async def create_issues(
         *,
-        db: Session = Depends(get_db),
+        db: DBSession = Depends(get_session),
         issue_sch: IssueCreate,
         current_user: model_user = Depends(get_current_user),
 ) -> Any:
@@ -98,7 +184,7 @@ def create_issues(
     if "project_id" not in obj_in_data:
         raise ProjectRequiredException
 
-    project = crud_project.retrieve(db=db, id=obj_in_data.get("project_id"))
+    project = await crud_project.retrieve(db=db, id=obj_in_data.get("project_id"))
 
     if not project or project.is_deleted:
         raise ProjectNotFoundException
@@ -106,54 +192,136 @@ def create_issues(
     if project.owner_id != current_user.id:
         raise PermissionException
 
-    issue = crud_issue.create_with_project(db=db, obj=issue_sch)
+    issue = await crud_issue.create_with_project(db=db, obj=issue_sch)
     return issue
 
 
+@router.post("/bulk", response_model=IssueBulkCreated)
+async def create_issues_bulk(
+        *,
+        db: DBSession = Depends(get_session),
+        issues_sch: IssueBulkCreate,
+        current_user: model_user = Depends(get_current_user),
+) -> Any:
+    if crud_user.is_admin(current_user):
+        raise PermissionException
+
+    # one ownership lookup for every distinct project instead of one per issue
+    project_ids = {issue_sch.project_id for issue_sch in issues_sch.issues}
+    projects = await crud_project.list_by_ids(db=db, ids=project_ids)
+
+    if len(projects) != len(project_ids):
+        raise ProjectNotFoundException
+
+    if any(project.owner_id != current_user.id for project in projects):
+        raise PermissionException
+
+    ids = await crud_issue.create_bulk(db=db, objs=issues_sch.issues)
+    return {"ids": ids}
+
+
+@router.post("/import", response_model=IssueImported)
+async def import_issues(
+        *,
+        db: DBSession = Depends(get_session),
+        request: Request,
+        format: ExportFormat = ExportFormat.ndjson,
+        current_user: model_user = Depends(get_current_user),
+) -> Any:
+    # the body is validated while it streams in and loaded with COPY chunk by chunk;
+    # rejected rows don't fail the upload, they come back with their line numbers
+    issue_import = await import_stream(db, request.stream(), format=format, user=current_user)
+    return issue_import.report()
+
+
+@router.put("/bulk/status", response_model=List[Issue])
+async def transition_issues_bulk(
+        *,
+        db: DBSession = Depends(get_session),
+        transition_sch: IssueBulkTransition,
+        current_user: model_user = Depends(get_current_user),
+) -> Any:
+    ids = sorted(set(transition_sch.ids))
+    issues = await crud_issue.lock_for_transition(db=db, ids=ids)
+
+    if len(issues) != len(ids):
+        raise IssueNotFoundException
+
+    if not crud_user.is_admin(current_user) and any(issue.owner_id != current_user.id for issue in issues):
+        raise PermissionException
+
+    data_mails = [
+        {
+            "issue_id": issue.id,
+            "project_id": issue.project_id,
+            "from_status": issue.status,
+            "to_status": transition_sch.status,
+        }
+        for issue in issues if issue.status != transition_sch.status
+    ]
+    # outbox rows commit together with the status change, the worker delivers them
+    await crud_outbox.add_many(db=db, recipient=current_user.email, payloads=data_mails)
+    updated_issues = await crud_issue.transition_status(db=db, ids=ids, status=transition_sch.status)
+
+    return updated_issues
+
+
 @router.put("/{id}", response_model=Issue)
-def update_issue(
+async def update_issue(
         *,
-        db: Session = Depends(get_db),
+        db: DBSession = Depends(get_session),
         id: int,
         issue_sch: IssueUpdate,
+        response: Response,
+        if_match: Optional[str] = Header(None),
         current_user: model_user = Depends(get_current_user),
-        background_tasks: BackgroundTasks
 ) -> Any:
-    issue = crud_issue.retrieve(db=db, id=id)
+    version = parse_if_match(if_match)
+    found = await crud_issue.retrieve_authorized(db=db, id=id, user=current_user, access=WRITE)
 
-    if not issue or issue.is_deleted:
+    if not found:
         raise IssueNotFoundException
 
-    if not crud_user.is_admin(current_user) and issue.project.owner_id != current_user.id:
+    issue, allowed = found
+    if not allowed:
         raise PermissionException
 
-    obj_in_data = jsonable_encoder(issue_sch)
+    if version is not None and version != issue.version:
+        raise PreconditionFailedException
+
+    obj_in_data = issue_sch.dict(exclude_unset=True)
     if "status" in obj_in_data:
-        background_tasks.add_task(mail.send_notification_mail, user_email=current_user.email, data_mail={
+        await crud_outbox.add(db=db, recipient=current_user.email, payload={
             "issue_id": issue.id,
-            "project_id": issue.project.id,
+            "project_id": issue.project_id,
             "from_status": issue.status,
             "to_status": obj_in_data["status"],
 
         })
-    issue = crud_issue.update(db=db, db_obj=issue, obj=issue_sch)
+    # the UPDATE re-checks the version, a write that slipped in since the read above still fails
+    issue = await crud_issue.update(db=db, db_obj=issue, obj=issue_sch, version=version)
+    if not issue:
+        raise PreconditionFailedException
+
+    response.headers["etag"] = version_etag(issue.version)
     return issue
 
 
 @router.delete("/{id}", response_model=Issue)
-def delete_issue(
+async def delete_issue(
         *,
-        db: Session = Depends(get_db),
+        db: DBSession = Depends(get_session),
         id: int,
         current_user: model_user = Depends(get_current_user),
 ) -> Any:
-    issue = crud_issue.retrieve(db=db, id=id)
+    found = await crud_issue.retrieve_authorized(db=db, id=id, user=current_user, access=OWNER)
 
-    if not issue or issue.is_deleted:
+    if not found:
         raise IssueNotFoundException
 
-    if issue.project.owner_id != current_user.id:
+    _, allowed = found
+    if not allowed:
         raise PermissionException
 
-    issue = crud_issue.delete(db=db, id=id)
+    issue = await crud_issue.delete(db=db, id=id)
     return issue
@@ -1,62 +1,119 @@
-from typing import Any, List
+from collections import Counter
+from typing import Any, List, Optional
 
-from fastapi import APIRouter, Depends
-from fastapi.encoders import jsonable_encoder
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Header, Response
 
 from test_project.api.auth import get_current_user
-from test_project.core.db import get_db
+from test_project.core.db import DBSession, get_session
 from test_project.core.exceptions import (
     ProjectNotFoundException,
     PermissionException,
+    PreconditionFailedException,
     UserNotFoundException
 )
-from test_project.crud.project import project as crud_project
-from test_project.crud.user import user as crud_user
-from test_project.models.models import User as model_user
-from test_project.models.schemas import Project, ProjectCreate, ProjectUpdate
+from test_project.core.etag import etag_matches, not_modified, parse_if_match, version_etag
+from test_project.core.pagination import decode_cursor
+from test_project.core.serialization import rows_response, schema_columns
+from test_project.crud.issue_counter import async_issue_counter as crud_issue_counter
+from test_project.crud.project import OWNER, WRITE, async_project as crud_project
+from test_project.crud.user import async_user as crud_user
+from test_project.models.models import Project as model_project, User as model_user
+from test_project.models.schemas import Project, ProjectCascade, ProjectCreate, ProjectStats, ProjectUpdate
 
 router = APIRouter()
 
+PROJECT_COLUMNS = schema_columns(model_project, Project)
+
 
 @router.get("/{id}", response_model=Project)
-def retrieve_project(
+async def retrieve_project(
     *,
-    db: Session = Depends(get_db),
+    db: DBSession = Depends(get_session),
     id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
     current_user: model_user = Depends(get_current_user),
 ) -> Any:
-    project = crud_project.retrieve(db=db, id=id)
+    found = await crud_project.retrieve_authorized(db=db, id=id, user=current_user)
 
-    if not project:
+    if not found:
         raise ProjectNotFoundException
 
-    if all([not crud_user.is_admin(current_user), current_user.id not in [project.owner_id, project.assigned_id]]):
+    project, allowed = found
+    if not allowed:
         raise PermissionException
 
+    etag = version_etag(project.version)
+    if etag_matches(if_none_match, etag):
+        return not_modified(response, etag)
+
+    response.headers["etag"] = etag
     return project
 
 
+@router.get("/{id}/stats", response_model=ProjectStats)
+async def project_stats(
+    *,
+    db: DBSession = Depends(get_session),
+    id: int,
+    current_user: model_user = Depends(get_current_user),
+) -> Any:
+    found = await crud_project.retrieve_authorized(db=db, id=id, user=current_user)
+
+    if not found:
+        raise ProjectNotFoundException
+
+    _, allowed = found
+    if not allowed:
+        raise PermissionException
+
+    # one counter row per (status, type) in use, however many issues the project has
+    counts = await crud_issue_counter.list_by_project(db=db, project_id=id)
+    by_status, by_type = Counter(), Counter()
+    for status, type, count in counts:
+        by_status[status] += count
+        by_type[type] += count
+
+    return {
+        "project_id": id,
+        "total": sum(by_status.values()),
+        "by_status": by_status,
+        "by_type": by_type,
+        "counts": [{"status": status, "type": type, "count": count} for status, type, count in counts],
+    }
+
+
 @router.get("/", response_model=List[Project])
-def list_projects(
-    db: Session = Depends(get_db),
+async def list_projects(
+    db: DBSession = Depends(get_session),
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
+    count: bool = False,
+    if_none_match: Optional[str] = Header(None),
     current_user: model_user = Depends(get_current_user),
 ) -> Any:
+    after_id = decode_cursor(cursor)
 
+    total = None
     if crud_user.is_admin(current_user):
-        projects = crud_project.list(db, skip=skip, limit=limit)
+        projects = await crud_project.list(db, skip=skip, limit=limit, after_id=after_id, columns=PROJECT_COLUMNS)
+        if count:
+            total = await crud_project.count(db)
     else:
-        projects = crud_project.list_by_user(db=db, user_id=current_user.id, skip=skip, limit=limit)
+        projects = await crud_project.list_by_user(
+            db=db, user_id=current_user.id, skip=skip, limit=limit, after_id=after_id, columns=PROJECT_COLUMNS
+        )
+        if count:
+            total = await crud_project.count_by_user(db, user_id=current_user.id)
 
-    return projects
+    return rows_response(projects, Project, limit=limit, if_none_match=if_none_match, total=total)
 
 
 @router.post("/", response_model=Project)
-def create_project(
+async def create_project(
     *,
-    db: Session = Depends(get_db),
+    db: DBSession = Depends(get_session),
     project_sch: ProjectCreate,
     current_user: model_user = Depends(get_current_user),
 ) -> Any:
@@ -64,52 +121,90 @@ def create_project(
     if crud_user.is_admin(current_user):
         raise PermissionException
 
-    project = crud_project.create_with_owner(db=db, obj=project_sch, owner_id=current_user.id)
+    project = await crud_project.create_with_owner(db=db, obj=project_sch, owner_id=current_user.id)
     return project
 
 
 @router.put("/{id}", response_model=Project)
-def update_project(
+async def update_project(
     *,
-    db: Session = Depends(get_db),
+    db: DBSession = Depends(get_session),
     id: int,
     project_sch: ProjectUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
     current_user: model_user = Depends(get_current_user),
 ) -> Any:
-    project = crud_project.retrieve(db=db, id=id)
+    version = parse_if_match(if_match)
+    found = await crud_project.retrieve_authorized(db=db, id=id, user=current_user, access=WRITE)
 
-    if not project or project.is_deleted:
+    if not found:
         raise ProjectNotFoundException
 
-    if not crud_user.is_admin(current_user) and project.owner_id != current_user.id:
+    project, allowed = found
+    if not allowed:
         raise PermissionException
 
-    obj_in_data = jsonable_encoder(project_sch)
+    if version is not None and version != project.version:
+        raise PreconditionFailedException
+
+    obj_in_data = project_sch.dict(exclude_unset=True)
     if "assigned_id" in obj_in_data:
-        user = crud_user.retrieve(db=db, id=obj_in_data.get("assigned_id"))
+        user = await crud_user.retrieve(db=db, id=obj_in_data.get("assigned_id"))
         if not user:
             raise UserNotFoundException
 
-    project = crud_project.retrieve(db=db, id=id)
-    project = crud_project.update(db=db, db_obj=project, obj=project_sch)
+    project = await crud_project.update(db=db, db_obj=project, obj=project_sch, version=version)
+    if not project:
+        raise PreconditionFailedException
 
+    response.headers["etag"] = version_etag(project.version)
     return project
 
 
-@router.delete("/{id}", response_model=Project)
-def delete_project(
+@router.delete("/{id}", response_model=ProjectCascade)
+async def delete_project(
     *,
-    db: Session = Depends(get_db),
+    db: DBSession = Depends(get_session),
     id: int,
     current_user: model_user = Depends(get_current_user),
 ) -> Any:
-    project = crud_project.retrieve(db=db, id=id)
+    found = await crud_project.retrieve_authorized(db=db, id=id, user=current_user, access=OWNER)
 
-    if not project or project.is_deleted:
+    if not found:
         raise ProjectNotFoundException
 
-    if project.owner_id != current_user.id:
+    _, allowed = found
+    if not allowed:
         raise PermissionException
 
-    project = crud_project.delete(db=db, id=id)
-    return project
+    deleted = await crud_project.delete_cascade(db=db, id=id)
+    if not deleted:
+        raise ProjectNotFoundException
+
+    project, affected_issues = deleted
+    return {**Project.from_orm(project).dict(), "affected_issues": affected_issues}
+
+
+@router.post("/{id}/restore", response_model=ProjectCascade)
+async def restore_project(
+    *,
+    db: DBSession = Depends(get_session),
+    id: int,
+    current_user: model_user = Depends(get_current_user),
+) -> Any:
+    found = await crud_project.retrieve_authorized(db=db, id=id, user=current_user, access=OWNER, is_deleted=True)
+
+    if not found:
+        raise ProjectNotFoundException
+
+    _, allowed = found
+    if not allowed:
+        raise PermissionException
+
+    restored = await crud_project.restore_cascade(db=db, id=id)
+    if not restored:
+        raise ProjectNotFoundException
+
+    project, affected_issues = restored
+    return {**Project.from_orm(project).dict(), "affected_issues": affected_issues}
@@ -1,44 +1,51 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
-from typing import Any, List
+from fastapi import APIRouter, Depends, Header
+from typing import Any, List, Optional
 
 from test_project.api.auth import get_current_user, get_current_superuser
-from test_project.core.db import get_db
+from test_project.core.db import DBSession, get_session
 from test_project.core.exceptions import UserExistsException
-from test_project.crud.user import user as crud_user
+from test_project.core.pagination import decode_cursor
+from test_project.core.serialization import rows_response, schema_columns
+from test_project.crud.user import async_user as crud_user
 from test_project.models.models import User as model_user
 from test_project.models.schemas import UserCreate, User
 
 
 router = APIRouter()
 
+USER_COLUMNS = schema_columns(model_user, User)
+
 
 @router.get("/", response_model=List[User])
-def list_users(
-    db: Session = Depends(get_db),
+async def list_users(
+    db: DBSession = Depends(get_session),
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = None,
+    count: bool = False,
+    if_none_match: Optional[str] = Header(None),
     current_user: model_user = Depends(get_current_superuser),
 ) -> Any:
-    users = crud_user.list(db, skip=skip, limit=limit)
-    return users
+    users = await crud_user.list(db, skip=skip, limit=limit, after_id=decode_cursor(cursor), columns=USER_COLUMNS)
+    total = await crud_user.count(db) if count else None
+    return rows_response(users, User, limit=limit, if_none_match=if_none_match, total=total)
 
 
 @router.get("/me", response_model=User)
-def retrieve_user_me(current_user: model_user = Depends(get_current_user)) -> Any:
+async def retrieve_user_me(current_user: model_user = Depends(get_current_user)) -> Any:
     return current_user
 
 
 @router.post("/register", response_model=User)
-def create_user(
+async def create_user(
         *,
-        db: Session = Depends(get_db),
+        db: DBSession = Depends(get_session),
         user_sch: UserCreate,
 ) -> Any:
-    user = crud_user.retrieve_by_email(db, email=user_sch.email)
+    user = await crud_user.retrieve_by_email(db, email=user_sch.email)
 
     if user:
         raise UserExistsException
 
-    user = crud_user.create(db, obj=user_sch)
+    user = await crud_user.create(db, obj=user_sch)
     return user
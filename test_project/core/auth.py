@@ -1,10 +1,17 @@
+import asyncio
+import multiprocessing
+import time
+
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt
 from passlib.context import CryptContext
-from typing import Union, Any
+from typing import Any, Callable, Dict, Optional, Tuple, Union
 
+from test_project.core.exceptions import PasswordPoolSaturatedException
 from test_project.core.settings import get_settings
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -19,6 +26,94 @@ def get_password_hash(password: str):
     return pwd_context.hash(password)
 
 
+def _timed_call(fn: Callable[..., Any], *args: Any) -> Tuple[Any, float, float]:
+    started_at = time.time()
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, started_at, time.perf_counter() - start
+
+
+class PasswordPool:
+    """
+    Runs bcrypt in a dedicated process pool so logins and registrations neither hold
+    the GIL nor occupy the request threadpool. Work beyond `size + queue_depth`
+    pending calls is rejected immediately instead of queueing without bound.
+    """
+
+    def __init__(self, size: int, queue_depth: int):
+        self.size = size
+        self.queue_depth = queue_depth
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        self.queue_wait_seconds_total = 0.0
+        self.queue_wait_seconds_max = 0.0
+        self.hash_seconds_total = 0.0
+        self.hash_seconds_max = 0.0
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def start(self) -> None:
+        if self.size and self._executor is None:
+            # spawn: forking a server process that already runs threads and an event loop is unsafe
+            self._executor = ProcessPoolExecutor(self.size, mp_context=multiprocessing.get_context("spawn"))
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(get_password_hash, password)
+
+    async def _run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        if self.in_flight >= max(self.size, 1) + self.queue_depth:
+            self.rejected += 1
+            raise PasswordPoolSaturatedException
+
+        self.in_flight += 1
+        try:
+            submitted_at = time.time()
+            if self.size:
+                self.start()
+                result, started_at, hash_seconds = await asyncio.get_running_loop().run_in_executor(
+                    self._executor, _timed_call, fn, *args
+                )
+            else:
+                result, started_at, hash_seconds = await run_in_threadpool(_timed_call, fn, *args)
+        finally:
+            self.in_flight -= 1
+
+        queue_wait = max(started_at - submitted_at, 0.0)
+        self.completed += 1
+        self.queue_wait_seconds_total += queue_wait
+        self.queue_wait_seconds_max = max(self.queue_wait_seconds_max, queue_wait)
+        self.hash_seconds_total += hash_seconds
+        self.hash_seconds_max = max(self.hash_seconds_max, hash_seconds)
+        return result
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        return {
+            "size": self.size,
+            "queue_depth": self.queue_depth,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "queue_wait_seconds_total": self.queue_wait_seconds_total,
+            "queue_wait_seconds_max": self.queue_wait_seconds_max,
+            "hash_seconds_total": self.hash_seconds_total,
+            "hash_seconds_max": self.hash_seconds_max,
+        }
+
+
+password_pool = PasswordPool(
+    size=get_settings().auth.password_pool_size,
+    queue_depth=get_settings().auth.password_pool_queue_depth,
+)
+
+
 def create_oauth_token(subject: Union[str, Any], expired_miutes: int) -> str:
     expire = datetime.utcnow() + timedelta(minutes=expired_miutes)
     to_encode = {"exp": expire, "sub": str(subject)}
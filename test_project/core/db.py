@@ -1,6 +1,10 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker, Session
+from typing import Union
 
+from test_project.core.metrics import MeteredAsyncAdaptedQueuePool, MeteredQueuePool, instrument_engine
+from test_project.core.request_cache import request_cache_scope
 from test_project.core.settings import get_settings
 
 
@@ -10,11 +14,32 @@ pg_user = get_settings().postgresql.user
 pg_password = get_settings().postgresql.password
 pg_db = get_settings().postgresql.db
 pg_db_url = f"postgresql+psycopg2://{pg_user}:{pg_password}@{pg_host}:{pg_port}/{pg_db}"
+pg_async_db_url = f"postgresql+asyncpg://{pg_user}:{pg_password}@{pg_host}:{pg_port}/{pg_db}"
 
-engine = create_engine(pg_db_url, pool_pre_ping=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+engine = create_engine(pg_db_url, pool_pre_ping=True, poolclass=MeteredQueuePool)
+instrument_engine(engine)
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+async_engine = create_async_engine(pg_async_db_url, pool_pre_ping=True, poolclass=MeteredAsyncAdaptedQueuePool)
+instrument_engine(async_engine.sync_engine)
+AsyncSessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, expire_on_commit=False, bind=async_engine, class_=AsyncSession
+)
+
+DBSession = Union[Session, AsyncSession]
 
 
 def get_db() -> Session:
-    with SessionLocal() as session:
+    with SessionLocal() as session, request_cache_scope(session):
         yield session
+
+
+async def get_async_db() -> AsyncSession:
+    async with AsyncSessionLocal() as session:
+        with request_cache_scope(session):
+            yield session
+
+
+# Routers depend on `get_session`; `postgresql.use_async` picks the driver so both stacks
+# can be benchmarked with the same handlers.
+get_session = get_async_db if get_settings().postgresql.use_async else get_db
@@ -0,0 +1,55 @@
+import hashlib
+
+from fastapi import Response, status
+from typing import Optional
+
+from test_project.core.exceptions import PreconditionFailedException
+
+
+def version_etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def body_etag(body: bytes) -> str:
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    # If-None-Match compares weakly and may list several tags or "*"
+    if not if_none_match:
+        return False
+
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+
+
+def parse_if_match(if_match: Optional[str]) -> Optional[int]:
+    """
+    The row version a write is conditional on, None when the request sets no precondition.
+    Anything that is not one of our version tags can never match.
+    """
+    if not if_match or if_match.strip() == "*":
+        return None
+
+    tag = if_match.strip()
+    if len(tag) < 3 or tag[0] != '"' or tag[-1] != '"' or not tag[1:-1].isdigit():
+        raise PreconditionFailedException
+    return int(tag[1:-1])
+
+
+def not_modified(response: Response, etag: str) -> Response:
+    headers = {
+        key: value for key, value in response.headers.items() if key not in ("content-length", "content-type")
+    }
+    headers["etag"] = etag
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+
+def conditional(response: Response, if_none_match: Optional[str]) -> Response:
+    # lists have no single row version, the tag is a digest of the rendered page
+    etag = body_etag(response.body)
+    if etag_matches(if_none_match, etag):
+        return not_modified(response, etag)
+
+    response.headers["etag"] = etag
+    return response
@@ -11,7 +11,10 @@ from test_project.core.exceptions import (
     ProjectNotFoundException,
     PermissionException,
     IssueNotFoundException,
-    ProjectRequiredException
+    ProjectRequiredException,
+    InvalidCursorException,
+    PasswordPoolSaturatedException,
+    PreconditionFailedException
 )
 
 
@@ -83,3 +86,24 @@ def custom_exception_handler(_: Request, exc: Exception) -> ORJSONResponse:
             status_code=status.HTTP_404_NOT_FOUND, content={
                 "detail": "Project is required"}
         )
+
+    if isinstance(exc, InvalidCursorException):
+        return ORJSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST, content={
+                "detail": "Invalid cursor"}
+        )
+
+    if isinstance(exc, PasswordPoolSaturatedException):
+        return ORJSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={
+                "detail": "Server is busy, try again later",
+            },
+            headers={"Retry-After": "1"},
+        )
+
+    if isinstance(exc, PreconditionFailedException):
+        return ORJSONResponse(
+            status_code=status.HTTP_412_PRECONDITION_FAILED, content={
+                "detail": "Resource has changed"}
+        )
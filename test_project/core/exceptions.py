@@ -30,3 +30,22 @@ class IssueNotFoundException(Exception):
 class ProjectRequiredException(Exception):
     pass
 
+
+class InvalidCursorException(Exception):
+    pass
+
+
+class PasswordPoolSaturatedException(Exception):
+    pass
+
+
+class MailCircuitOpenException(Exception):
+    pass
+
+
+class MailPoolExhaustedException(Exception):
+    pass
+
+
+class PreconditionFailedException(Exception):
+    pass
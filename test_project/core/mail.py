@@ -1,24 +1,193 @@
 import logging
 import smtplib
+import threading
+import time
+
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+
+from test_project.core.exceptions import MailCircuitOpenException, MailPoolExhaustedException
+from test_project.core.settings import Mail, get_settings
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls for
+    `reset_timeout` seconds, then lets a single trial call through (half-open).
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.opened_at is None:
+                return True
+
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                # half-open: restart the timer so only this caller probes the server
+                self.opened_at = time.monotonic()
+                return True
+
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class SMTPPool:
+    """
+    Keeps up to `size` SMTP sessions open between sends. A session idle for longer
+    than `keepalive` seconds is checked with NOOP before it is reused.
+    """
+
+    def __init__(self, host: str, port: int, size: int, connect_timeout: float, send_timeout: float, keepalive: float):
+        self.host = host
+        self.port = port
+        self.connect_timeout = connect_timeout
+        self.send_timeout = send_timeout
+        self.keepalive = keepalive
+        self._idle: List[Tuple[smtplib.SMTP, float]] = []
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self) -> Iterator[smtplib.SMTP]:
+        if not self._slots.acquire(timeout=self.send_timeout):
+            raise MailPoolExhaustedException
+
+        conn = None
+        try:
+            conn = self._checkout()
+            yield conn
+        except Exception:
+            self._close(conn)
+            conn = None
+            raise
+        finally:
+            if conn is not None:
+                with self._lock:
+                    self._idle.append((conn, time.monotonic()))
+            self._slots.release()
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._close(conn)
+
+    def _checkout(self) -> smtplib.SMTP:
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                conn, last_used = self._idle.pop()
+
+            if time.monotonic() - last_used < self.keepalive or self._is_alive(conn):
+                return conn
+            self._close(conn)
+
+        conn = smtplib.SMTP(self.host, self.port, timeout=self.connect_timeout)
+        conn.sock.settimeout(self.send_timeout)
+        return conn
+
+    @staticmethod
+    def _is_alive(conn: smtplib.SMTP) -> bool:
+        try:
+            return conn.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    @staticmethod
+    def _close(conn: Optional[smtplib.SMTP]) -> None:
+        if conn is None:
+            return
+        try:
+            conn.quit()
+        except (smtplib.SMTPException, OSError):
+            conn.close()
 
 
 class SendMail:
-    def __init__(self):
-        self.email_url = "mailhog:1025"
+    def __init__(self, settings: Mail):
+        self.pool = SMTPPool(
+            host=settings.host,
+            port=settings.port,
+            size=settings.pool_size,
+            connect_timeout=settings.connect_timeout,
+            send_timeout=settings.send_timeout,
+            keepalive=settings.keepalive,
+        )
+        self.breaker = CircuitBreaker(settings.breaker_failures, settings.breaker_reset)
+
+    def deliver(self, messages: List[str]) -> None:
+        # raises on failure; every message of the batch goes through one pooled session
+        if not self.breaker.allow():
+            raise MailCircuitOpenException
+
+        try:
+            with self.pool.connection() as smtpObj:
+                for data in messages:
+                    smtpObj.sendmail("sender", "reciever", data)
+        except MailPoolExhaustedException:
+            # local back-pressure, says nothing about the server's health
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+
+        self.breaker.record_success()
 
     def send_request(self, data):
+        return self.send_requests([data])
+
+    def send_requests(self, messages: List[str]):
         try:
-            smtpObj = smtplib.SMTP(self.email_url)
-            smtpObj.sendmail("sender", "reciever", data)
-            logging.info("Successfully sent email")
+            self.deliver(messages)
+            logging.info("Successfully sent %s emails", len(messages))
         except Exception:
-            logging.warning("Error: unable to send email")
+            logging.warning("Error: unable to send emails")
 
     def send_notification_mail(
         self, user_email: str, data_mail: dict
     ):
+        return self.send_request(self.notification_message(user_email, data_mail))
+
+    def send_notification_mails(
+        self, user_email: str, data_mails: List[dict]
+    ):
+        return self.send_requests([self.notification_message(user_email, data_mail) for data_mail in data_mails])
+
+    def digest_message(self, user_email: str, data_mails: List[dict]) -> str:
+        changes = "\n".join(
+            f"        Issue #{data_mail.get('issue_id')} for Project #{data_mail.get('project_id')}: "
+            f"{data_mail.get('from_status')} -> {data_mail.get('to_status')}"
+            for data_mail in data_mails
+        )
+        return f"""From: From Bot <nomail@gmail.com>
+        To: To Person <{user_email}>
+        MIME-Version: 1.0
+        Content-type: text/html
+        Subject: Status issue digest
 
-        message = f"""From: From Bot <nomail@gmail.com>
+        {len(data_mails)} issues have changed status:
+{changes}
+        """
+
+    def notification_message(self, user_email: str, data_mail: dict) -> str:
+        return f"""From: From Bot <nomail@gmail.com>
         To: To Person <{user_email}>
         MIME-Version: 1.0
         Content-type: text/html
@@ -28,7 +197,5 @@ class SendMail:
         has changed status from {data_mail.get("from_status")} to {data_mail.get("to_status")}
         """
 
-        return self.send_request(message)
-
 
-mail = SendMail()
+mail = SendMail(get_settings().mail)
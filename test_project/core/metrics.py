@@ -0,0 +1,157 @@
+import logging
+import os
+import time
+
+from collections import Counter
+from contextvars import ContextVar
+from prometheus_client import Gauge, Histogram, multiprocess
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from starlette.types import ASGIApp, Receive, Scope, Send
+from starlette_exporter import PrometheusMiddleware
+from typing import Any, List, Optional, Tuple
+
+from test_project.core.settings import QueryBudget
+
+# Every metric here is multiprocess-safe: with PROMETHEUS_MULTIPROC_DIR set, each uvicorn worker writes
+# its samples there and /metrics (starlette_exporter.handle_metrics) merges them. Gauges are per worker
+# and summed over the live ones.
+
+POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out", "Connections checked out of the pool", ("driver",), multiprocess_mode="livesum"
+)
+POOL_OVERFLOW = Gauge(
+    "db_pool_overflow", "Connections open beyond pool_size (negative while the pool is filling)",
+    ("driver",), multiprocess_mode="livesum",
+)
+POOL_WAIT = Histogram(
+    "db_pool_wait_seconds", "Time to get a connection from the pool, opening one included", ("driver",),
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+REQUEST_STATEMENTS = Histogram(
+    "http_request_sql_statements", "SQL statements executed per request", ("method", "path"),
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+)
+REQUEST_SQL_SECONDS = Histogram(
+    "http_request_sql_seconds", "Time per request spent executing SQL statements", ("method", "path"),
+)
+
+
+class QueryStats:
+    def __init__(self):
+        self.statements = 0
+        self.seconds = 0.0
+        self.shapes: Counter = Counter()
+
+    def record(self, statement: str, seconds: float) -> None:
+        self.statements += 1
+        self.seconds += seconds
+        self.shapes[statement] += 1
+
+    def repeated(self) -> List[Tuple[str, int]]:
+        # the same SQL run again with other parameters, typically once per row of an earlier result (N+1)
+        return [(statement, count) for statement, count in self.shapes.most_common() if count > 1]
+
+    def over(self, budget: QueryBudget) -> bool:
+        return (
+            self.statements > budget.statements
+            or self.seconds > budget.sql_seconds
+            or any(count > budget.repeats for _, count in self.repeated())
+        )
+
+    def report(self, repeated_only: bool = True) -> str:
+        shapes = self.repeated() if repeated_only else self.shapes.most_common()
+        lines = [f"{self.statements} statements in {self.seconds * 1000:.1f}ms"]
+        lines.extend(f"  {count}x {' '.join(statement.split())}" for statement, count in shapes)
+        return "\n".join(lines)
+
+
+# the statements of the request being served; run_in_threadpool and the asyncpg greenlets both carry
+# the request's context, so the engine events below see it from either stack
+_request_queries: ContextVar[Optional[QueryStats]] = ContextVar("request_queries", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    if _request_queries.get() is not None:
+        context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    stats = _request_queries.get()
+    started = getattr(context, "_query_started", None)
+    if stats is not None and started is not None:
+        stats.record(statement, time.perf_counter() - started)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Count and time the statements `engine` runs for a request. For an AsyncEngine pass its `sync_engine`."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class MeteredPool:
+    """
+    Keeps the pool gauges current and observes how long each checkout waited for a connection.
+    Set as the engine's `poolclass`; dispose() recreates the pool with the same class.
+    """
+
+    def _do_get(self) -> Any:
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_WAIT.labels(self._dialect.driver).observe(time.perf_counter() - started)
+            self._set_gauges()
+
+    def _do_return_conn(self, conn: Any) -> None:
+        super()._do_return_conn(conn)
+        self._set_gauges()
+
+    def _set_gauges(self) -> None:
+        POOL_CHECKED_OUT.labels(self._dialect.driver).set(self.checkedout())
+        POOL_OVERFLOW.labels(self._dialect.driver).set(self.overflow())
+
+
+class MeteredQueuePool(MeteredPool, QueuePool):
+    pass
+
+
+class MeteredAsyncAdaptedQueuePool(MeteredPool, AsyncAdaptedQueuePool):
+    pass
+
+
+class QueryMetricsMiddleware:
+    """
+    Observes the number of SQL statements each request ran and the time they took, per route template
+    (as starlette_exporter groups paths); requests that match no route are not recorded. A request over
+    `budget` is logged with the statements it repeated.
+    """
+
+    def __init__(self, app: ASGIApp, budget: QueryBudget):
+        self.app = app
+        self.budget = budget
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = _request_queries.set(stats)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_queries.reset(token)
+            path = PrometheusMiddleware._get_router_path(scope)
+            if path is not None:
+                REQUEST_STATEMENTS.labels(scope["method"], path).observe(stats.statements)
+                REQUEST_SQL_SECONDS.labels(scope["method"], path).observe(stats.seconds)
+            if stats.over(self.budget):
+                logging.warning("Query budget exceeded by %s %s: %s", scope["method"], scope["path"], stats.report())
+
+
+def mark_process_dead() -> None:
+    # drops this worker's live gauges from the merged view when it exits
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ or "prometheus_multiproc_dir" in os.environ:
+        multiprocess.mark_process_dead(os.getpid())
@@ -0,0 +1,70 @@
+import base64
+import binascii
+
+import orjson
+from fastapi import Response
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from test_project.core.exceptions import InvalidCursorException
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+TOTAL_COUNT_HEADER = "X-Total-Count"
+TOTAL_COUNT_ESTIMATED_HEADER = "X-Total-Count-Estimated"
+
+# (count, exact): past the exact count limit the count is the planner's estimate
+Total = Tuple[int, bool]
+
+
+def encode_cursor(last_id: int, **keys: Any) -> str:
+    return base64.urlsafe_b64encode(orjson.dumps({"id": last_id, **keys})).decode().rstrip("=")
+
+
+def _decode_payload(cursor: str) -> Dict[str, Any]:
+    try:
+        payload = orjson.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        last_id = payload["id"]
+    except (binascii.Error, orjson.JSONDecodeError, KeyError, TypeError, ValueError):
+        raise InvalidCursorException
+
+    if not isinstance(last_id, int) or isinstance(last_id, bool):
+        raise InvalidCursorException
+
+    return payload
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[int]:
+    if cursor is None:
+        return None
+
+    return _decode_payload(cursor)["id"]
+
+
+def decode_rank_cursor(cursor: Optional[str]) -> Optional[Tuple[float, int]]:
+    # ranked results resume after the (rank, id) of the last one seen
+    if cursor is None:
+        return None
+
+    payload = _decode_payload(cursor)
+    rank = payload.get("rank")
+    if not isinstance(rank, (int, float)) or isinstance(rank, bool):
+        raise InvalidCursorException
+
+    return rank, payload["id"]
+
+
+def set_next_cursor(response: Response, items: List[Any], limit: int, keys: Sequence[str] = ()) -> None:
+    # a full page means there may be more rows, the client resumes after the last id it has seen
+    if limit and len(items) == limit:
+        last = items[-1]
+        if isinstance(last, dict):
+            cursor = encode_cursor(last["id"], **{key: last[key] for key in keys})
+        else:
+            cursor = encode_cursor(last.id, **{key: getattr(last, key) for key in keys})
+        response.headers[NEXT_CURSOR_HEADER] = cursor
+
+
+def set_total_count(response: Response, total: Total) -> None:
+    count, exact = total
+    response.headers[TOTAL_COUNT_HEADER] = str(count)
+    if not exact:
+        response.headers[TOTAL_COUNT_ESTIMATED_HEADER] = "true"
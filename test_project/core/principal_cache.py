@@ -0,0 +1,85 @@
+import threading
+import time
+
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from test_project.core.settings import get_settings
+from test_project.models.models import User
+
+
+class PrincipalCache:
+    """
+    Bounded LRU of bearer token -> authenticated user, so a hit skips both the JWT
+    signature check and the user lookup. Entries never outlive the token `exp`.
+    """
+
+    def __init__(self, max_size: int, ttl: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.generation = 0
+        self._entries: "OrderedDict[str, Tuple[float, User]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[User]:
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None or entry[0] <= time.time():
+                if entry is not None:
+                    del self._entries[token]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, token: str, user: User, *, expires_at: float, generation: int) -> None:
+        if not self.max_size:
+            return
+
+        with self._lock:
+            # an invalidation ran while the user was being loaded, the row may already be stale
+            if generation != self.generation:
+                return
+
+            self._entries[token] = (min(expires_at, time.time() + self.ttl), self._detach(user))
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_id: int) -> None:
+        with self._lock:
+            self.generation += 1
+            for token in [token for token, (_, user) in self._entries.items() if user.id == user_id]:
+                del self._entries[token]
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+    @staticmethod
+    def _detach(user: User) -> User:
+        # cache a transient copy, the loaded instance belongs to the request's session
+        return User(**{column.key: getattr(user, column.key) for column in User.__table__.columns})
+
+
+principal_cache = PrincipalCache(
+    max_size=get_settings().auth.principal_cache_size,
+    ttl=get_settings().auth.principal_cache_ttl,
+)
@@ -0,0 +1,75 @@
+import threading
+
+from contextlib import contextmanager
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from typing import Any, Dict, Iterator, Optional, Tuple, Union
+
+REQUEST_CACHE_KEY = "request_cache"
+
+
+class RequestCache:
+    """
+    Rows a request already fetched by primary key. It lives in `session.info`, so it is created
+    and dropped with the request's session; writes through CRUDBase update the cached instances
+    in place (UPDATE ... RETURNING populates the identity map), which keeps entries current.
+    """
+
+    def __init__(self):
+        self.lookups = 0
+        self.hits_saved = 0
+        self._entries: Dict[Tuple[type, Any], Any] = {}
+
+    def get(self, model: type, id: Any) -> Optional[Any]:
+        self.lookups += 1
+        obj = self._entries.get((model, id))
+        if obj is not None:
+            self.hits_saved += 1
+        return obj
+
+    def add(self, obj: Any) -> None:
+        self._entries[(type(obj), obj.id)] = obj
+
+
+class RequestCacheStats:
+    def __init__(self):
+        self.requests = 0
+        self.lookups = 0
+        self.hits_saved = 0
+        self._lock = threading.Lock()
+
+    def record(self, cache: RequestCache) -> None:
+        with self._lock:
+            self.requests += 1
+            self.lookups += cache.lookups
+            self.hits_saved += cache.hits_saved
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"requests": self.requests, "lookups": self.lookups, "hits_saved": self.hits_saved}
+
+
+def _info(db: Union[Session, AsyncSession]) -> Dict[str, Any]:
+    return db.sync_session.info if isinstance(db, AsyncSession) else db.info
+
+
+def attach_request_cache(db: Union[Session, AsyncSession]) -> RequestCache:
+    cache = _info(db)[REQUEST_CACHE_KEY] = RequestCache()
+    return cache
+
+
+@contextmanager
+def request_cache_scope(db: Union[Session, AsyncSession]) -> Iterator[RequestCache]:
+    cache = attach_request_cache(db)
+    try:
+        yield cache
+    finally:
+        request_cache_stats.record(cache)
+
+
+def request_cache(db: Union[Session, AsyncSession]) -> Optional[RequestCache]:
+    # only request sessions carry one, scripts and the worker keep plain lookups
+    return _info(db).get(REQUEST_CACHE_KEY)
+
+
+request_cache_stats = RequestCacheStats()
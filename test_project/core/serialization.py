@@ -0,0 +1,161 @@
+import codecs
+import csv
+import io
+
+import orjson
+from fastapi import Response
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Sequence, Tuple, Type
+
+from test_project.core.etag import conditional
+from test_project.core.pagination import Total, set_next_cursor, set_total_count
+from test_project.models.models import Base
+
+
+def schema_columns(model: Type[Base], schema: Type[BaseModel]) -> List[Any]:
+    # the response model's fields in its own order, so rows serialize to the same document it would
+    return [getattr(model, name) for name in schema.__fields__]
+
+
+def rows_response(
+    rows: Iterable[Sequence[Any]],
+    schema: Type[BaseModel],
+    *,
+    limit: int,
+    if_none_match: Optional[str] = None,
+    cursor_keys: Sequence[str] = (),
+    total: Optional[Total] = None
+) -> Response:
+    """
+    Serialize a page of rows selected with `schema_columns` straight to orjson, skipping ORM
+    hydration and the `orm_mode` validation `response_model` would do. `total`, when counted,
+    goes out as X-Total-Count.
+    """
+    fields = list(schema.__fields__)
+    items: List[Dict[str, Any]] = [dict(zip(fields, row)) for row in rows]
+    response = ORJSONResponse(items)
+    set_next_cursor(response, items, limit, cursor_keys)
+    if total is not None:
+        set_total_count(response, total)
+    return conditional(response, if_none_match)
+
+
+async def ndjson_stream(
+    partitions: AsyncIterator[Sequence[Sequence[Any]]], schema: Type[BaseModel]
+) -> AsyncIterator[bytes]:
+    fields = list(schema.__fields__)
+    async for rows in partitions:
+        yield b"".join(orjson.dumps(dict(zip(fields, row))) + b"\n" for row in rows)
+
+
+async def csv_stream(
+    partitions: AsyncIterator[Sequence[Sequence[Any]]], schema: Type[BaseModel]
+) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(schema.__fields__)
+    async for rows in partitions:
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+    # an empty export still gets its header line
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+Record = Tuple[int, Optional[Dict[str, Any]]]
+
+
+class RecordDecoder:
+    """
+    Splits an upload arriving in arbitrary byte chunks into records, buffering only the
+    unfinished last line. Records come out as (line number, fields) pairs; fields is None for
+    a record that could not be decoded, and `malformed` says why.
+    """
+
+    malformed = "Malformed record"
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+        self._tail = ""
+        self._line = 0
+
+    def feed(self, data: bytes) -> List[Record]:
+        lines = (self._tail + self._decoder.decode(data)).split("\n")
+        self._tail = lines.pop()
+        return self._records(lines)
+
+    def close(self) -> List[Record]:
+        tail = self._tail + self._decoder.decode(b"", final=True)
+        self._tail = ""
+        return self._records([tail] if tail else []) + self._finish()
+
+    def _records(self, lines: List[str]) -> List[Record]:
+        records = []
+        for line in lines:
+            self._line += 1
+            record = self._decode(self._line, line.rstrip("\r"))
+            if record is not None:
+                records.append(record)
+        return records
+
+    def _decode(self, number: int, line: str) -> Optional[Record]:
+        raise NotImplementedError
+
+    def _finish(self) -> List[Record]:
+        return []
+
+
+class NDJSONDecoder(RecordDecoder):
+    malformed = "Invalid JSON object"
+
+    def _decode(self, number: int, line: str) -> Optional[Record]:
+        if not line.strip():
+            return None
+        try:
+            fields = orjson.loads(line)
+        except orjson.JSONDecodeError:
+            fields = None
+        return number, fields if isinstance(fields, dict) else None
+
+
+class CSVDecoder(RecordDecoder):
+    """
+    The first record is the header. A quoted field may span lines: a record is complete once
+    its quotes balance, since an escaped quote is always doubled.
+    """
+
+    malformed = "Wrong number of fields"
+
+    def __init__(self):
+        super().__init__()
+        self._header: Optional[List[str]] = None
+        self._pending: List[str] = []
+        self._quotes = 0
+        self._start = 0
+
+    def _decode(self, number: int, line: str) -> Optional[Record]:
+        if not self._pending:
+            if not line:
+                return None
+            self._start = number
+        self._pending.append(line)
+        self._quotes += line.count('"')
+        if self._quotes % 2:
+            return None
+
+        values = next(csv.reader(["\n".join(self._pending)]))
+        self._pending, self._quotes = [], 0
+        if self._header is None:
+            self._header = values
+            return None
+        if len(values) != len(self._header):
+            return self._start, None
+        return self._start, dict(zip(self._header, values))
+
+    def _finish(self) -> List[Record]:
+        # a quote left open at the end of the upload
+        return [(self._start, None)] if self._pending else []
@@ -22,6 +22,10 @@ class Auth(BaseSettings):
     secret_key: str
     algorithm: str
     access_token_expire_minutes: int
+    principal_cache_size: int = 10000
+    principal_cache_ttl: int = 60
+    password_pool_size: int = 4
+    password_pool_queue_depth: int = 64
 
 
 class Postgresql(BaseSettings):
@@ -30,12 +34,54 @@ class Postgresql(BaseSettings):
     user: str
     password: str
     db: str
+    use_async: bool = False
+
+
+class Mail(BaseSettings):
+    host: str = "mailhog"
+    port: int = 1025
+    pool_size: int = 4
+    connect_timeout: float = 5
+    send_timeout: float = 10
+    keepalive: float = 30
+    breaker_failures: int = 5
+    breaker_reset: float = 30
+
+
+class Outbox(BaseSettings):
+    batch_size: int = 100
+    poll_interval: float = 1
+    max_attempts: int = 8
+    backoff_base: float = 2
+    backoff_max: float = 300
+    digest: bool = False
+    digest_window: float = 60
+
+
+class Importer(BaseSettings):
+    chunk_size: int = 5000
+    max_errors: int = 1000
+
+
+class Pagination(BaseSettings):
+    exact_count_limit: int = 10000
+
+
+class QueryBudget(BaseSettings):
+    statements: int = 15
+    sql_seconds: float = 0.5
+    repeats: int = 5
 
 
 class Settings(BaseSettings):
     server: Server
     auth: Auth
     postgresql: Postgresql
+    mail: Mail
+    outbox: Outbox
+    importer: Importer
+    pagination: Pagination
+    query_budget: QueryBudget
 
 
 def make_settings() -> Settings:
@@ -44,6 +90,11 @@ def make_settings() -> Settings:
         server=Server.parse_obj(parsed_settings["server"]),
         auth=Auth.parse_obj(parsed_settings["auth"]),
         postgresql=Postgresql.parse_obj(parsed_settings["postgresql"]),
+        mail=Mail.parse_obj(parsed_settings.get("mail", {})),
+        outbox=Outbox.parse_obj(parsed_settings.get("outbox", {})),
+        importer=Importer.parse_obj(parsed_settings.get("importer", {})),
+        pagination=Pagination.parse_obj(parsed_settings.get("pagination", {})),
+        query_budget=QueryBudget.parse_obj(parsed_settings.get("query_budget", {})),
     )
 
 
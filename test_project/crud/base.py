@@ -1,14 +1,56 @@
+import orjson
+from fastapi.concurrency import run_in_threadpool
 from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
-from sqlalchemy import and_
-from typing import Any, Dict, Generic, List, Optional, Type, TypeVar, Union
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Query, Session
+from sqlalchemy.sql import Select, Update
+from sqlalchemy import and_, func, select, update
+from typing import Any, AsyncIterator, Callable, Dict, Generic, List, Optional, Sequence, Type, TypeVar, Union
 
+from test_project.core.db import DBSession
+from test_project.core.pagination import Total
+from test_project.core.request_cache import request_cache
+from test_project.core.settings import get_settings
 from test_project.models.models import Base
 
 ModelType = TypeVar("ModelType", bound=Base)
 CreateSchemaType = TypeVar("CreateSchemaType", bound=BaseModel)
 UpdateSchemaType = TypeVar("UpdateSchemaType", bound=BaseModel)
+CRUDType = TypeVar("CRUDType", bound="CRUDBase")
+
+
+async def run_in_session(db: DBSession, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """
+    Await a sync CRUD callable against either session type: on an AsyncSession it runs
+    on the event loop through asyncpg, on a Session it is moved to the threadpool.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+
+async def stream_in_session(db: DBSession, statement: Select, *, size: int) -> AsyncIterator[List[Row]]:
+    """
+    Yield the statement's rows in partitions of `size` from a server-side cursor, so only one
+    partition is ever held in memory.
+    """
+    if isinstance(db, AsyncSession):
+        result = await db.stream(statement)
+        async for partition in result.partitions(size):
+            yield partition
+        return
+
+    result = await run_in_threadpool(
+        db.execute, statement.execution_options(stream_results=True, max_row_buffer=size)
+    )
+    partitions = result.partitions(size)
+    while True:
+        partition = await run_in_threadpool(next, partitions, None)
+        if partition is None:
+            return
+        yield partition
 
 
 class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
@@ -16,10 +58,66 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         self.model = model
 
     def retrieve(self, db: Session, id: Any) -> Optional[ModelType]:
+        cache = request_cache(db)
+        db_obj = cache.get(self.model, id) if cache is not None else None
+        if db_obj is None:
+            db_obj = self._retrieve(db, id)
+            if cache is not None and db_obj is not None:
+                cache.add(db_obj)
+
+        # a cached row may have been soft deleted since by this same request
+        return None if db_obj is None or db_obj.is_deleted else db_obj
+
+    def _retrieve(self, db: Session, id: Any) -> Optional[ModelType]:
         return db.query(self.model).filter(and_(self.model.id == id, self.model.is_deleted.is_(False))).first()
 
-    def list(self, db: Session, *, skip: int = 0, limit: int = 100) -> List[ModelType]:
-        return db.query(self.model).filter(self.model.is_deleted.is_(False)).offset(skip).limit(limit).all()
+    def list(
+        self,
+        db: Session,
+        *,
+        skip: int = 0,
+        limit: int = 100,
+        after_id: Optional[int] = None,
+        columns: Optional[Sequence[Any]] = None
+    ) -> List[Union[ModelType, Row]]:
+        query = self._query(db, columns).filter(self.model.is_deleted.is_(False))
+        return self._paginate(query, skip=skip, limit=limit, after_id=after_id)
+
+    def count(self, db: Session, *, exact_limit: Optional[int] = None) -> Total:
+        return self._count(self._query(db, [self.model.id]).filter(self.model.is_deleted.is_(False)), exact_limit)
+
+    def _count(self, query: Query, exact_limit: Optional[int] = None) -> Total:
+        """
+        The number of rows `query` yields. Exact up to `exact_limit`: counting a capped subquery reads at
+        most one row past it. Above that it is the planner's estimate, so no list ever costs a full scan.
+        """
+        if exact_limit is None:
+            exact_limit = get_settings().pagination.exact_count_limit
+        db = query.session
+        count = db.query(func.count()).select_from(query.limit(exact_limit + 1).subquery()).scalar()
+        if count <= exact_limit:
+            return count, True
+
+        # EXPLAIN only plans the query; values are ids and flags, safe to inline as literals
+        statement = query.statement.compile(dialect=db.get_bind().dialect, compile_kwargs={"literal_binds": True})
+        plan = db.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}").scalar()
+        if isinstance(plan, str):
+            plan = orjson.loads(plan)
+        # the estimate can't go below what was just counted
+        return max(int(plan[0]["Plan"]["Plan Rows"]), count), False
+
+    def _query(self, db: Session, columns: Optional[Sequence[Any]]) -> Query:
+        # with columns the query yields plain rows: nothing is hydrated into the identity map
+        return db.query(*columns) if columns else db.query(self.model)
+
+    def _paginate(
+        self, query: Query, *, skip: int, limit: int, after_id: Optional[int]
+    ) -> List[Union[ModelType, Row]]:
+        # keyset mode seeks past the last seen id on the primary key, so any page costs the same as the first
+        query = query.order_by(self.model.id)
+        if after_id is not None:
+            return query.filter(self.model.id > after_id).limit(limit).all()
+        return query.offset(skip).limit(limit).all()
 
     def create(self, db: Session, *, obj: CreateSchemaType) -> ModelType:
         obj_in_data = jsonable_encoder(obj)
@@ -29,25 +127,110 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         db.refresh(db_obj)
         return db_obj
 
-    def update(self, db: Session, *, db_obj: ModelType, obj: Union[UpdateSchemaType, Dict[str, Any]]) -> ModelType:
-        obj_data = jsonable_encoder(db_obj)
+    def update(
+        self,
+        db: Session,
+        *,
+        db_obj: ModelType,
+        obj: Union[UpdateSchemaType, Dict[str, Any]],
+        version: Optional[int] = None
+    ) -> Optional[ModelType]:
+        return self.update_by_id(db, id=db_obj.id, obj=obj, version=version)
 
+    def update_by_id(
+        self, db: Session, *, id: int, obj: Union[UpdateSchemaType, Dict[str, Any]], version: Optional[int] = None
+    ) -> Optional[ModelType]:
         if isinstance(obj, dict):
             update_data = obj
         else:
             update_data = obj.dict(exclude_unset=True)
 
-        for field in obj_data:
-            if field in update_data:
-                setattr(db_obj, field, update_data[field])
+        values = {field: value for field, value in update_data.items() if field in self.model.__table__.columns}
+        return self._write(db, id=id, values=values, version=version)
 
-        db.add(db_obj)
-        db.commit()
-        db.refresh(db_obj)
+    def delete(self, db: Session, *, id: int) -> Optional[ModelType]:
+        return self._write(db, id=id, values={"is_deleted": True})
+
+    def _write(
+        self, db: Session, *, id: int, values: Dict[str, Any], version: Optional[int] = None
+    ) -> Optional[ModelType]:
+        db_obj = self._update_returning(db, id=id, values=values, version=version)
+        if db_obj is None:
+            # nothing matched, don't commit whatever else the request staged in the session
+            db.rollback()
+        else:
+            db.commit()
         return db_obj
 
-    def delete(self, db: Session, *, id: int) -> ModelType:
-        obj = db.query(self.model).get(id)
-        obj.is_deleted = True
-        db.commit()
-        return obj
+    def _update_returning(
+        self,
+        db: Session,
+        *,
+        id: int,
+        values: Dict[str, Any],
+        is_deleted: bool = False,
+        version: Optional[int] = None
+    ) -> Optional[ModelType]:
+        # one UPDATE ... RETURNING round trip; the returned row overwrites the identity map copy,
+        # so there is no pre-read and no refresh
+        statement = self._update_statement(id=id, values=values, is_deleted=is_deleted, version=version)
+        if statement is None:
+            return self.retrieve(db, id=id)
+
+        return db.execute(
+            select(self.model)
+            .from_statement(statement.returning(*self.model.__table__.columns))
+            .execution_options(populate_existing=True)
+        ).scalars().first()
+
+    def _update_statement(
+        self, *, id: int, values: Dict[str, Any], is_deleted: bool, version: Optional[int]
+    ) -> Optional[Update]:
+        statement = update(self.model).where(self.model.id == id, self.model.is_deleted.is_(is_deleted))
+        if "version" in self.model.__table__.columns:
+            values = {**values, "version": self.model.version + 1}
+            if version is not None:
+                # optimistic concurrency: the write only lands on the version the client has seen
+                statement = statement.where(self.model.version == version)
+        elif not values:
+            return None
+        return statement.values(**values)
+
+
+class AsyncCRUDBase(Generic[CRUDType]):
+    def __init__(self, crud: CRUDType):
+        self.crud = crud
+        self.model = crud.model
+
+    async def retrieve(self, db: DBSession, id: Any) -> Optional[Base]:
+        return await run_in_session(db, self.crud.retrieve, id=id)
+
+    async def list(
+        self,
+        db: DBSession,
+        *,
+        skip: int = 0,
+        limit: int = 100,
+        after_id: Optional[int] = None,
+        columns: Optional[Sequence[Any]] = None
+    ) -> List[Union[Base, Row]]:
+        return await run_in_session(db, self.crud.list, skip=skip, limit=limit, after_id=after_id, columns=columns)
+
+    async def count(self, db: DBSession, *, exact_limit: Optional[int] = None) -> Total:
+        return await run_in_session(db, self.crud.count, exact_limit=exact_limit)
+
+    async def create(self, db: DBSession, *, obj: BaseModel) -> Base:
+        return await run_in_session(db, self.crud.create, obj=obj)
+
+    async def update(
+        self, db: DBSession, *, db_obj: Base, obj: Union[BaseModel, Dict[str, Any]], version: Optional[int] = None
+    ) -> Optional[Base]:
+        return await run_in_session(db, self.crud.update, db_obj=db_obj, obj=obj, version=version)
+
+    async def update_by_id(
+        self, db: DBSession, *, id: int, obj: Union[BaseModel, Dict[str, Any]], version: Optional[int] = None
+    ) -> Optional[Base]:
+        return await run_in_session(db, self.crud.update_by_id, id=id, obj=obj, version=version)
+
+    async def delete(self, db: DBSession, *, id: int) -> Base:
+        return await run_in_session(db, self.crud.delete, id=id)
@@ -1,47 +1,405 @@
+import csv
+import io
+
 from fastapi.encoders import jsonable_encoder
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
-from typing import List
+from sqlalchemy.dialects.postgresql import DOUBLE_PRECISION
+from sqlalchemy.orm import Query, Session, aliased, joinedload
+from sqlalchemy import and_, cast, func, insert, literal_column, or_, select, true, update
+from sqlalchemy.engine import Row
+from sqlalchemy.sql import Select
+from sqlalchemy.util import await_only
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple, Union
 
-from test_project.crud.base import CRUDBase
-from test_project.models.models import Issue, Project
+from test_project.core.db import DBSession
+from test_project.core.pagination import Total
+from test_project.crud.base import AsyncCRUDBase, CRUDBase, run_in_session, stream_in_session
+from test_project.crud.issue_counter import CounterKey, issue_counter, moved
+from test_project.crud.project import READ, access_clause
+from test_project.models.models import SEARCH_CONFIG, Issue, Project, User
 from test_project.models.schemas import IssueCreate, IssueUpdate
 
+COPY_COLUMNS = ("title", "type", "status", "project_id", "is_deleted")
+# a write setting any of these can move an issue between counters
+COUNTED_COLUMNS = {"project_id", "status", "type", "is_deleted", "deleted_with_project"}
+# a statement carries at most 32767 bind parameters (asyncpg refuses more); a multi-row VALUES binds
+# every column with a Python-side default too, so budget for the whole table per row
+BULK_INSERT_CHUNK = 32767 // len(Issue.__table__.columns)
+
+
+def counter_key(issue: Any) -> CounterKey:
+    return issue.project_id, issue.status, issue.type
+
+
+def is_counted(is_deleted: Optional[bool], deleted_with_project: Optional[bool]) -> bool:
+    return not is_deleted or bool(deleted_with_project)
+
 
 class IssueCrud(CRUDBase[Issue, IssueCreate, IssueUpdate]):
+    def _retrieve(self, db: Session, id: Any) -> Optional[Issue]:
+        return (
+            db.query(self.model)
+            .options(joinedload(Issue.project))
+            .filter(and_(self.model.id == id, self.model.is_deleted.is_(False)))
+            .first()
+        )
+
+    def retrieve_authorized(
+        self, db: Session, *, id: int, user: User, access: str = READ
+    ) -> Optional[Tuple[Issue, bool]]:
+        # the project's owner/assignee are checked in the same statement, issue.project is never loaded
+        return (
+            db.query(self.model, access_clause(user, access).label("allowed"))
+            .join(Project)
+            .filter(self.model.id == id, self.model.is_deleted.is_(False))
+            .first()
+        )
+
+    def create(self, db: Session, *, obj: IssueCreate) -> Issue:
+        return self.create_with_project(db, obj=obj)
+
     def create_with_project(
         self, db: Session, *, obj: IssueCreate
     ) -> Issue:
         obj_in_data = jsonable_encoder(obj)
         db_obj = self.model(**obj_in_data)
         db.add(db_obj)
+        issue_counter.apply(db, deltas=moved([], [counter_key(obj)]))
         db.commit()
         db.refresh(db_obj)
         return db_obj
 
+    def create_bulk(self, db: Session, *, objs: List[IssueCreate]) -> List[int]:
+        # multi-row INSERT ... RETURNING instead of an add/commit/refresh cycle per issue, one per chunk
+        rows = [obj.dict() for obj in objs]
+        ids = []
+        for start in range(0, len(rows), BULK_INSERT_CHUNK):
+            chunk = rows[start:start + BULK_INSERT_CHUNK]
+            ids.extend(db.execute(insert(self.model).values(chunk).returning(self.model.id)).scalars().all())
+        issue_counter.apply(db, deltas=moved([], map(counter_key, objs)))
+        db.commit()
+        return ids
+
+    def copy_create(self, db: Session, *, objs: List[IssueCreate]) -> int:
+        # the counters go first: on asyncpg that statement is also what opens the transaction COPY joins
+        issue_counter.apply(db, deltas=moved([], map(counter_key, objs)))
+
+        # COPY FROM STDIN streams the chunk in one round trip with no per-row INSERT to parse and plan
+        records = [(obj.title, obj.type, obj.status, obj.project_id, False) for obj in objs]
+        connection = db.connection().connection.driver_connection
+        if db.get_bind().dialect.driver == "asyncpg":
+            await_only(connection.copy_records_to_table(
+                self.model.__tablename__, records=records, columns=COPY_COLUMNS
+            ))
+        else:
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(records)
+            buffer.seek(0)
+            with connection.cursor() as cursor:
+                # an empty unquoted CSV field is NULL to COPY, the strings here are never None
+                cursor.copy_expert(
+                    f"COPY {self.model.__tablename__} ({', '.join(COPY_COLUMNS)}) FROM STDIN "
+                    f"WITH (FORMAT csv, FORCE_NOT_NULL (title, type, status))",
+                    buffer,
+                )
+        db.commit()
+        return len(records)
+
+    def lock_for_transition(self, db: Session, *, ids: List[int]) -> List[Row]:
+        # one set-based permission lookup; rows stay locked until transition_status commits
+        return db.execute(
+            select(self.model.id, self.model.status, self.model.project_id, Project.owner_id)
+            .join(Project)
+            .where(self.model.id.in_(ids), self.model.is_deleted.is_(False))
+            .order_by(self.model.id)
+            .with_for_update(of=self.model)
+        ).all()
+
+    def transition_status(self, db: Session, *, ids: List[int], status: str) -> List[Row]:
+        old = self._locked(self.model.id.in_(ids), self.model.is_deleted.is_(False))
+        rows = db.execute(
+            update(self.model)
+            .where(self.model.id == old.c.id)
+            .values(status=status, version=self.model.version + 1)
+            .returning(*self.model.__table__.columns, old.c.status.label("old_status"))
+            .execution_options(synchronize_session=False)
+        ).all()
+        issue_counter.apply(db, deltas=moved(
+            [(row.project_id, row.old_status, row.type) for row in rows], map(counter_key, rows)
+        ))
+        db.commit()
+        return rows
+
+    def _update_returning(
+        self,
+        db: Session,
+        *,
+        id: int,
+        values: Dict[str, Any],
+        is_deleted: bool = False,
+        version: Optional[int] = None
+    ) -> Optional[Issue]:
+        if not COUNTED_COLUMNS & values.keys():
+            return super()._update_returning(db, id=id, values=values, is_deleted=is_deleted, version=version)
+
+        # still one statement: the old row is locked and read in a CTE, its counters move with it
+        old = self._locked(self.model.id == id, self.model.is_deleted.is_(is_deleted))
+        statement = self._update_statement(id=id, values=values, is_deleted=is_deleted, version=version)
+        old_columns = [column.label(f"old_{column.key}") for column in old.c]
+        row = db.execute(
+            select(self.model, *old_columns)
+            .from_statement(
+                statement.where(self.model.id == old.c.id).returning(*self.model.__table__.columns, *old_columns)
+            )
+            .execution_options(populate_existing=True)
+        ).first()
+        if row is None:
+            return None
+
+        issue = row[0]
+        before = []
+        if is_counted(row.old_is_deleted, row.old_deleted_with_project):
+            before.append((row.old_project_id, row.old_status, row.old_type))
+        after = [counter_key(issue)] if is_counted(issue.is_deleted, issue.deleted_with_project) else []
+        issue_counter.apply(db, deltas=moved(before, after))
+        return issue
+
+    def _locked(self, *criteria: Any) -> Any:
+        # rows are locked in id order, so concurrent multi-row writers queue instead of deadlocking
+        return (
+            select(
+                self.model.id,
+                self.model.project_id,
+                self.model.status,
+                self.model.type,
+                self.model.is_deleted,
+                self.model.deleted_with_project,
+            )
+            .where(*criteria)
+            .order_by(self.model.id)
+            .with_for_update()
+            .cte("old")
+        )
+
     def list_by_project(
-        self, db: Session, *, project_id: int, skip: int = 0, limit: int = 100
+        self, db: Session, *, project_id: int, skip: int = 0, limit: int = 100, after_id: Optional[int] = None
     ) -> List[Issue]:
-        return (
-            db.query(self.model)
-            .filter(Issue.project_id == project_id, self.model.is_deleted.is_(False))
-            .offset(skip)
-            .limit(limit)
+        query = db.query(self.model).filter(Issue.project_id == project_id, self.model.is_deleted.is_(False))
+        return self._paginate(query, skip=skip, limit=limit, after_id=after_id)
+
+    def count_by_project(self, db: Session, *, project_id: int, exact_limit: Optional[int] = None) -> Total:
+        # no access check: it is for pages list_by_project_authorized has already allowed
+        query = db.query(self.model.id).filter(self.model.project_id == project_id, self.model.is_deleted.is_(False))
+        return self._count(query, exact_limit)
+
+    def list_by_project_authorized(
+        self,
+        db: Session,
+        *,
+        project_id: int,
+        user: User,
+        skip: int = 0,
+        limit: int = 100,
+        after_id: Optional[int] = None,
+        columns: Optional[Sequence[Any]] = None
+    ) -> Optional[Tuple[bool, List[Union[Issue, Tuple]]]]:
+        # the page is a LATERAL subquery left-joined to the project row, so a missing project (no rows),
+        # a forbidden one (a single row without an issue) and an empty page stay distinguishable
+        allowed = access_clause(user, READ)
+        page = (
+            select(self.model)
+            .where(self.model.project_id == Project.id, self.model.is_deleted.is_(False), allowed)
+            .order_by(self.model.id)
+        )
+        if after_id is not None:
+            page = page.where(self.model.id > after_id).limit(limit)
+        else:
+            page = page.offset(skip).limit(limit)
+        page_issue = aliased(self.model, page.lateral())
+        if columns:
+            entities = [getattr(page_issue, column.key) for column in columns]
+        else:
+            entities = [page_issue]
+
+        rows = (
+            db.query(allowed.label("allowed"), page_issue.id.label("page_id"), *entities)
+            .select_from(Project)
+            .outerjoin(page_issue, true())
+            .filter(Project.id == project_id, Project.is_deleted.is_(False))
+            .order_by(page_issue.id)
             .all()
         )
+        if not rows:
+            return None
+
+        issues = [row for row in rows if row.page_id is not None]
+        if columns:
+            return rows[0].allowed, [row[2:] for row in issues]
+        return rows[0].allowed, [row[2] for row in issues]
+
+    def export_statement(self, *, project_id: int, columns: Sequence[Any]) -> Select:
+        # walked with a server-side cursor, ordered on ix_issue_project_id_id so rows come out without a sort
+        return (
+            select(*columns)
+            .where(self.model.project_id == project_id, self.model.is_deleted.is_(False))
+            .order_by(self.model.id)
+        )
 
     def list_by_user_projects(
-        self, db: Session, *, user_id: int, skip: int = 0, limit: int = 100
+        self,
+        db: Session,
+        *,
+        user_id: int,
+        skip: int = 0,
+        limit: int = 100,
+        after_id: Optional[int] = None,
+        columns: Optional[Sequence[Any]] = None
+    ) -> List[Union[Issue, Row]]:
+        query = self._visible_to(self._query(db, columns), user_id).filter(self.model.is_deleted.is_(False))
+        return self._paginate(query, skip=skip, limit=limit, after_id=after_id)
+
+    def count_by_user_projects(self, db: Session, *, user_id: int, exact_limit: Optional[int] = None) -> Total:
+        query = self._visible_to(db.query(self.model.id), user_id).filter(self.model.is_deleted.is_(False))
+        return self._count(query, exact_limit)
+
+    def search(
+        self,
+        db: Session,
+        *,
+        q: str,
+        user_id: Optional[int] = None,
+        limit: int = 100,
+        after: Optional[Tuple[float, int]] = None,
+        columns: Optional[Sequence[Any]] = None
+    ) -> List[Row]:
+        """
+        Live issues whose title matches the web-search style query `q`, best match first, as rows
+        of `columns` (or the entity) followed by their rank. Without `user_id` every project is
+        searched, otherwise only those list_by_user_projects would show.
+        """
+        ts_query = func.websearch_to_tsquery(literal_column(f"'{SEARCH_CONFIG}'::regconfig"), q)
+        # float8, so the rank a cursor carries compares equal to the one recomputed for the next page
+        rank = cast(func.ts_rank(self.model.title_search, ts_query), DOUBLE_PRECISION)
+
+        # @@ against the column is what lets the GIN index pick the matches; only those get ranked
+        query = db.query(*(columns or [self.model]), rank.label("rank")).filter(
+            self.model.title_search.op("@@")(ts_query), self.model.is_deleted.is_(False)
+        )
+        if user_id is not None:
+            query = self._visible_to(query, user_id)
+        if after is not None:
+            after_rank, after_id = after
+            query = query.filter(or_(rank < after_rank, and_(rank == after_rank, self.model.id > after_id)))
+        return query.order_by(rank.desc(), self.model.id).limit(limit).all()
+
+    @staticmethod
+    def _visible_to(query: Query, user_id: int) -> Query:
+        # issues of the live projects the user owns or is assigned to
+        return query.join(Project).filter(
+            or_(Project.owner_id == user_id, Project.assigned_id == user_id),
+            Project.is_deleted.is_(False),
+        )
+
+
+class AsyncIssueCrud(AsyncCRUDBase[IssueCrud]):
+    async def create_with_project(self, db: DBSession, *, obj: IssueCreate) -> Issue:
+        return await run_in_session(db, self.crud.create_with_project, obj=obj)
+
+    async def create_bulk(self, db: DBSession, *, objs: List[IssueCreate]) -> List[int]:
+        return await run_in_session(db, self.crud.create_bulk, objs=objs)
+
+    async def copy_create(self, db: DBSession, *, objs: List[IssueCreate]) -> int:
+        return await run_in_session(db, self.crud.copy_create, objs=objs)
+
+    async def lock_for_transition(self, db: DBSession, *, ids: List[int]) -> List[Row]:
+        return await run_in_session(db, self.crud.lock_for_transition, ids=ids)
+
+    async def transition_status(self, db: DBSession, *, ids: List[int], status: str) -> List[Row]:
+        return await run_in_session(db, self.crud.transition_status, ids=ids, status=status)
+
+    async def list_by_project(
+        self, db: DBSession, *, project_id: int, skip: int = 0, limit: int = 100, after_id: Optional[int] = None
     ) -> List[Issue]:
+        return await run_in_session(
+            db, self.crud.list_by_project, project_id=project_id, skip=skip, limit=limit, after_id=after_id
+        )
 
-        return (
-            db.query(self.model)
-            .join(Project)
-            .filter(or_(Project.owner_id == user_id, Project.assigned_id == user_id), self.model.is_deleted.is_(False))
-            .offset(skip)
-            .limit(limit)
-            .all()
+    async def retrieve_authorized(
+        self, db: DBSession, *, id: int, user: User, access: str = READ
+    ) -> Optional[Tuple[Issue, bool]]:
+        return await run_in_session(db, self.crud.retrieve_authorized, id=id, user=user, access=access)
+
+    async def list_by_project_authorized(
+        self,
+        db: DBSession,
+        *,
+        project_id: int,
+        user: User,
+        skip: int = 0,
+        limit: int = 100,
+        after_id: Optional[int] = None,
+        columns: Optional[Sequence[Any]] = None
+    ) -> Optional[Tuple[bool, List[Union[Issue, Tuple]]]]:
+        return await run_in_session(
+            db,
+            self.crud.list_by_project_authorized,
+            project_id=project_id,
+            user=user,
+            skip=skip,
+            limit=limit,
+            after_id=after_id,
+            columns=columns,
+        )
+
+    async def count_by_project(
+        self, db: DBSession, *, project_id: int, exact_limit: Optional[int] = None
+    ) -> Total:
+        return await run_in_session(db, self.crud.count_by_project, project_id=project_id, exact_limit=exact_limit)
+
+    def stream_by_project(
+        self, db: DBSession, *, project_id: int, columns: Sequence[Any], size: int = 1000
+    ) -> AsyncIterator[List[Row]]:
+        return stream_in_session(db, self.crud.export_statement(project_id=project_id, columns=columns), size=size)
+
+    async def list_by_user_projects(
+        self,
+        db: DBSession,
+        *,
+        user_id: int,
+        skip: int = 0,
+        limit: int = 100,
+        after_id: Optional[int] = None,
+        columns: Optional[Sequence[Any]] = None
+    ) -> List[Union[Issue, Row]]:
+        return await run_in_session(
+            db,
+            self.crud.list_by_user_projects,
+            user_id=user_id,
+            skip=skip,
+            limit=limit,
+            after_id=after_id,
+            columns=columns,
+        )
+
+    async def count_by_user_projects(
+        self, db: DBSession, *, user_id: int, exact_limit: Optional[int] = None
+    ) -> Total:
+        return await run_in_session(db, self.crud.count_by_user_projects, user_id=user_id, exact_limit=exact_limit)
+
+
+    async def search(
+        self,
+        db: DBSession,
+        *,
+        q: str,
+        user_id: Optional[int] = None,
+        limit: int = 100,
+        after: Optional[Tuple[float, int]] = None,
+        columns: Optional[Sequence[Any]] = None
+    ) -> List[Row]:
+        return await run_in_session(
+            db, self.crud.search, q=q, user_id=user_id, limit=limit, after=after, columns=columns
         )
 
 
 issue = IssueCrud(Issue)
+async_issue = AsyncIssueCrud(issue)
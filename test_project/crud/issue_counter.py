@@ -0,0 +1,94 @@
+from collections import Counter
+from sqlalchemy import and_, delete, func, insert, not_, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import Row
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import ColumnElement
+from typing import Iterable, List, Optional, Tuple
+
+from test_project.core.db import DBSession
+from test_project.crud.base import run_in_session
+from test_project.models.models import Issue, IssueCounter
+
+# (project_id, status, type)
+CounterKey = Tuple[int, str, str]
+
+
+def counted() -> ColumnElement:
+    # what a counter counts: issues not deleted on their own, whatever their project's state
+    return not_(and_(Issue.is_deleted.is_(True), Issue.deleted_with_project.is_(False)))
+
+
+def moved(old: Iterable[CounterKey], new: Iterable[CounterKey]) -> Counter:
+    # -1 for every counter an issue left, +1 for every counter it joined
+    deltas = Counter(new)
+    deltas.subtract(old)
+    return deltas
+
+
+class IssueCounterCrud:
+    def __init__(self, model=IssueCounter):
+        self.model = model
+        upsert = pg_insert(model)
+        # built once: every issue write runs it, statement construction would cost more than the round trip
+        self._upsert = upsert.on_conflict_do_update(
+            index_elements=[model.project_id, model.status, model.type],
+            set_={"count": model.count + upsert.excluded["count"]},
+        )
+
+    def apply(self, db: Session, *, deltas: Counter) -> None:
+        """
+        Add `deltas` to their counters in one round trip. No commit: the counters are written by
+        the commit that persists the issue change they describe.
+        """
+        # keys in a fixed order, so two writers touching the same counters can't deadlock on them
+        rows = [
+            {"project_id": project_id, "status": status, "type": type, "count": delta}
+            for (project_id, status, type), delta in sorted(deltas.items()) if delta
+        ]
+        if rows:
+            # psycopg2 sends the parameter sets as a single multi-row VALUES
+            db.execute(self._upsert, rows)
+
+    def list_by_project(self, db: Session, *, project_id: int) -> List[Row]:
+        return db.execute(
+            select(self.model.status, self.model.type, self.model.count)
+            .where(self.model.project_id == project_id, self.model.count > 0)
+            .order_by(self.model.status, self.model.type)
+        ).all()
+
+    def reconcile(self, db: Session, *, project_id: Optional[int] = None) -> int:
+        """
+        Rebuild the counters, of one project or of all, from the issue table and commit.
+        Returns the number of counters written.
+        """
+        # writers queue on their counter upsert until this commits; one that already upserted is
+        # waited for, so its issue is in the recount either way
+        db.execute(text(f"LOCK TABLE {self.model.__tablename__} IN EXCLUSIVE MODE"))
+
+        cleared = delete(self.model)
+        recount = select(Issue.project_id, Issue.status, Issue.type, func.count()).where(counted())
+        if project_id is not None:
+            cleared = cleared.where(self.model.project_id == project_id)
+            recount = recount.where(Issue.project_id == project_id)
+        db.execute(cleared)
+        written = db.execute(
+            insert(self.model).from_select(
+                ["project_id", "status", "type", "count"],
+                recount.group_by(Issue.project_id, Issue.status, Issue.type),
+            )
+        ).rowcount
+        db.commit()
+        return written
+
+
+class AsyncIssueCounterCrud:
+    def __init__(self, crud: IssueCounterCrud):
+        self.crud = crud
+
+    async def list_by_project(self, db: DBSession, *, project_id: int) -> List[Row]:
+        return await run_in_session(db, self.crud.list_by_project, project_id=project_id)
+
+
+issue_counter = IssueCounterCrud(IssueCounter)
+async_issue_counter = AsyncIssueCounterCrud(issue_counter)
@@ -0,0 +1,90 @@
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.orm import Session
+from typing import List
+
+from test_project.core.db import DBSession
+from test_project.crud.base import run_in_session
+from test_project.models.models import NotificationOutbox
+
+
+class OutboxCrud:
+    def __init__(self, model=NotificationOutbox):
+        self.model = model
+
+    def add(self, db: Session, *, recipient: str, payload: dict) -> None:
+        # no commit: the row is written by whichever commit persists the change it describes
+        db.add(self.model(recipient=recipient, payload=payload))
+
+    def add_many(self, db: Session, *, recipient: str, payloads: List[dict]) -> None:
+        if payloads:
+            # executemany: psycopg2 pages the rows into multi-row VALUES and asyncpg reuses one prepared
+            # statement, so no single statement outgrows the bind parameter limit however many there are
+            db.execute(insert(self.model), [
+                {"recipient": recipient, "payload": payload, "status": "pending", "attempts": 0}
+                for payload in payloads
+            ])
+
+    def claim_batch(self, db: Session, *, limit: int) -> List[NotificationOutbox]:
+        # rows stay locked until the caller commits; concurrent workers skip them instead of waiting
+        return (
+            db.query(self.model)
+            .filter(self.model.status == "pending", self.model.available_at <= datetime.now(timezone.utc))
+            .order_by(self.model.available_at, self.model.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+
+    def claim_digest_batch(self, db: Session, *, limit: int, window: float) -> List[NotificationOutbox]:
+        # every due row of up to `limit` recipients whose oldest pending row has waited out the window
+        now = datetime.now(timezone.utc)
+        due = (self.model.status == "pending", self.model.available_at <= now)
+        recipients = (
+            select(self.model.recipient)
+            .where(*due)
+            .group_by(self.model.recipient)
+            .having(func.min(self.model.created_at) <= now - timedelta(seconds=window))
+            .limit(limit)
+        )
+        return (
+            db.query(self.model)
+            .filter(*due, self.model.recipient.in_(recipients))
+            .order_by(self.model.recipient, self.model.id)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+
+    def mark_sent(self, db: Session, *, ids: List[int]) -> None:
+        if ids:
+            db.execute(
+                update(self.model)
+                .where(self.model.id.in_(ids))
+                .values(status="sent", sent_at=datetime.now(timezone.utc), last_error=None)
+                .execution_options(synchronize_session=False)
+            )
+
+    def mark_failed(
+        self, db: Session, *, row: NotificationOutbox, error: str, max_attempts: int, backoff: float
+    ) -> None:
+        row.attempts += 1
+        row.last_error = error
+        if row.attempts >= max_attempts:
+            row.status = "failed"
+        else:
+            row.available_at = datetime.now(timezone.utc) + timedelta(seconds=backoff)
+
+
+class AsyncOutboxCrud:
+    def __init__(self, crud: OutboxCrud):
+        self.crud = crud
+
+    async def add(self, db: DBSession, *, recipient: str, payload: dict) -> None:
+        return await run_in_session(db, self.crud.add, recipient=recipient, payload=payload)
+
+    async def add_many(self, db: DBSession, *, recipient: str, payloads: List[dict]) -> None:
+        return await run_in_session(db, self.crud.add_many, recipient=recipient, payloads=payloads)
+
+
+outbox = OutboxCrud(NotificationOutbox)
+async_outbox = AsyncOutboxCrud(outbox)
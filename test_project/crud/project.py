@@ -1,12 +1,33 @@
 from fastapi.encoders import jsonable_encoder
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
-from typing import List
+from sqlalchemy import false, func, or_, true, update
+from sqlalchemy.sql.elements import ColumnElement
+from sqlalchemy.engine import Row
+from typing import Any, Iterable, List, Optional, Sequence, Tuple, Union
 
-from test_project.crud.base import CRUDBase
-from test_project.models.models import Project
+from test_project.core.db import DBSession
+from test_project.core.pagination import Total
+from test_project.crud.base import AsyncCRUDBase, CRUDBase, run_in_session
+from test_project.models.models import Issue, Project, User
 from test_project.models.schemas import ProjectCreate, ProjectUpdate
 
+# who may act on a project: READ lets admins, the owner and the assignee in, WRITE drops the assignee,
+# OWNER is the owner alone
+READ = "read"
+WRITE = "write"
+OWNER = "owner"
+
+
+def access_clause(user: User, access: str = READ) -> ColumnElement:
+    if access != OWNER and user.is_admin:
+        return true()
+
+    clause = Project.owner_id == user.id
+    if access == READ:
+        clause = or_(clause, Project.assigned_id == user.id)
+    # assigned_id is nullable, keep the flag two-valued
+    return func.coalesce(clause, false())
+
 
 class ProjectCrud(CRUDBase[Project, ProjectCreate, ProjectUpdate]):
     def create_with_owner(
@@ -23,14 +44,120 @@ class ProjectCrud(CRUDBase[Project, ProjectCreate, ProjectUpdate]):
         db.refresh(db_obj)
         return db_obj
 
-    def list_by_user(self, db: Session, *, user_id: int = None, skip: int = 0, limit: int = 100) -> List[Project]:
+    def retrieve_authorized(
+        self, db: Session, *, id: int, user: User, access: str = READ, is_deleted: bool = False
+    ) -> Optional[Tuple[Project, bool]]:
+        # existence and permission in one round trip; None means not found, the flag tells a 400 apart
         return (
-            db.query(self.model)
+            db.query(self.model, access_clause(user, access).label("allowed"))
+            .filter(self.model.id == id, self.model.is_deleted.is_(is_deleted))
+            .first()
+        )
+
+    def delete(self, db: Session, *, id: int) -> Optional[Project]:
+        deleted = self.delete_cascade(db, id=id)
+        return deleted[0] if deleted else None
+
+    def delete_cascade(self, db: Session, *, id: int) -> Optional[Tuple[Project, int]]:
+        return self._cascade(db, id=id, is_deleted=True)
+
+    def restore_cascade(self, db: Session, *, id: int) -> Optional[Tuple[Project, int]]:
+        return self._cascade(db, id=id, is_deleted=False)
+
+    def _cascade(self, db: Session, *, id: int, is_deleted: bool) -> Optional[Tuple[Project, int]]:
+        # the project row and its issues flip in one transaction with set-based UPDATEs,
+        # issues are never loaded into the session however many there are
+        project = self._update_returning(db, id=id, values={"is_deleted": is_deleted}, is_deleted=not is_deleted)
+        if project is None:
+            db.rollback()
+            return None
+
+        if is_deleted:
+            issues = (
+                update(Issue)
+                .where(Issue.project_id == id, Issue.is_deleted.is_(False))
+                .values(is_deleted=True, deleted_with_project=True, version=Issue.version + 1)
+            )
+        else:
+            # issues deleted one by one before the project stay deleted
+            issues = (
+                update(Issue)
+                .where(Issue.project_id == id, Issue.deleted_with_project.is_(True))
+                .values(is_deleted=False, deleted_with_project=False, version=Issue.version + 1)
+            )
+        count = db.execute(issues.execution_options(synchronize_session=False)).rowcount
+        db.commit()
+        return project, count
+
+    def list_by_ids(self, db: Session, *, ids: Iterable[int]) -> List[Project]:
+        return db.query(self.model).filter(self.model.id.in_(list(ids)), self.model.is_deleted.is_(False)).all()
+
+    def list_by_user(
+        self,
+        db: Session,
+        *,
+        user_id: int = None,
+        skip: int = 0,
+        limit: int = 100,
+        after_id: Optional[int] = None,
+        columns: Optional[Sequence[Any]] = None
+    ) -> List[Union[Project, Row]]:
+        query = (
+            self._query(db, columns)
             .filter(or_(Project.owner_id == user_id, Project.assigned_id == user_id), self.model.is_deleted.is_(False))
-            .offset(skip)
-            .limit(limit)
-            .all()
         )
+        return self._paginate(query, skip=skip, limit=limit, after_id=after_id)
+
+    def count_by_user(self, db: Session, *, user_id: int, exact_limit: Optional[int] = None) -> Total:
+        query = db.query(self.model.id).filter(
+            or_(Project.owner_id == user_id, Project.assigned_id == user_id), self.model.is_deleted.is_(False)
+        )
+        return self._count(query, exact_limit)
+
+
+class AsyncProjectCrud(AsyncCRUDBase[ProjectCrud]):
+    async def create_with_owner(self, db: DBSession, *, obj: ProjectCreate, owner_id: int) -> Project:
+        return await run_in_session(db, self.crud.create_with_owner, obj=obj, owner_id=owner_id)
+
+    async def retrieve_authorized(
+        self, db: DBSession, *, id: int, user: User, access: str = READ, is_deleted: bool = False
+    ) -> Optional[Tuple[Project, bool]]:
+        return await run_in_session(
+            db, self.crud.retrieve_authorized, id=id, user=user, access=access, is_deleted=is_deleted
+        )
+
+    async def delete_cascade(self, db: DBSession, *, id: int) -> Optional[Tuple[Project, int]]:
+        return await run_in_session(db, self.crud.delete_cascade, id=id)
+
+    async def restore_cascade(self, db: DBSession, *, id: int) -> Optional[Tuple[Project, int]]:
+        return await run_in_session(db, self.crud.restore_cascade, id=id)
+
+    async def list_by_ids(self, db: DBSession, *, ids: Iterable[int]) -> List[Project]:
+        return await run_in_session(db, self.crud.list_by_ids, ids=ids)
+
+    async def list_by_user(
+        self,
+        db: DBSession,
+        *,
+        user_id: int = None,
+        skip: int = 0,
+        limit: int = 100,
+        after_id: Optional[int] = None,
+        columns: Optional[Sequence[Any]] = None
+    ) -> List[Union[Project, Row]]:
+        return await run_in_session(
+            db,
+            self.crud.list_by_user,
+            user_id=user_id,
+            skip=skip,
+            limit=limit,
+            after_id=after_id,
+            columns=columns,
+        )
+
+    async def count_by_user(self, db: DBSession, *, user_id: int, exact_limit: Optional[int] = None) -> Total:
+        return await run_in_session(db, self.crud.count_by_user, user_id=user_id, exact_limit=exact_limit)
 
 
 project = ProjectCrud(Project)
+async_project = AsyncProjectCrud(project)
@@ -1,12 +1,14 @@
-from typing import Optional
+from typing import Any, Dict, Optional, Union
 from sqlalchemy.orm import Session
 
-from test_project.core.auth import get_password_hash, verify_password
+from test_project.core.auth import get_password_hash, password_pool, verify_password
+from test_project.core.db import DBSession
+from test_project.core.principal_cache import principal_cache
 from test_project.core.exceptions import (
     UserNotFoundException,
     WrongPasswordException
 )
-from test_project.crud.base import CRUDBase
+from test_project.crud.base import AsyncCRUDBase, CRUDBase, run_in_session
 from test_project.models.models import User
 from test_project.models.schemas import UserCreate, UserUpdate
 
@@ -16,10 +18,13 @@ class UserCrud(CRUDBase[User, UserCreate, UserUpdate]):
         return db.query(User).filter(User.email == email).first()
 
     def create(self, db: Session, *, obj: UserCreate) -> User:
+        return self.create_with_hash(db, obj=obj, hashed_password=get_password_hash(obj.password))
+
+    def create_with_hash(self, db: Session, *, obj: UserCreate, hashed_password: str) -> User:
         db_obj = User(
             name=obj.name,
             email=obj.email,
-            hashed_password=get_password_hash(obj.password),
+            hashed_password=hashed_password,
             is_admin=obj.is_admin,
         )
         db.add(db_obj)
@@ -27,6 +32,16 @@ class UserCrud(CRUDBase[User, UserCreate, UserUpdate]):
         db.refresh(db_obj)
         return db_obj
 
+    def update(self, db: Session, *, db_obj: User, obj: Union[UserUpdate, Dict[str, Any]]) -> User:
+        user = super().update(db, db_obj=db_obj, obj=obj)
+        principal_cache.invalidate(db_obj.id)
+        return user
+
+    def delete(self, db: Session, *, id: int) -> Optional[User]:
+        user = super().delete(db, id=id)
+        principal_cache.invalidate(id)
+        return user
+
     def authenticate(self, db: Session, *, email: str, password: str) -> Optional[User]:
         user = self.retrieve_by_email(db, email=email)
 
@@ -42,4 +57,29 @@ class UserCrud(CRUDBase[User, UserCreate, UserUpdate]):
         return user.is_admin
 
 
+class AsyncUserCrud(AsyncCRUDBase[UserCrud]):
+    async def retrieve_by_email(self, db: DBSession, *, email: str) -> Optional[User]:
+        return await run_in_session(db, self.crud.retrieve_by_email, email=email)
+
+    async def create(self, db: DBSession, *, obj: UserCreate) -> User:
+        # bcrypt must stay off the event loop, only the insert goes through the session
+        hashed_password = await password_pool.hash(obj.password)
+        return await run_in_session(db, self.crud.create_with_hash, obj=obj, hashed_password=hashed_password)
+
+    async def authenticate(self, db: DBSession, *, email: str, password: str) -> Optional[User]:
+        user = await self.retrieve_by_email(db, email=email)
+
+        if not user:
+            raise UserNotFoundException
+
+        if not await password_pool.verify(password, user.hashed_password):
+            raise WrongPasswordException
+
+        return user
+
+    def is_admin(self, user: User) -> bool:
+        return self.crud.is_admin(user)
+
+
 user = UserCrud(User)
+async_user = AsyncUserCrud(user)
@@ -0,0 +1,159 @@
+import asyncio
+import logging
+import sys
+
+from pydantic import ValidationError
+from typing import Any, AsyncIterator, BinaryIO, Dict, Iterable, List, Optional, Set, Tuple
+
+from test_project.core.db import DBSession, SessionLocal
+from test_project.core.exceptions import PermissionException, UserNotFoundException
+from test_project.core.serialization import CSVDecoder, NDJSONDecoder, Record
+from test_project.core.settings import get_settings
+from test_project.crud.issue import async_issue as crud_issue
+from test_project.crud.project import async_project as crud_project
+from test_project.crud.user import async_user as crud_user, user as sync_crud_user
+from test_project.models.models import Project, User
+from test_project.models.schemas import ExportFormat, IssueCreate
+
+ImportRow = Tuple[int, IssueCreate]
+
+READ_SIZE = 1 << 16
+
+
+class IssueImport:
+    """
+    Validates decoded records against IssueCreate and groups the valid ones into chunks of
+    `chunk_size` for COPY. Rejected records are counted, the first `max_errors` of them are kept
+    with their line numbers for the report.
+    """
+
+    def __init__(self, format: ExportFormat, *, owner_id: int, chunk_size: int, max_errors: int):
+        self.decoder = CSVDecoder() if format == ExportFormat.csv else NDJSONDecoder()
+        self.owner_id = owner_id
+        self.chunk_size = chunk_size
+        self.max_errors = max_errors
+        self.imported = 0
+        self.failed = 0
+        self.errors: List[Dict[str, Any]] = []
+        # project id -> None when the importing user owns it, otherwise why its rows are rejected
+        self.projects: Dict[int, Optional[str]] = {}
+        self._rows: List[ImportRow] = []
+
+    def feed(self, data: bytes) -> List[List[ImportRow]]:
+        return self._validate(self.decoder.feed(data))
+
+    def close(self) -> List[List[ImportRow]]:
+        chunks = self._validate(self.decoder.close())
+        if self._rows:
+            chunks.append(self._rows)
+            self._rows = []
+        return chunks
+
+    def _validate(self, records: Iterable[Record]) -> List[List[ImportRow]]:
+        chunks = []
+        for line, fields in records:
+            if fields is None:
+                self.reject(line, [{"loc": ["__root__"], "msg": self.decoder.malformed, "type": "value_error"}])
+                continue
+            try:
+                obj = IssueCreate.parse_obj(fields)
+            except ValidationError as exc:
+                self.reject(line, exc.errors())
+                continue
+
+            self._rows.append((line, obj))
+            if len(self._rows) >= self.chunk_size:
+                chunks.append(self._rows)
+                self._rows = []
+        return chunks
+
+    def unknown_projects(self, rows: List[ImportRow]) -> Set[int]:
+        return {obj.project_id for _, obj in rows} - self.projects.keys()
+
+    def add_projects(self, ids: Set[int], projects: List[Project]) -> None:
+        # the checks create_issues makes, decided once per project instead of once per row
+        owners = {project.id: project.owner_id for project in projects}
+        for id in ids:
+            if id not in owners:
+                self.projects[id] = "Project not found"
+            elif owners[id] != self.owner_id:
+                self.projects[id] = "Not enough permissions"
+            else:
+                self.projects[id] = None
+
+    def authorize(self, rows: List[ImportRow]) -> List[IssueCreate]:
+        objs = []
+        for line, obj in rows:
+            message = self.projects[obj.project_id]
+            if message:
+                self.reject(line, [{"loc": ["project_id"], "msg": message, "type": "value_error"}])
+            else:
+                objs.append(obj)
+        return objs
+
+    def reject(self, line: int, errors: List[Dict[str, Any]]) -> None:
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "errors": errors})
+
+    def report(self) -> Dict[str, Any]:
+        # ownership is checked per chunk, after the records' own validation
+        errors = sorted(self.errors, key=lambda error: error["line"])
+        return {"imported": self.imported, "failed": self.failed, "errors": errors}
+
+
+async def load_chunk(db: DBSession, issue_import: IssueImport, rows: List[ImportRow]) -> None:
+    unknown = issue_import.unknown_projects(rows)
+    if unknown:
+        issue_import.add_projects(unknown, await crud_project.list_by_ids(db=db, ids=unknown))
+
+    objs = issue_import.authorize(rows)
+    if objs:
+        issue_import.imported += await crud_issue.copy_create(db=db, objs=objs)
+
+
+async def import_stream(
+    db: DBSession, chunks: AsyncIterator[bytes], *, format: ExportFormat, user: User
+) -> IssueImport:
+    """
+    Import issues from an upload as its bytes arrive. Every full chunk of valid rows is
+    committed on its own, so memory holds one chunk and a failure keeps what was loaded so far.
+    """
+    # as in POST /api/issue/: admins don't create issues
+    if crud_user.is_admin(user):
+        raise PermissionException
+
+    settings = get_settings().importer
+    issue_import = IssueImport(
+        format, owner_id=user.id, chunk_size=settings.chunk_size, max_errors=settings.max_errors
+    )
+    async for data in chunks:
+        for rows in issue_import.feed(data):
+            await load_chunk(db, issue_import, rows)
+    for rows in issue_import.close():
+        await load_chunk(db, issue_import, rows)
+    return issue_import
+
+
+async def read_chunks(upload: BinaryIO) -> AsyncIterator[bytes]:
+    while True:
+        data = upload.read(READ_SIZE)
+        if not data:
+            return
+        yield data
+
+
+def run(path: str, *, format: ExportFormat, email: str) -> Dict[str, Any]:
+    with SessionLocal() as db:
+        user = sync_crud_user.retrieve_by_email(db, email=email)
+        if user is None:
+            raise UserNotFoundException
+
+        if path == "-":
+            issue_import = asyncio.run(import_stream(db, read_chunks(sys.stdin.buffer), format=format, user=user))
+        else:
+            with open(path, "rb") as upload:
+                issue_import = asyncio.run(import_stream(db, read_chunks(upload), format=format, user=user))
+
+    logging.info("Imported %s issues, rejected %s rows", issue_import.imported, issue_import.failed)
+    return issue_import.report()
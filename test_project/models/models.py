@@ -1,8 +1,12 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String
-from sqlalchemy.orm import relationship
+from sqlalchemy import JSON, Boolean, Column, Computed, DateTime, ForeignKey, Index, Integer, String, false, func, text
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.ext.declarative import as_declarative, declared_attr
 from typing import Any
 
+# no stemming or stop words: titles are not in one language
+SEARCH_CONFIG = "simple"
+
 
 @as_declarative()
 class Base:
@@ -15,7 +19,7 @@ class Base:
 
 
 class User(Base):
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     name = Column(String, index=True)
     email = Column(String, unique=True, index=True, nullable=False)
     hashed_password = Column(String, nullable=False)
@@ -25,21 +29,79 @@ class User(Base):
 
 
 class Project(Base):
-    id = Column(Integer, primary_key=True, index=True)
-    title = Column(String, index=True)
+    id = Column(Integer, primary_key=True)
+    title = Column(String)
     owner_id = Column(Integer, ForeignKey("user.id"))
     issues = relationship("Issue", back_populates="project")
     assigned_id = Column(Integer, ForeignKey("user.id"), nullable=True)
+    # bumped by every write, it is the ETag and the If-Match precondition
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     is_deleted = Column(Boolean(), default=False)
 
+    # partial on live rows, matching the `is_deleted IS false` filter every query carries
+    __table_args__ = (
+        Index("ix_project_owner_id_id", "owner_id", "id", postgresql_where=text("is_deleted IS false")),
+        Index("ix_project_assigned_id_id", "assigned_id", "id", postgresql_where=text("is_deleted IS false")),
+    )
+
 
 class Issue(Base):
-    id = Column(Integer, primary_key=True, index=True)
-    title = Column(String, index=True)
+    id = Column(Integer, primary_key=True)
+    title = Column(String)
     type = Column(String, nullable=False)
     status = Column(String, nullable=False)
     project_id = Column(Integer, ForeignKey("project.id"))
-    project = relationship("Project", back_populates="issues")
+    # never lazy-loaded: a read that needs the project joins it explicitly
+    project = relationship("Project", back_populates="issues", lazy="raise")
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
     is_deleted = Column(Boolean(), default=False)
+    # set when the issue went down with its project, so restoring the project brings back only these
+    deleted_with_project = Column(Boolean(), nullable=False, default=False, server_default=false())
+    # kept in step with the title by Postgres; only search reads it, so entities don't load it
+    title_search = deferred(Column(
+        TSVECTOR, Computed(f"to_tsvector('{SEARCH_CONFIG}'::regconfig, coalesce(title, ''))", persisted=True)
+    ))
+
+    __table_args__ = (
+        Index("ix_issue_project_id_id", "project_id", "id", postgresql_where=text("is_deleted IS false")),
+        Index("ix_issue_project_id_cascaded", "project_id", postgresql_where=text("deleted_with_project IS true")),
+        Index(
+            "ix_issue_title_search", "title_search", postgresql_using="gin", postgresql_where=text("is_deleted IS false")
+        ),
+    )
+
+
+class IssueCounter(Base):
+    """
+    Issues per (project, status, type), kept by IssueCrud in the transaction of every write. An issue
+    is counted until it is deleted on its own: a project's cascade delete and restore leave counts as is.
+    """
+
+    __tablename__ = "issue_counter"
+
+    project_id = Column(Integer, ForeignKey("project.id"), primary_key=True)
+    status = Column(String, primary_key=True)
+    type = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0, server_default="0")
+
+
+class NotificationOutbox(Base):
+    __tablename__ = "notification_outbox"
+
+    id = Column(Integer, primary_key=True)
+    recipient = Column(String, nullable=False)
+    payload = Column(JSON, nullable=False)
+    status = Column(String, nullable=False, default="pending", server_default="pending")
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    last_error = Column(String, nullable=True)
+    available_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    sent_at = Column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index(
+            "ix_notification_outbox_pending", "available_at", "id", postgresql_where=text("status = 'pending'")
+        ),
+    )
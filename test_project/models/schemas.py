@@ -1,5 +1,9 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional
+from enum import Enum
+from pydantic import BaseModel, EmailStr, conlist
+from typing import Any, Dict, List, Optional
+
+# most issues one bulk request may create or transition
+BULK_MAX_ITEMS = 10000
 
 
 class UserBase(BaseModel):
@@ -39,6 +43,33 @@ class Token(BaseModel):
 
 class TokenPayload(BaseModel):
     sub: Optional[int] = None
+    exp: Optional[int] = None
+
+
+class PrincipalCacheStats(BaseModel):
+    size: int
+    max_size: int
+    hits: int
+    misses: int
+    evictions: int
+
+
+class RequestCacheStats(BaseModel):
+    requests: int
+    lookups: int
+    hits_saved: int
+
+
+class PasswordPoolStats(BaseModel):
+    size: int
+    queue_depth: int
+    in_flight: int
+    completed: int
+    rejected: int
+    queue_wait_seconds_total: float
+    queue_wait_seconds_max: float
+    hash_seconds_total: float
+    hash_seconds_max: float
 
 
 class ProjectBase(BaseModel):
@@ -68,10 +99,28 @@ class Project(ProjectInDBBase):
     pass
 
 
+class ProjectCascade(Project):
+    affected_issues: int
+
+
 class ProjectInDB(ProjectInDBBase):
     is_deleted: bool = False
 
 
+class IssueCount(BaseModel):
+    status: str
+    type: str
+    count: int
+
+
+class ProjectStats(BaseModel):
+    project_id: int
+    total: int
+    by_status: Dict[str, int]
+    by_type: Dict[str, int]
+    counts: List[IssueCount]
+
+
 class IssueBase(BaseModel):
     title: Optional[str] = None
     status: Optional[str] = None
@@ -104,5 +153,38 @@ class Issue(IssueInDBBase):
     pass
 
 
+class IssueSearchResult(Issue):
+    rank: float
+
+
 class IssueInDB(IssueInDBBase):
     is_deleted: bool = False
+
+
+class IssueBulkCreate(BaseModel):
+    issues: conlist(IssueCreate, min_items=1, max_items=BULK_MAX_ITEMS)
+
+
+class IssueBulkCreated(BaseModel):
+    ids: List[int]
+
+
+class IssueBulkTransition(BaseModel):
+    ids: conlist(int, min_items=1, max_items=BULK_MAX_ITEMS)
+    status: str
+
+
+class ExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+
+class IssueImportError(BaseModel):
+    line: int
+    errors: List[Dict[str, Any]]
+
+
+class IssueImported(BaseModel):
+    imported: int
+    failed: int
+    errors: List[IssueImportError]
@@ -0,0 +1,106 @@
+import logging
+import signal
+import time
+
+from itertools import groupby
+from sqlalchemy.orm import Session
+from typing import List
+
+from test_project.core.db import SessionLocal
+from test_project.core.exceptions import MailCircuitOpenException
+from test_project.core.mail import SendMail, mail
+from test_project.core.settings import get_settings
+from test_project.crud.outbox import outbox as crud_outbox
+
+
+def backoff_seconds(attempts: int) -> float:
+    settings = get_settings().outbox
+    return min(settings.backoff_max, settings.backoff_base * 2 ** max(attempts - 1, 0))
+
+
+def collapse_transitions(data_mails: List[dict]) -> List[dict]:
+    # To Do -> In Progress -> Done on one issue becomes To Do -> Done; a round trip disappears
+    collapsed = {}
+    for data_mail in data_mails:
+        first = collapsed.setdefault(data_mail.get("issue_id"), dict(data_mail))
+        first["to_status"] = data_mail.get("to_status")
+    return [data_mail for data_mail in collapsed.values() if data_mail.get("from_status") != data_mail["to_status"]]
+
+
+def process_batch(db: Session, sender: SendMail = mail) -> int:
+    settings = get_settings().outbox
+    if settings.digest:
+        return process_digest_batch(db, sender)
+
+    rows = crud_outbox.claim_batch(db, limit=settings.batch_size)
+
+    sent_ids = []
+    circuit_open = False
+    for row in rows:
+        try:
+            sender.deliver([sender.notification_message(row.recipient, row.payload)])
+        except MailCircuitOpenException:
+            # the server is known to be down: leave the rest pending without spending their attempts
+            logging.warning("Mail circuit is open, postponing the rest of the batch")
+            circuit_open = True
+            break
+        except Exception as exc:
+            logging.warning("Outbox notification #%s failed: %r", row.id, exc)
+            crud_outbox.mark_failed(
+                db, row=row, error=repr(exc), max_attempts=settings.max_attempts,
+                backoff=backoff_seconds(row.attempts + 1),
+            )
+        else:
+            sent_ids.append(row.id)
+
+    crud_outbox.mark_sent(db, ids=sent_ids)
+    db.commit()
+    return 0 if circuit_open else len(rows)
+
+
+def process_digest_batch(db: Session, sender: SendMail = mail) -> int:
+    settings = get_settings().outbox
+    rows = crud_outbox.claim_digest_batch(db, limit=settings.batch_size, window=settings.digest_window)
+
+    sent_ids = []
+    circuit_open = False
+    for recipient, group in groupby(rows, key=lambda row: row.recipient):
+        group = list(group)
+        data_mails = collapse_transitions([row.payload for row in group])
+        try:
+            if data_mails:
+                sender.deliver([sender.digest_message(recipient, data_mails)])
+        except MailCircuitOpenException:
+            logging.warning("Mail circuit is open, postponing the rest of the batch")
+            circuit_open = True
+            break
+        except Exception as exc:
+            logging.warning("Outbox digest for %s failed: %r", recipient, exc)
+            for row in group:
+                crud_outbox.mark_failed(
+                    db, row=row, error=repr(exc), max_attempts=settings.max_attempts,
+                    backoff=backoff_seconds(row.attempts + 1),
+                )
+        else:
+            sent_ids.extend(row.id for row in group)
+
+    crud_outbox.mark_sent(db, ids=sent_ids)
+    db.commit()
+    return 0 if circuit_open else len(rows)
+
+
+def run() -> None:
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+    signal.signal(signal.SIGINT, lambda *_: stopping.append(True))
+    logging.info("Outbox worker started")
+
+    while not stopping:
+        with SessionLocal() as db:
+            claimed = process_batch(db)
+        # keep draining while batches come back full, otherwise wait for new rows
+        if claimed < get_settings().outbox.batch_size:
+            time.sleep(get_settings().outbox.poll_interval)
+
+    mail.pool.close()
+    logging.info("Outbox worker stopped")
@@ -1,14 +1,29 @@
+import time
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 from typing import Dict
 
+from test_project.core.auth import password_pool
+from test_project.core.principal_cache import PrincipalCache, principal_cache
+from test_project.core.request_cache import attach_request_cache, request_cache_stats
+from test_project.crud.project import project as crud_project
+from test_project.crud.user import user as crud_user
+from test_project.models.models import User as model_user
+from test_project.models.schemas import ProjectCreate, UserCreate
+from tests.conftest import TestingSessionLocal, engine, max_queries, random_email, random_string
+
 
 def test_get_access_token(client, random_user) -> None:
-    r = client.post(
-        "/api/auth/login/token",
-        json={
-            'email': random_user.email,
-            'password': random_user.password
-        }
-    )
+    with max_queries(1):
+        r = client.post(
+            "/api/auth/login/token",
+            json={
+                'email': random_user.email,
+                'password': random_user.password
+            }
+        )
     tokens = r.json()
     assert r.status_code == 200
     assert "access_token" in tokens
@@ -25,3 +40,103 @@ def test_use_access_token(
     assert r.status_code == 200
     assert "email" in result
 
+
+def test_principal_cache_hit(client: TestClient, user_token_headers: Dict[str, str]) -> None:
+    client.post("/api/auth/login/test-token", headers=user_token_headers)
+    hits = principal_cache.stats()["hits"]
+
+    r = client.post("/api/auth/login/test-token", headers=user_token_headers)
+    assert r.status_code == 200
+    assert principal_cache.stats()["hits"] == hits + 1
+
+
+def test_principal_cache_invalidated_on_demotion(client: TestClient, db: Session) -> None:
+    user_in = UserCreate(email=random_email(), password=random_string(), is_admin=True)
+    user = crud_user.create(db, obj=user_in)
+    r = client.post("/api/auth/login/token", json={"email": user_in.email, "password": user_in.password})
+    headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+    assert client.get("/api/user/", headers=headers).status_code == 200
+
+    crud_user.update(db, db_obj=user, obj={"is_admin": False})
+    r = client.get("/api/user/", headers=headers)
+    assert r.json() == {'detail': 'User has no admin privileges'}
+
+
+def test_principal_cache_bounds() -> None:
+    cache = PrincipalCache(max_size=2, ttl=60)
+    users = [model_user(id=i, email=random_email(), hashed_password="", is_admin=False) for i in range(3)]
+    for i, user in enumerate(users):
+        cache.set(f"token{i}", user, expires_at=time.time() + 60, generation=cache.generation)
+    cache.set("expired", users[0], expires_at=time.time() - 1, generation=cache.generation)
+
+    assert cache.get("token0") is None
+    assert cache.get("token2").id == 2
+    assert cache.get("expired") is None
+    assert cache.stats()["evictions"] == 2
+
+    cache.invalidate(2)
+    assert cache.get("token2") is None
+
+
+def test_login_hashes_in_password_pool(client: TestClient, random_user) -> None:
+    completed = password_pool.stats()["completed"]
+    r = client.post(
+        "/api/auth/login/token", json={"email": random_user.email, "password": random_user.password}
+    )
+
+    assert r.status_code == 200
+    stats = password_pool.stats()
+    assert stats["completed"] == completed + 1
+    assert stats["hash_seconds_max"] > 0
+
+
+def test_login_rejected_when_password_pool_saturated(client: TestClient, random_user, monkeypatch) -> None:
+    monkeypatch.setattr(password_pool, "in_flight", password_pool.size + password_pool.queue_depth)
+    r = client.post(
+        "/api/auth/login/token", json={"email": random_user.email, "password": random_user.password}
+    )
+
+    assert r.status_code == 503
+    assert r.json() == {"detail": "Server is busy, try again later"}
+    assert r.headers["Retry-After"] == "1"
+
+
+def test_request_cache_dedupes_retrieve(random_project_user) -> None:
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with TestingSessionLocal() as db:
+        cache = attach_request_cache(db)
+        event.listen(engine, "before_cursor_execute", count)
+        try:
+            first = crud_user.retrieve(db, id=random_project_user.id)
+            second = crud_user.retrieve(db, id=random_project_user.id)
+        finally:
+            event.remove(engine, "before_cursor_execute", count)
+
+        assert first is second
+        assert len(statements) == 1
+        assert (cache.lookups, cache.hits_saved) == (2, 1)
+
+        project = crud_project.create_with_owner(db, obj=ProjectCreate(title=random_string()), owner_id=first.id)
+        assert crud_project.retrieve(db, id=project.id) is not None
+        crud_project.delete(db, id=project.id)
+        assert crud_project.retrieve(db, id=project.id) is None
+
+
+def test_request_cache_serves_caller_as_assignee(
+    client: TestClient, user_admin_token_headers: Dict[str, str], random_project
+) -> None:
+    admin = client.post("/api/auth/login/test-token", headers=user_admin_token_headers).json()
+    hits_saved = request_cache_stats.stats()["hits_saved"]
+
+    response = client.put(
+        f"/api/project/{random_project.id}", headers=user_admin_token_headers, json={"assigned_id": admin["id"]}
+    )
+
+    assert response.status_code == 200
+    stats = client.get("/api/auth/request-cache", headers=user_admin_token_headers).json()
+    assert stats["hits_saved"] == hits_saved + 1
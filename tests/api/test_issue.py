@@ -1,11 +1,27 @@
+import csv
+import io
+
+import orjson
+import pytest
+
+from fastapi.encoders import jsonable_encoder
 from fastapi.testclient import TestClient
+from sqlalchemy import delete, event
+from sqlalchemy.exc import InvalidRequestError
 from sqlalchemy.orm import Session
 
-from test_project.crud.issue import issue as crud_issue
-from test_project.models.schemas import IssueCreate, IssueUpdate, ProjectCreate
-from test_project.models.models import Issue as model_issue
-from test_project.crud.project import project as crud_project
-from tests.conftest import random_string
+from test_project.crud.issue import async_issue as async_crud_issue, issue as crud_issue
+from test_project.crud.issue_counter import issue_counter
+from test_project.models.schemas import (
+    BULK_MAX_ITEMS, Issue as schema_issue, IssueCreate, IssueUpdate, ProjectCreate,
+)
+from test_project.models.models import (
+    Issue as model_issue, IssueCounter as model_counter, NotificationOutbox as model_outbox,
+)
+from test_project.core.settings import get_settings
+from test_project.crud.project import OWNER, WRITE, project as crud_project
+from test_project.models.models import User as model_user
+from tests.conftest import engine, max_queries, random_string
 
 
 # CRUD
@@ -69,7 +85,233 @@ def test_soft_delete_issue(db: Session, random_project) -> None:
     assert len(db.query(model_issue).filter(model_issue.is_deleted.is_(True)).all()) > 0
 
 
+def test_create_bulk_issue(db: Session, random_project) -> None:
+    issues_in = [
+        IssueCreate(title=random_string(), type="Bug", status="To Do", project_id=random_project.id)
+        for _ in range(3)
+    ]
+    ids = crud_issue.create_bulk(db=db, objs=issues_in)
+    assert len(ids) == 3
+    for issue_id, issue_in in zip(ids, issues_in):
+        stored_issue = crud_issue.retrieve(db=db, id=issue_id)
+        assert stored_issue.title == issue_in.title
+        assert stored_issue.is_deleted is False
+
+
+def test_create_bulk_issue_max_batch(loop, async_db, db: Session, random_project_user) -> None:
+    # a full batch binds more parameters than one statement may carry, on either driver
+    project = crud_project.create_with_owner(
+        db=db, obj=ProjectCreate(title=random_string()), owner_id=random_project_user.id
+    )
+
+    def issues_in():
+        return [
+            IssueCreate(title=random_string(), type="Bug", status="To Do", project_id=project.id)
+            for _ in range(BULK_MAX_ITEMS)
+        ]
+
+    try:
+        ids = crud_issue.create_bulk(db=db, objs=issues_in())
+        async_ids = loop.run_until_complete(async_crud_issue.create_bulk(async_db, objs=issues_in()))
+        assert len(set(ids) | set(async_ids)) == 2 * BULK_MAX_ITEMS
+        assert issue_counter.list_by_project(db, project_id=project.id) == [("To Do", "Bug", 2 * BULK_MAX_ITEMS)]
+    finally:
+        # a project this size would skew the statistics the query plan tests run against
+        for model in (model_issue, model_counter):
+            db.execute(delete(model).where(model.project_id == project.id))
+        db.delete(project)
+        db.commit()
+
+
+def test_async_create_and_list_issue(loop, async_db, random_project) -> None:
+    title = random_string()
+    issue_in = IssueCreate(title=title, type="Bug", status="To Do", project_id=random_project.id)
+    issue = loop.run_until_complete(async_crud_issue.create_with_project(async_db, obj=issue_in))
+    stored_issue = loop.run_until_complete(async_crud_issue.retrieve(async_db, id=issue.id))
+    issues = loop.run_until_complete(
+        async_crud_issue.list_by_project(async_db, project_id=random_project.id, limit=1000)
+    )
+    assert stored_issue.title == title
+    assert stored_issue.project.id == random_project.id
+    assert issue.id in [item.id for item in issues]
+
+
+def test_update_and_delete_issue_single_statement(db: Session, random_project) -> None:
+    issue_in = IssueCreate(title=random_string(), type="Bug", status="To Do", project_id=random_project.id)
+    issue = crud_issue.create_with_project(db=db, obj=issue_in)
+    issue_id, title = issue.id, random_string()
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        updated_issue = crud_issue.update(db=db, db_obj=issue, obj=IssueUpdate(title=title))
+        deleted_issue = crud_issue.delete(db=db, id=issue_id)
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+    # a title change leaves the counters alone; the delete locks, updates and reads back the old row
+    # in one statement and then moves its counter
+    assert len(statements) == 3
+    assert statements[0].startswith("UPDATE issue")
+    assert statements[1].startswith('WITH "old" AS') and "UPDATE issue" in statements[1]
+    assert statements[2].startswith("INSERT INTO issue_counter")
+    assert updated_issue is issue
+    assert deleted_issue.title == title
+    assert deleted_issue.is_deleted is True
+    assert crud_issue.delete(db=db, id=issue_id) is None
+    assert crud_issue.update_by_id(db=db, id=issue_id, obj={"title": random_string()}) is None
+
+
+def test_update_issue_version(db: Session, random_project) -> None:
+    issue_in = IssueCreate(title=random_string(), type="Bug", status="To Do", project_id=random_project.id)
+    issue = crud_issue.create_with_project(db=db, obj=issue_in)
+    issue_id = issue.id
+    assert issue.version == 1
+
+    assert crud_issue.update_by_id(db=db, id=issue_id, obj={"title": random_string()}, version=2) is None
+    assert crud_issue.update_by_id(db=db, id=issue_id, obj={"title": random_string()}, version=1).version == 2
+    assert crud_issue.transition_status(db=db, ids=[issue_id], status="Done")[0].version == 3
+
+
+def test_stream_by_project_server_side_cursor(loop, db: Session, random_project) -> None:
+    project_id = random_project.id
+    ids = crud_issue.create_bulk(db=db, objs=[
+        IssueCreate(title=random_string(), type="Bug", status="To Do", project_id=project_id) for _ in range(5)
+    ])
+    cursors = []
+
+    def named_cursor(conn, cursor, statement, parameters, context, executemany):
+        cursors.append(cursor.name)
+
+    async def collect():
+        partitions = async_crud_issue.stream_by_project(db, project_id=project_id, columns=[model_issue.id], size=2)
+        return [partition async for partition in partitions]
+
+    event.listen(engine, "before_cursor_execute", named_cursor)
+    try:
+        partitions = loop.run_until_complete(collect())
+    finally:
+        event.remove(engine, "before_cursor_execute", named_cursor)
+        db.rollback()
+
+    assert cursors and all(cursors)
+    assert max(len(partition) for partition in partitions) == 2
+    assert set(ids) <= {row.id for partition in partitions for row in partition}
+
+
+def test_issue_project_raiseload(db: Session, random_project) -> None:
+    issue_in = IssueCreate(title=random_string(), type="Bug", status="To Do", project_id=random_project.id)
+    issue = crud_issue.create_with_project(db=db, obj=issue_in)
+    with pytest.raises(InvalidRequestError):
+        issue.project
+
+
+def test_retrieve_authorized_issue(db: Session, random_project, random_project_user) -> None:
+    issue_in = IssueCreate(title=random_string(), type="Bug", status="To Do", project_id=random_project.id)
+    issue = crud_issue.create_with_project(db=db, obj=issue_in)
+    stranger = model_user(id=random_project_user.id + 100000, is_admin=False)
+    admin = model_user(id=stranger.id, is_admin=True)
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        stored_issue, allowed = crud_issue.retrieve_authorized(db=db, id=issue.id, user=random_project_user)
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+
+    assert len(statements) == 1
+    assert stored_issue.id == issue.id
+    assert allowed is True
+    assert crud_issue.retrieve_authorized(db=db, id=issue.id, user=random_project_user, access=OWNER)[1] is True
+    assert crud_issue.retrieve_authorized(db=db, id=issue.id, user=stranger)[1] is False
+    assert crud_issue.retrieve_authorized(db=db, id=issue.id, user=admin, access=WRITE)[1] is True
+    assert crud_issue.retrieve_authorized(db=db, id=issue.id, user=admin, access=OWNER)[1] is False
+    assert crud_issue.retrieve_authorized(db=db, id=-1, user=admin) is None
+
+
+def test_list_by_project_authorized(db: Session, random_project, random_project_user) -> None:
+    issue_in = IssueCreate(title=random_string(), type="Bug", status="To Do", project_id=random_project.id)
+    issue = crud_issue.create_with_project(db=db, obj=issue_in)
+    stranger = model_user(id=random_project_user.id + 100000, is_admin=False)
+
+    allowed, issues = crud_issue.list_by_project_authorized(
+        db=db, project_id=random_project.id, user=random_project_user, limit=1000
+    )
+    assert allowed is True
+    assert issue.id in [item.id for item in issues]
+    assert [item.id for item in issues] == sorted(item.id for item in issues)
+
+    assert crud_issue.list_by_project_authorized(
+        db=db, project_id=random_project.id, user=random_project_user, skip=100000
+    ) == (True, [])
+    assert crud_issue.list_by_project_authorized(db=db, project_id=random_project.id, user=stranger) == (False, [])
+    assert crud_issue.list_by_project_authorized(db=db, project_id=-1, user=random_project_user) is None
+
+
+def test_issue_counters_follow_writes(loop, async_db, db: Session, random_project_user) -> None:
+    project = crud_project.create_with_owner(
+        db=db, obj=ProjectCreate(title=random_string()), owner_id=random_project_user.id
+    )
+
+    def issue_in(status: str, type: str = "Bug") -> IssueCreate:
+        return IssueCreate(title=random_string(), type=type, status=status, project_id=project.id)
+
+    def counts():
+        return {(status, type): count for status, type, count in issue_counter.list_by_project(db, project_id=project.id)}
+
+    single = crud_issue.create_with_project(db=db, obj=issue_in("To Do"))
+    bulk_ids = crud_issue.create_bulk(db=db, objs=[issue_in("To Do"), issue_in("To Do", "Task"), issue_in("Done")])
+    crud_issue.copy_create(db=db, objs=[issue_in("Done"), issue_in("Done")])
+    assert counts() == {("Done", "Bug"): 3, ("To Do", "Bug"): 2, ("To Do", "Task"): 1}
+
+    crud_issue.update(db=db, db_obj=single, obj=IssueUpdate(status="In Progress", type="Task"))
+    loop.run_until_complete(
+        async_crud_issue.update_by_id(async_db, id=bulk_ids[0], obj=IssueUpdate(title=random_string()))
+    )
+    loop.run_until_complete(async_crud_issue.delete(async_db, id=bulk_ids[2]))
+    crud_issue.transition_status(db=db, ids=bulk_ids[:2], status="Done")
+    assert counts() == {("Done", "Bug"): 3, ("Done", "Task"): 1, ("In Progress", "Task"): 1}
+
+    # a cascade takes the issues along with the project and brings the same ones back
+    crud_project.delete_cascade(db=db, id=project.id)
+    crud_project.restore_cascade(db=db, id=project.id)
+    expected = counts()
+    assert expected == {("Done", "Bug"): 3, ("Done", "Task"): 1, ("In Progress", "Task"): 1}
+
+    assert issue_counter.reconcile(db, project_id=project.id) == 3
+    assert counts() == expected
+
+
+def test_count_by_project(loop, async_db, db: Session, random_project) -> None:
+    project = crud_project.create_with_owner(db=db, obj=ProjectCreate(title=random_string()),
+                                             owner_id=random_project.owner_id)
+    issues = [
+        crud_issue.create_with_project(
+            db=db, obj=IssueCreate(title=random_string(), type="Bug", status="To Do", project_id=project.id)
+        )
+        for _ in range(4)
+    ]
+    crud_issue.delete(db, id=issues[0].id)
+
+    assert crud_issue.count_by_project(db, project_id=project.id, exact_limit=3) == (3, True)
+    # past the limit the planner estimates, never below the rows already counted
+    count, exact = crud_issue.count_by_project(db, project_id=project.id, exact_limit=2)
+    assert count >= 3 and exact is False
+    assert loop.run_until_complete(
+        async_crud_issue.count_by_project(async_db, project_id=project.id, exact_limit=2)
+    )[1] is False
+
+
 # API
+# query pins are the cold path: the handler's statements plus loading the caller's principal
 def test_create_admin_issue(client, user_admin_token_headers: dict, db: Session, random_project) -> None:
     data = {"title": "Foo", "type": "Bug", "status": "To Do", "project_id": random_project.id}
     response = client.post(
@@ -99,9 +341,11 @@ def test_create_owner_project_issue(client, db: Session, user_token_headers_with
                                              owner_id=user_token_headers_with_user.get("user").id)
 
     data = {"title": "Foo", "type": "Bug", "status": "To Do", "project_id": project.id}
-    response = client.post(
-        "api/issue/", headers=user_token_headers_with_user.get("headers"), json=data,
-    )
+    # the project check, the counter, the INSERT and its refresh
+    with max_queries(5):
+        response = client.post(
+            "api/issue/", headers=user_token_headers_with_user.get("headers"), json=data,
+        )
 
     assert response.status_code == 200
     content = response.json()
@@ -142,9 +386,10 @@ def test_retrieve_owner_project_issue(client: TestClient, db: Session, user_toke
     issue_in = IssueCreate(title=title2, type="Bug", status="To Do", project_id=project.id)
     issue = crud_issue.create_with_project(db=db, obj=issue_in)
 
-    response = client.get(
-        f"/api/issue/{issue.id}", headers=user_token_headers_with_user.get("headers"),
-    )
+    with max_queries(2):
+        response = client.get(
+            f"/api/issue/{issue.id}", headers=user_token_headers_with_user.get("headers"),
+        )
 
     assert response.status_code == 200
     content = response.json()
@@ -210,12 +455,432 @@ def test_delete_owner_projects(
     issue_in = IssueCreate(**data)
     issue = crud_issue.create_with_project(db=db, obj=issue_in)
 
-    response = client.delete(
-        f"api/issue/{issue.id}", headers=user_token_headers_with_user.get("headers"),
-    )
+    with max_queries(4):
+        response = client.delete(
+            f"api/issue/{issue.id}", headers=user_token_headers_with_user.get("headers"),
+        )
 
     assert response.status_code == 200
     content = response.json()
     assert content["title"] == issue.title
     assert content["id"] == issue.id
     assert content["project_id"] == issue.project_id
+
+
+def test_list_project_issues_by_cursor(client: TestClient, db: Session, user_token_headers_with_user) -> None:
+    title = random_string()
+    project_in = ProjectCreate(title=title)
+    project = crud_project.create_with_owner(db=db, obj=project_in,
+                                             owner_id=user_token_headers_with_user.get("user").id)
+    issue_ids = [
+        crud_issue.create_with_project(
+            db=db, obj=IssueCreate(title=random_string(), type="Bug", status="To Do", project_id=project.id)
+        ).id
+        for _ in range(5)
+    ]
+
+    seen_ids = []
+    params = {"limit": 2}
+    while True:
+        response = client.get(
+            f"/api/issue/project/{project.id}", headers=user_token_headers_with_user.get("headers"), params=params,
+        )
+        assert response.status_code == 200
+        seen_ids.extend(item["id"] for item in response.json())
+        if "X-Next-Cursor" not in response.headers:
+            break
+        params = {"limit": 2, "cursor": response.headers["X-Next-Cursor"]}
+
+    assert seen_ids == issue_ids
+
+
+def test_list_project_issues_total_count(
+        client: TestClient, db: Session, user_token_headers_with_user, monkeypatch
+) -> None:
+    project = crud_project.create_with_owner(db=db, obj=ProjectCreate(title=random_string()),
+                                             owner_id=user_token_headers_with_user.get("user").id)
+    for _ in range(3):
+        crud_issue.create_with_project(
+            db=db, obj=IssueCreate(title=random_string(), type="Bug", status="To Do", project_id=project.id)
+        )
+    headers = user_token_headers_with_user.get("headers")
+
+    response = client.get(f"/api/issue/project/{project.id}", headers=headers, params={"limit": 1})
+    assert "X-Total-Count" not in response.headers
+
+    response = client.get(f"/api/issue/project/{project.id}", headers=headers, params={"limit": 1, "count": True})
+    assert response.headers["X-Total-Count"] == "3"
+    assert "X-Total-Count-Estimated" not in response.headers
+
+    monkeypatch.setattr(get_settings().pagination, "exact_count_limit", 2)
+    response = client.get("/api/issue/", headers=headers, params={"limit": 1, "count": True})
+    assert response.status_code == 200
+    assert int(response.headers["X-Total-Count"]) >= 3
+    assert response.headers["X-Total-Count-Estimated"] == "true"
+
+
+def test_list_issues_invalid_cursor(client: TestClient, user_token_headers: dict) -> None:
+    response = client.get(
+        "/api/issue/", headers=user_token_headers, params={"cursor": "not-a-cursor"},
+    )
+
+    assert response.status_code == 400
+    assert response.json() == {'detail': 'Invalid cursor'}
+
+
+def test_create_owner_project_issues_bulk(client: TestClient, db: Session, user_token_headers_with_user) -> None:
+    owner_id = user_token_headers_with_user.get("user").id
+    projects = [
+        crud_project.create_with_owner(db=db, obj=ProjectCreate(title=random_string()), owner_id=owner_id)
+        for _ in range(2)
+    ]
+    data = {"issues": [
+        {"title": random_string(), "type": "Bug", "status": "To Do", "project_id": project.id}
+        for project in projects * 2
+    ]}
+
+    response = client.post(
+        "api/issue/bulk", headers=user_token_headers_with_user.get("headers"), json=data,
+    )
+
+    assert response.status_code == 200
+    ids = response.json()["ids"]
+    assert len(ids) == 4
+    for issue_id, issue_in in zip(ids, data["issues"]):
+        stored_issue = crud_issue.retrieve(db=db, id=issue_id)
+        assert stored_issue.title == issue_in["title"]
+        assert stored_issue.project_id == issue_in["project_id"]
+
+
+def test_create_issues_bulk_foreign_project(
+        client: TestClient, db: Session, user_token_headers_with_user, random_project
+) -> None:
+    owner_id = user_token_headers_with_user.get("user").id
+    project = crud_project.create_with_owner(db=db, obj=ProjectCreate(title=random_string()), owner_id=owner_id)
+    data = {"issues": [
+        {"title": random_string(), "type": "Bug", "status": "To Do", "project_id": project_id}
+        for project_id in [project.id, random_project.id]
+    ]}
+
+    response = client.post(
+        "api/issue/bulk", headers=user_token_headers_with_user.get("headers"), json=data,
+    )
+
+    assert response.status_code == 400
+    assert response.json() == {'detail': 'Not enough permissions'}
+    assert crud_issue.list_by_project(db=db, project_id=project.id) == []
+
+
+def test_create_issues_bulk_missing_project(client: TestClient, user_token_headers: dict) -> None:
+    data = {"issues": [{"title": random_string(), "type": "Bug", "status": "To Do", "project_id": 999999}]}
+
+    response = client.post("api/issue/bulk", headers=user_token_headers, json=data)
+
+    assert response.status_code == 404
+    assert response.json() == {'detail': 'Project not found'}
+
+
+def test_transition_owner_project_issues_bulk(client: TestClient, db: Session, user_token_headers_with_user) -> None:
+    user = user_token_headers_with_user.get("user")
+    project = crud_project.create_with_owner(db=db, obj=ProjectCreate(title=random_string()), owner_id=user.id)
+    issues_in = [
+        IssueCreate(title=random_string(), type="Bug", status=status, project_id=project.id)
+        for status in ["To Do", "In Progress", "Done"]
+    ]
+    ids = crud_issue.create_bulk(db=db, objs=issues_in)
+
+    # one lock/read, one outbox INSERT, one UPDATE and one counter upsert, however many issues
+    with max_queries(5):
+        response = client.put(
+            "api/issue/bulk/status", headers=user_token_headers_with_user.get("headers"),
+            json={"ids": ids, "status": "Done"},
+        )
+
+    assert response.status_code == 200
+    content = response.json()
+    assert sorted(item["id"] for item in content) == sorted(ids)
+    assert all(item["status"] == "Done" for item in content)
+    notifications = db.query(model_outbox).filter(model_outbox.payload["issue_id"].as_integer().in_(ids)).all()
+    assert sorted(row.payload["from_status"] for row in notifications) == ["In Progress", "To Do"]
+    assert all(row.recipient == user.email and row.status == "pending" for row in notifications)
+
+
+def test_transition_issues_bulk_foreign_issue(
+        client: TestClient, db: Session, user_token_headers_with_user, random_issue
+) -> None:
+    owner_id = user_token_headers_with_user.get("user").id
+    project = crud_project.create_with_owner(db=db, obj=ProjectCreate(title=random_string()), owner_id=owner_id)
+    issue = crud_issue.create_with_project(
+        db=db, obj=IssueCreate(title=random_string(), type="Bug", status="To Do", project_id=project.id)
+    )
+
+    response = client.put(
+        "api/issue/bulk/status", headers=user_token_headers_with_user.get("headers"),
+        json={"ids": [issue.id, random_issue.id], "status": "Done"},
+    )
+
+    assert response.status_code == 400
+    assert response.json() == {'detail': 'Not enough permissions'}
+    db.refresh(issue)
+    assert issue.status == "To Do"
+
+
+def test_transition_issues_bulk_missing_issue(client: TestClient, user_admin_token_headers: dict) -> None:
+    response = client.put(
+        "api/issue/bulk/status", headers=user_admin_token_headers, json={"ids": [999999], "status": "Done"},
+    )
+
+    assert response.status_code == 404
+    assert response.json() == {'detail': 'Issue not found'}
+
+
+def test_update_issue_status_writes_outbox(client: TestClient, db: Session, user_token_headers_with_user) -> None:
+    user = user_token_headers_with_user.get("user")
+    project = crud_project.create_with_owner(db=db, obj=ProjectCreate(title=random_string()), owner_id=user.id)
+    issue = crud_issue.create_with_project(
+        db=db, obj=IssueCreate(title=random_string(), type="Bug", status="To Do", project_id=project.id)
+    )
+    headers = user_token_headers_with_user.get("headers")
+
+    with max_queries(3):
+        client.put(f"api/issue/{issue.id}", headers=headers, json={"title": random_string()})
+    with max_queries(5):
+        response = client.put(f"api/issue/{issue.id}", headers=headers, json={"status": "Done"})
+
+    assert response.status_code == 200
+    notifications = db.query(model_outbox).filter(model_outbox.payload["issue_id"].as_integer() == issue.id).all()
+    assert [row.payload for row in notifications] == [
+        {"issue_id": issue.id, "project_id": project.id, "from_status": "To Do", "to_status": "Done"}
+    ]
+
+
+def test_list_foreign_project_issues(client: TestClient, user_token_headers: dict, random_issue) -> None:
+    response = client.get(
+        f"/api/issue/project/{random_issue.project_id}", headers=user_token_headers,
+    )
+
+    assert response.status_code == 400
+    assert response.json() == {'detail': 'Not enough permissions'}
+
+
+def test_list_missing_project_issues(client: TestClient, user_token_headers: dict) -> None:
+    response = client.get("/api/issue/project/-1", headers=user_token_headers)
+
+    assert response.status_code == 404
+
+
+def test_list_issues_matches_response_model(
+    client: TestClient, db: Session, user_admin_token_headers: dict, user_token_headers_with_user
+) -> None:
+    project = crud_project.create_with_owner(db=db, obj=ProjectCreate(title=random_string()),
+                                             owner_id=user_token_headers_with_user.get("user").id)
+    crud_issue.create_bulk(db=db, objs=[
+        IssueCreate(title=random_string(), type="Bug", status="To Do", project_id=project.id) for _ in range(3)
+    ])
+    db.expire_all()
+
+    with max_queries(2):
+        response = client.get("/api/issue/", headers=user_admin_token_headers, params={"limit": 50})
+    issues = crud_issue.list(db=db, limit=50)
+    assert response.content == orjson.dumps(jsonable_encoder([schema_issue.from_orm(item) for item in issues]))
+
+    url = f"/api/issue/project/{project.id}"
+    with max_queries(2):
+        response = client.get(url, headers=user_token_headers_with_user.get("headers"))
+    issues = crud_issue.list_by_project(db=db, project_id=project.id)
+    assert response.content == orjson.dumps(jsonable_encoder([schema_issue.from_orm(item) for item in issues]))
+
+
+def test_retrieve_issue_etag(client: TestClient, db: Session, user_token_headers_with_user) -> None:
+    user = user_token_headers_with_user.get("user")
+    headers = user_token_headers_with_user.get("headers")
+    project = crud_project.create_with_owner(db=db, obj=ProjectCreate(title=random_string()), owner_id=user.id)
+    issue = crud_issue.create_with_project(
+        db=db, obj=IssueCreate(title=random_string(), type="Bug", status="To Do", project_id=project.id)
+    )
+
+    response = client.get(f"/api/issue/{issue.id}", headers=headers)
+    etag = response.headers["etag"]
+    assert etag == '"1"'
+
+    response = client.get(f"/api/issue/{issue.id}", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+    client.put(f"api/issue/{issue.id}", headers=headers, json={"title": random_string()})
+    response = client.get(f"/api/issue/{issue.id}", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] == '"2"'
+
+
+def test_update_issue_if_match(client: TestClient, db: Session, user_token_headers_with_user) -> None:
+    user = user_token_headers_with_user.get("user")
+    headers = user_token_headers_with_user.get("headers")
+    project = crud_project.create_with_owner(db=db, obj=ProjectCreate(title=random_string()), owner_id=user.id)
+    issue = crud_issue.create_with_project(
+        db=db, obj=IssueCreate(title=random_string(), type="Bug", status="To Do", project_id=project.id)
+    )
+
+    response = client.put(f"api/issue/{issue.id}", headers={**headers, "If-Match": '"1"'}, json={"status": "Done"})
+    assert response.status_code == 200
+    assert response.headers["etag"] == '"2"'
+
+    for stale in ['"1"', '"nope"']:
+        response = client.put(
+            f"api/issue/{issue.id}", headers={**headers, "If-Match": stale}, json={"status": "To Do"}
+        )
+        assert response.status_code == 412
+        assert response.json() == {"detail": "Resource has changed"}
+
+    response = client.get(f"/api/issue/{issue.id}", headers=headers)
+    assert response.json()["status"] == "Done"
+    notifications = db.query(model_outbox).filter(model_outbox.payload["issue_id"].as_integer() == issue.id).all()
+    assert len(notifications) == 1
+
+
+def test_list_issues_etag(client: TestClient, db: Session, user_token_headers_with_user) -> None:
+    user = user_token_headers_with_user.get("user")
+    headers = user_token_headers_with_user.get("headers")
+    project = crud_project.create_with_owner(db=db, obj=ProjectCreate(title=random_string()), owner_id=user.id)
+    issue_ids = crud_issue.create_bulk(db=db, objs=[
+        IssueCreate(title=random_string(), type="Bug", status="To Do", project_id=project.id) for _ in range(2)
+    ])
+    params = {"limit": 1}
+
+    response = client.get(f"/api/issue/project/{project.id}", headers=headers, params=params)
+    etag = response.headers["etag"]
+
+    response = client.get(f"/api/issue/project/{project.id}", headers={**headers, "If-None-Match": etag}, params=params)
+    assert response.status_code == 304
+    assert "X-Next-Cursor" in response.headers
+
+    client.put(f"api/issue/{issue_ids[0]}", headers=headers, json={"title": random_string()})
+    response = client.get(f"/api/issue/project/{project.id}", headers={**headers, "If-None-Match": etag}, params=params)
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+def test_export_project_issues(client: TestClient, db: Session, user_token_headers_with_user) -> None:
+    user = user_token_headers_with_user.get("user")
+    headers = user_token_headers_with_user.get("headers")
+    project = crud_project.create_with_owner(db=db, obj=ProjectCreate(title=random_string()), owner_id=user.id)
+    issue_ids = crud_issue.create_bulk(db=db, objs=[
+        IssueCreate(title=f"{random_string()}, \"quoted\"", type="Bug", status="To Do", project_id=project.id)
+        for _ in range(3)
+    ])
+    crud_issue.delete(db=db, id=issue_ids[0])
+    listed = client.get(f"/api/issue/project/{project.id}", headers=headers).json()
+
+    url = f"/api/issue/project/{project.id}/export"
+    with max_queries(3):
+        response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    assert [orjson.loads(line) for line in response.content.splitlines()] == listed
+
+    response = client.get(f"/api/issue/project/{project.id}/export", headers=headers, params={"format": "csv"})
+    assert response.status_code == 200
+    assert response.headers["content-disposition"] == f'attachment; filename="project-{project.id}-issues.csv"'
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert [{**row, "id": int(row["id"]), "project_id": int(row["project_id"])} for row in rows] == listed
+
+
+def test_export_project_issues_rejected(client: TestClient, user_token_headers: dict, random_issue) -> None:
+    response = client.get(f"/api/issue/project/{random_issue.project_id}/export", headers=user_token_headers)
+    assert response.status_code == 400
+
+    response = client.get("/api/issue/project/-1/export", headers=user_token_headers)
+    assert response.status_code == 404
+
+    response = client.get(
+        f"/api/issue/project/{random_issue.project_id}/export", headers=user_token_headers, params={"format": "xml"}
+    )
+    assert response.status_code == 422
+
+
+def test_import_issues(client: TestClient, db: Session, user_token_headers_with_user, random_project) -> None:
+    user = user_token_headers_with_user.get("user")
+    headers = user_token_headers_with_user.get("headers")
+    project = crud_project.create_with_owner(db=db, obj=ProjectCreate(title=random_string()), owner_id=user.id)
+    rows = [
+        {"title": random_string(), "type": "Bug", "status": "To Do", "project_id": project.id},
+        {"title": "no status", "type": "Bug", "project_id": project.id},
+        {"title": random_string(), "type": "Task", "status": "Done", "project_id": random_project.id},
+    ]
+    data = b"".join(orjson.dumps(row) + b"\n" for row in rows) + b"not json\n"
+
+    response = client.post("/api/issue/import", headers=headers, data=data)
+    assert response.status_code == 200
+    report = response.json()
+    assert (report["imported"], report["failed"]) == (1, 3)
+    assert [(error["line"], error["errors"][0]["loc"]) for error in report["errors"]] == [
+        (2, ["status"]), (3, ["project_id"]), (4, ["__root__"])
+    ]
+
+    # an export loads back as is, the extra id column is ignored
+    exported = client.get(f"/api/issue/project/{project.id}/export", headers=headers, params={"format": "csv"})
+    response = client.post("/api/issue/import", headers=headers, data=exported.content, params={"format": "csv"})
+    assert response.json() == {"imported": 1, "failed": 0, "errors": []}
+    listed = client.get(f"/api/issue/project/{project.id}", headers=headers).json()
+    assert [issue["title"] for issue in listed] == [rows[0]["title"]] * 2
+
+
+def test_import_issues_rejected(client: TestClient, user_admin_token_headers: dict, user_token_headers: dict) -> None:
+    response = client.post("/api/issue/import", headers=user_admin_token_headers, data=b"")
+    assert response.status_code == 400
+
+    response = client.post("/api/issue/import", headers=user_token_headers, data=b"", params={"format": "xml"})
+    assert response.status_code == 422
+
+
+def test_search_issues(
+    client: TestClient, db: Session, user_token_headers_with_user, user_token_headers: dict,
+    user_admin_token_headers: dict
+) -> None:
+    user = user_token_headers_with_user.get("user")
+    headers = user_token_headers_with_user.get("headers")
+    project = crud_project.create_with_owner(db=db, obj=ProjectCreate(title=random_string()), owner_id=user.id)
+    word = random_string()
+    titles = [f"{word} {word} crash", f"{word} login", f"{word} export", f"Crash on {word.upper()}", "unrelated"]
+    issue_ids = crud_issue.create_bulk(db=db, objs=[
+        IssueCreate(title=title, type="Bug", status="To Do", project_id=project.id) for title in titles
+    ])
+    crud_issue.delete(db=db, id=issue_ids[2])
+
+    with max_queries(2):
+        response = client.get("/api/issue/search", headers=headers, params={"q": word})
+    assert response.status_code == 200
+    found = response.json()
+    # the title naming the word twice ranks first, ties keep id order
+    assert [issue["id"] for issue in found] == [issue_ids[0], issue_ids[1], issue_ids[3]]
+    assert found[0]["rank"] > found[1]["rank"] == found[2]["rank"]
+    assert {key: value for key, value in found[1].items() if key != "rank"} == schema_issue.from_orm(
+        crud_issue.retrieve(db, id=issue_ids[1])
+    ).dict()
+
+    response = client.get("/api/issue/search", headers=headers, params={"q": f'{word} -"crash"'})
+    assert [issue["id"] for issue in response.json()] == [issue_ids[1]]
+
+    paged, cursor = [], None
+    while True:
+        params = {"q": word, "limit": 1, **({"cursor": cursor} if cursor else {})}
+        response = client.get("/api/issue/search", headers=headers, params=params)
+        paged.extend(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert paged == found
+
+    response = client.get("/api/issue/search", headers=user_token_headers, params={"q": word})
+    assert response.json() == []
+    response = client.get("/api/issue/search", headers=user_admin_token_headers, params={"q": word})
+    assert [issue["id"] for issue in response.json()] == [issue["id"] for issue in found]
+
+
+def test_search_issues_rejected(client: TestClient, user_token_headers: dict) -> None:
+    response = client.get("/api/issue/search", headers=user_token_headers, params={"q": ""})
+    assert response.status_code == 422
+
+    response = client.get("/api/issue/search", headers=user_token_headers, params={"q": "x", "cursor": "e30"})
+    assert response.status_code == 400
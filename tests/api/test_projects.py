@@ -1,10 +1,14 @@
+import orjson
+
+from fastapi.encoders import jsonable_encoder
 from fastapi.testclient import TestClient
 from sqlalchemy.orm import Session
 
-from test_project.crud.project import project as crud_project
-from test_project.models.schemas import ProjectCreate, ProjectUpdate
-from test_project.models.models import Project as model_project
-from tests.conftest import random_string
+from test_project.crud.issue import issue as crud_issue
+from test_project.crud.project import OWNER, WRITE, project as crud_project
+from test_project.models.schemas import IssueCreate, Project as schema_project, ProjectCreate, ProjectUpdate
+from test_project.models.models import Issue as model_issue, Project as model_project
+from tests.conftest import max_queries, random_string
 
 
 # CRUD
@@ -36,6 +40,20 @@ def test_retrieve_item(db: Session, random_project_user) -> None:
     assert project.owner_id == stored_project.owner_id
 
 
+def test_retrieve_authorized_item(db: Session, random_project_user, random_project_user2) -> None:
+    project_in = ProjectCreate(title=random_string())
+    project = crud_project.create_with_owner(db=db, obj=project_in, owner_id=random_project_user.id)
+    crud_project.update(db=db, db_obj=project, obj=ProjectUpdate(assigned_id=random_project_user2.id))
+
+    stored_project, allowed = crud_project.retrieve_authorized(db=db, id=project.id, user=random_project_user)
+    assert stored_project.id == project.id
+    assert allowed is True
+    assert crud_project.retrieve_authorized(db=db, id=project.id, user=random_project_user2)[1] is True
+    assert crud_project.retrieve_authorized(db=db, id=project.id, user=random_project_user2, access=WRITE)[1] is False
+    assert crud_project.retrieve_authorized(db=db, id=project.id, user=random_project_user, access=OWNER)[1] is True
+    assert crud_project.retrieve_authorized(db=db, id=-1, user=random_project_user) is None
+
+
 def test_update_item(db: Session, random_project_user, random_project_user2) -> None:
     title = random_string()
     project_in = ProjectCreate(title=title)
@@ -73,7 +91,53 @@ def test_soft_delete_item(db: Session, random_project_user) -> None:
     assert len(db.query(model_project).filter(model_project.is_deleted.is_(True)).all()) > 0
 
 
+def test_list_by_user_after_id(db: Session, random_project_user) -> None:
+    projects = [
+        crud_project.create_with_owner(db=db, obj=ProjectCreate(title=random_string()), owner_id=random_project_user.id)
+        for _ in range(3)
+    ]
+    first_page = crud_project.list_by_user(db=db, user_id=random_project_user.id, limit=1000)
+    next_page = crud_project.list_by_user(db=db, user_id=random_project_user.id, after_id=projects[0].id, limit=2)
+
+    assert [project.id for project in first_page] == sorted(project.id for project in first_page)
+    assert [project.id for project in next_page] == [project.id for project in projects[1:]]
+
+
+def test_count_by_user(db: Session, random_project_user2) -> None:
+    for _ in range(3):
+        crud_project.create_with_owner(db=db, obj=ProjectCreate(title=random_string()), owner_id=random_project_user2.id)
+    live = len(crud_project.list_by_user(db=db, user_id=random_project_user2.id, limit=1000))
+
+    assert crud_project.count_by_user(db, user_id=random_project_user2.id, exact_limit=live) == (live, True)
+    count, exact = crud_project.count_by_user(db, user_id=random_project_user2.id, exact_limit=live - 1)
+    assert count >= live and exact is False
+
+
+def test_delete_and_restore_cascade_item(db: Session, random_project_user) -> None:
+    project = crud_project.create_with_owner(db=db, obj=ProjectCreate(title=random_string()), owner_id=random_project_user.id)
+    issue_ids = crud_issue.create_bulk(db=db, objs=[
+        IssueCreate(title=random_string(), type="Bug", status="To Do", project_id=project.id) for _ in range(3)
+    ])
+    crud_issue.delete(db=db, id=issue_ids[0])
+
+    deleted_project, deleted_issues = crud_project.delete_cascade(db=db, id=project.id)
+    assert deleted_project.is_deleted is True
+    assert deleted_issues == 2
+    assert crud_project.delete_cascade(db=db, id=project.id) is None
+    assert crud_issue.list_by_user_projects(db=db, user_id=random_project_user.id, limit=1000) == []
+
+    restored_project, restored_issues = crud_project.restore_cascade(db=db, id=project.id)
+    assert restored_project.is_deleted is False
+    assert restored_issues == 2
+    assert crud_project.restore_cascade(db=db, id=project.id) is None
+    assert crud_issue.retrieve(db=db, id=issue_ids[0]) is None
+    visible_ids = [item.id for item in crud_issue.list_by_user_projects(db=db, user_id=random_project_user.id, limit=1000)]
+    assert visible_ids == issue_ids[1:]
+    assert db.query(model_issue).filter(model_issue.deleted_with_project.is_(True)).count() == 0
+
+
 # API
+# query pins are the cold path: the handler's statements plus loading the caller's principal
 def test_create_admin_project(client, user_admin_token_headers: dict, db: Session) -> None:
     data = {"title": "Foo"}
     response = client.post(
@@ -87,9 +151,10 @@ def test_create_admin_project(client, user_admin_token_headers: dict, db: Sessio
 
 def test_create_user_project(client, user_token_headers: dict, db: Session) -> None:
     data = {"title": "Foo"}
-    response = client.post(
-        "api/project/", headers=user_token_headers, json=data,
-    )
+    with max_queries(3):
+        response = client.post(
+            "api/project/", headers=user_token_headers, json=data,
+        )
     assert response.status_code == 200
     content = response.json()
     assert content["title"] == data["title"]
@@ -124,9 +189,10 @@ def test_retrieve_owner_project(client: TestClient, db: Session, user_token_head
     project_in = ProjectCreate(title=title, id=id)
     project = crud_project.create_with_owner(db=db, obj=project_in, owner_id=user_token_headers_with_user.get("user").id)
 
-    response = client.get(
-        f"/api/project/{project.id}", headers=user_token_headers_with_user.get("headers"),
-    )
+    with max_queries(2):
+        response = client.get(
+            f"/api/project/{project.id}", headers=user_token_headers_with_user.get("headers"),
+        )
 
     assert response.status_code == 200
     content = response.json()
@@ -215,12 +281,111 @@ def test_delete_owner_projects(
     project = crud_project.create_with_owner(db=db, obj=project_in,
                                              owner_id=user_token_headers_with_user.get("user").id)
 
-    response = client.delete(
-        f"api/project/{project.id}", headers=user_token_headers_with_user.get("headers"),
-    )
+    # the project and its issues go in one UPDATE each
+    with max_queries(4):
+        response = client.delete(
+            f"api/project/{project.id}", headers=user_token_headers_with_user.get("headers"),
+        )
 
     assert response.status_code == 200
     content = response.json()
     assert content["title"] == project.title
     assert content["id"] == project.id
     assert content["owner_id"] == project.owner_id
+
+
+def test_delete_owner_project_hides_issues(client: TestClient, db: Session, user_token_headers_with_user) -> None:
+    headers = user_token_headers_with_user.get("headers")
+    project = crud_project.create_with_owner(db=db, obj=ProjectCreate(title=random_string()),
+                                             owner_id=user_token_headers_with_user.get("user").id)
+    issue_ids = crud_issue.create_bulk(db=db, objs=[
+        IssueCreate(title=random_string(), type="Bug", status="To Do", project_id=project.id) for _ in range(2)
+    ])
+
+    response = client.delete(f"api/project/{project.id}", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["affected_issues"] == 2
+
+    response = client.get("/api/issue/", headers=headers, params={"limit": 1000})
+    assert not set(issue_ids) & {item["id"] for item in response.json()}
+    assert client.get(f"/api/issue/{issue_ids[0]}", headers=headers).status_code == 404
+
+    response = client.post(f"api/project/{project.id}/restore", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["id"] == project.id
+    assert response.json()["affected_issues"] == 2
+
+    response = client.get("/api/issue/", headers=headers, params={"limit": 1000})
+    assert set(issue_ids) <= {item["id"] for item in response.json()}
+
+
+def test_restore_user_project(client: TestClient, user_token_headers: dict, db: Session, random_project_user) -> None:
+    project = crud_project.create_with_owner(db=db, obj=ProjectCreate(title=random_string()), owner_id=random_project_user.id)
+    crud_project.delete(db=db, id=project.id)
+
+    response = client.post(f"api/project/{project.id}/restore", headers=user_token_headers)
+    assert response.status_code == 400
+
+    response = client.post("api/project/-1/restore", headers=user_token_headers)
+    assert response.status_code == 404
+
+
+def test_list_projects_matches_response_model(client: TestClient, db: Session, user_token_headers_with_user) -> None:
+    user = user_token_headers_with_user.get("user")
+    crud_project.create_with_owner(db=db, obj=ProjectCreate(title=random_string()), owner_id=user.id)
+    db.expire_all()
+
+    with max_queries(2):
+        response = client.get("/api/project/", headers=user_token_headers_with_user.get("headers"))
+    projects = crud_project.list_by_user(db=db, user_id=user.id)
+    assert response.content == orjson.dumps(jsonable_encoder([schema_project.from_orm(item) for item in projects]))
+
+
+def test_project_etag_and_if_match(client: TestClient, db: Session, user_token_headers_with_user) -> None:
+    headers = user_token_headers_with_user.get("headers")
+    project = crud_project.create_with_owner(db=db, obj=ProjectCreate(title=random_string()),
+                                             owner_id=user_token_headers_with_user.get("user").id)
+
+    response = client.get(f"api/project/{project.id}", headers=headers)
+    etag = response.headers["etag"]
+    response = client.get(f"api/project/{project.id}", headers={**headers, "If-None-Match": f"W/{etag}"})
+    assert response.status_code == 304
+
+    url = f"api/project/{project.id}"
+    # the authorized read and one UPDATE ... RETURNING
+    with max_queries(3):
+        response = client.put(url, headers={**headers, "If-Match": etag}, json={"title": "Foo"})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+    response = client.put(f"api/project/{project.id}", headers={**headers, "If-Match": etag}, json={"title": "Bar"})
+    assert response.status_code == 412
+    assert client.get(f"api/project/{project.id}", headers=headers).json()["title"] == "Foo"
+
+
+def test_project_stats(client: TestClient, db: Session, user_token_headers_with_user, user_token_headers: dict) -> None:
+    user = user_token_headers_with_user.get("user")
+    headers = user_token_headers_with_user.get("headers")
+    project = crud_project.create_with_owner(db=db, obj=ProjectCreate(title=random_string()), owner_id=user.id)
+    for status, type in [("To Do", "Bug"), ("To Do", "Bug"), ("To Do", "Task"), ("Done", "Bug")]:
+        response = client.post("/api/issue/", headers=headers, json={
+            "title": random_string(), "type": type, "status": status, "project_id": project.id
+        })
+    client.delete(f"/api/issue/{response.json()['id']}", headers=headers)
+
+    url = f"/api/project/{project.id}/stats"
+    with max_queries(3):
+        response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    assert response.json() == {
+        "project_id": project.id,
+        "total": 3,
+        "by_status": {"To Do": 3},
+        "by_type": {"Bug": 2, "Task": 1},
+        "counts": [{"status": "To Do", "type": "Bug", "count": 2}, {"status": "To Do", "type": "Task", "count": 1}],
+    }
+
+    response = client.get(f"/api/project/{project.id}/stats", headers=user_token_headers)
+    assert response.status_code == 400
+    response = client.get("/api/project/-1/stats", headers=headers)
+    assert response.status_code == 404
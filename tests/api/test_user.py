@@ -1,3 +1,4 @@
+import orjson
 import pytest
 
 from fastapi.encoders import jsonable_encoder
@@ -5,9 +6,9 @@ from fastapi.testclient import TestClient
 from sqlalchemy.orm import Session
 from typing import Dict
 
-from test_project.crud.user import user as crud_user
-from test_project.models.schemas import UserCreate
-from tests.conftest import random_email, random_string
+from test_project.crud.user import async_user as async_crud_user, user as crud_user
+from test_project.models.schemas import User as schema_user, UserCreate
+from tests.conftest import max_queries, random_email, random_string
 from test_project.core.exceptions import UserNotFoundException
 
 
@@ -67,14 +68,35 @@ def test_get_user(db: Session) -> None:
     assert jsonable_encoder(user) == jsonable_encoder(user_2)
 
 
+def test_async_create_and_authenticate_user(loop, async_db) -> None:
+    email = random_email()
+    password = random_string()
+    user_in = UserCreate(email=email, password=password)
+    user = loop.run_until_complete(async_crud_user.create(async_db, obj=user_in))
+    authenticated_user = loop.run_until_complete(
+        async_crud_user.authenticate(async_db, email=email, password=password)
+    )
+    assert user.email == email
+    assert authenticated_user.id == user.id
+
+
+def test_async_not_authenticate_user(loop, async_db) -> None:
+    with pytest.raises(UserNotFoundException):
+        loop.run_until_complete(
+            async_crud_user.authenticate(async_db, email=random_email(), password=random_string())
+        )
+
+
 # API tests
 def test_create_user_new_email(client: TestClient, user_token_headers: dict, db: Session) -> None:
     email = random_email()
     password = random_string()
     data = {"email": email, "password": password}
-    r = client.post(
-        "api/user/register", headers=user_token_headers, json=data,
-    )
+    # the email check, the INSERT and its refresh
+    with max_queries(3):
+        r = client.post(
+            "api/user/register", headers=user_token_headers, json=data,
+        )
     assert 200 <= r.status_code < 300
     created_user = r.json()
     user = crud_user.retrieve_by_email(db, email=email)
@@ -134,3 +156,11 @@ def test_retrieve_users_admin(client: TestClient, user_admin_token_headers: dict
     assert len(all_users) > 1
     for item in all_users:
         assert "email" in item
+
+
+def test_list_users_matches_response_model(client: TestClient, user_admin_token_headers: dict, db: Session) -> None:
+    # the list and, on a cold token, the caller's principal
+    with max_queries(2):
+        response = client.get("/api/user/", headers=user_admin_token_headers, params={"limit": 20})
+    users = crud_user.list(db=db, limit=20)
+    assert response.content == orjson.dumps(jsonable_encoder([schema_user.from_orm(item) for item in users]))
@@ -0,0 +1,80 @@
+import pytest
+import smtplib
+
+from test_project.core.exceptions import MailCircuitOpenException
+from test_project.core.mail import SendMail
+from test_project.core.settings import Mail
+
+
+class FakeSocket:
+    def settimeout(self, timeout: float) -> None:
+        self.timeout = timeout
+
+
+class FakeSMTP:
+    instances = []
+    noop_code = 250
+
+    def __init__(self, host: str, port: int, timeout: float):
+        self.sock = FakeSocket()
+        self.sent = []
+        self.noops = 0
+        FakeSMTP.instances.append(self)
+
+    def sendmail(self, sender: str, reciever: str, data: str) -> None:
+        self.sent.append(data)
+
+    def noop(self):
+        self.noops += 1
+        return self.noop_code, b""
+
+    def quit(self) -> None:
+        pass
+
+
+@pytest.fixture
+def fake_smtp(monkeypatch):
+    FakeSMTP.instances = []
+    FakeSMTP.noop_code = 250
+    monkeypatch.setattr(smtplib, "SMTP", FakeSMTP)
+    return FakeSMTP
+
+
+def test_pool_reuses_connection(fake_smtp) -> None:
+    mail = SendMail(Mail(host="sink", port=25))
+    mail.deliver(["first"])
+    mail.deliver(["second", "third"])
+
+    assert len(fake_smtp.instances) == 1
+    assert fake_smtp.instances[0].sent == ["first", "second", "third"]
+    assert fake_smtp.instances[0].noops == 0
+
+
+def test_pool_replaces_dead_connection(fake_smtp) -> None:
+    mail = SendMail(Mail(host="sink", port=25, keepalive=0))
+    mail.deliver(["first"])
+    fake_smtp.noop_code = 421
+    mail.deliver(["second"])
+
+    assert len(fake_smtp.instances) == 2
+    assert fake_smtp.instances[0].noops == 1
+    assert fake_smtp.instances[1].sent == ["second"]
+
+
+def test_breaker_stops_connecting_to_dead_server(monkeypatch) -> None:
+    attempts = []
+
+    def refuse(host: str, port: int, timeout: float):
+        attempts.append(host)
+        raise ConnectionRefusedError
+
+    monkeypatch.setattr(smtplib, "SMTP", refuse)
+    mail = SendMail(Mail(host="sink", port=25, breaker_failures=2, breaker_reset=60))
+
+    for _ in range(2):
+        with pytest.raises(ConnectionRefusedError):
+            mail.deliver(["message"])
+    with pytest.raises(MailCircuitOpenException):
+        mail.deliver(["message"])
+
+    assert len(attempts) == 2
@@ -0,0 +1,101 @@
+import logging
+
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from sqlalchemy import create_engine, event
+
+from test_project.core.metrics import MeteredQueuePool, QueryStats, instrument_engine
+from test_project.core.settings import QueryBudget, get_settings
+from tests.conftest import SQLALCHEMY_DATABASE_URL, async_engine, engine
+
+
+def sample(name: str, **labels: str) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_route_sql_metrics(client: TestClient, user_token_headers: dict, random_issue) -> None:
+    labels = {"method": "GET", "path": "/api/issue/{id}"}
+    requests_before = sample("http_request_sql_statements_count", **labels)
+    statements_before = sample("http_request_sql_statements_sum", **labels)
+    refused = {**labels, "app_name": "test_project", "status_code": "400"}
+    refused_before = sample("http_requests_total", **refused)
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    # whichever engine `postgresql.use_async` serves requests from
+    engines = [engine, async_engine.sync_engine]
+    for served in engines:
+        event.listen(served, "before_cursor_execute", before_cursor_execute)
+    try:
+        response = client.get(f"/api/issue/{random_issue.id}", headers=user_token_headers)
+    finally:
+        for served in engines:
+            event.remove(served, "before_cursor_execute", before_cursor_execute)
+    # another user's issue: refused, after the lookups that decided it
+    assert response.status_code == 400
+
+    assert sample("http_request_sql_statements_count", **labels) == requests_before + 1
+    assert sample("http_request_sql_statements_sum", **labels) == statements_before + len(statements)
+    assert sample("http_request_sql_seconds_count", **labels) == requests_before + 1
+    # recorded with the status the exception handler turned the refusal into
+    assert sample("http_requests_total", **refused) == refused_before + 1
+
+    # unmatched paths would make a label per URL, they are left out
+    client.get("/no/such/route")
+    assert sample("http_request_sql_statements_count", method="GET", path="/no/such/route") == 0
+
+
+def test_query_stats_repeated_statements() -> None:
+    stats = QueryStats()
+    stats.record("SELECT project WHERE id = %(id)s", 0.001)
+    for _ in range(3):
+        stats.record("SELECT\n  issue WHERE project_id = %(project_id)s", 0.001)
+
+    assert stats.repeated() == [("SELECT\n  issue WHERE project_id = %(project_id)s", 3)]
+    assert stats.report().splitlines()[1] == "  3x SELECT issue WHERE project_id = %(project_id)s"
+    assert not stats.over(QueryBudget(statements=4, sql_seconds=1, repeats=3))
+    # the same statement once per row is flagged even well under the statement budget
+    assert stats.over(QueryBudget(statements=4, sql_seconds=1, repeats=2))
+    assert stats.over(QueryBudget(statements=3, sql_seconds=1, repeats=3))
+
+
+def test_query_budget_logged(client: TestClient, user_token_headers: dict, random_issue, monkeypatch, caplog) -> None:
+    client.get(f"/api/issue/{random_issue.id}", headers=user_token_headers)
+    monkeypatch.setattr(get_settings().query_budget, "statements", 0)
+
+    with caplog.at_level(logging.WARNING):
+        client.get(f"/api/issue/{random_issue.id}", headers=user_token_headers)
+
+    # warm principal: the retrieve alone
+    [record] = caplog.records
+    expected = f"Query budget exceeded by GET /api/issue/{random_issue.id}: 1 statements in "
+    assert record.getMessage().startswith(expected)
+
+
+def test_metrics_endpoint(client: TestClient, user_token_headers: dict) -> None:
+    client.get("/api/user/me", headers=user_token_headers)
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert (
+        'http_requests_total{app_name="test_project",method="GET",path="/api/user/me",status_code="200"}'
+        in response.text
+    )
+    assert "http_requests_in_progress" in response.text
+    assert 'http_request_sql_statements_bucket{le="1.0",method="GET",path="/api/user/me"}' in response.text
+
+
+def test_pool_metrics() -> None:
+    metered = create_engine(SQLALCHEMY_DATABASE_URL, poolclass=MeteredQueuePool, pool_size=1, max_overflow=1)
+    instrument_engine(metered)
+    waits_before = sample("db_pool_wait_seconds_count", driver="psycopg2")
+    try:
+        with metered.connect(), metered.connect():
+            assert sample("db_pool_checked_out", driver="psycopg2") == 2
+            assert sample("db_pool_overflow", driver="psycopg2") == 1
+        assert sample("db_pool_checked_out", driver="psycopg2") == 0
+        assert sample("db_pool_wait_seconds_count", driver="psycopg2") == waits_before + 2
+    finally:
+        metered.dispose()
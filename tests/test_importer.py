@@ -0,0 +1,102 @@
+import orjson
+import pytest
+
+from sqlalchemy.orm import Session
+
+from test_project.core.exceptions import PermissionException
+from test_project.core.serialization import CSVDecoder, NDJSONDecoder
+from test_project.core.settings import get_settings
+from test_project.crud.issue import issue as crud_issue
+from test_project.crud.project import project as crud_project
+from test_project.crud.user import user as crud_user
+from test_project.importer import import_stream
+from test_project.models.schemas import ExportFormat, ProjectCreate, UserCreate
+from tests.conftest import random_email, random_string
+
+
+async def chunks(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+def decode(decoder, data: bytes, size: int):
+    records = []
+    for i in range(0, len(data), size):
+        records.extend(decoder.feed(data[i:i + size]))
+    return records + decoder.close()
+
+
+@pytest.mark.parametrize("size", [1, 3, 1 << 16])
+def test_ndjson_decoder_chunk_boundaries(size: int) -> None:
+    data = '{"title": "ünïcode"}\r\n\n[1]\n{"title": broken\n{"title": "last"}'.encode()
+    assert decode(NDJSONDecoder(), data, size) == [
+        (1, {"title": "ünïcode"}),
+        (3, None),
+        (4, None),
+        (5, {"title": "last"}),
+    ]
+
+
+@pytest.mark.parametrize("size", [1, 5, 1 << 16])
+def test_csv_decoder_chunk_boundaries(size: int) -> None:
+    data = '﻿title,type\n"multi\nline, ""quoted""",Bug\n\nshort\nplain,Task\n"open,Bug\n'.encode()
+    assert decode(CSVDecoder(), data, size) == [
+        (2, {"title": 'multi\nline, "quoted"', "type": "Bug"}),
+        (5, None),
+        (6, {"title": "plain", "type": "Task"}),
+        (7, None),
+    ]
+
+
+def make_owner(db: Session):
+    user = crud_user.create(db, obj=UserCreate(email=random_email(), password=random_string()))
+    project = crud_project.create_with_owner(db=db, obj=ProjectCreate(title=random_string()), owner_id=user.id)
+    return user, project
+
+
+def upload(project_id: int, titles) -> bytes:
+    return b"".join(
+        orjson.dumps({"title": title, "type": "Bug", "status": "To Do", "project_id": project_id}) + b"\n"
+        for title in titles
+    )
+
+
+def test_import_stream_sync_session(loop, db: Session, random_project, monkeypatch) -> None:
+    monkeypatch.setattr(get_settings().importer, "chunk_size", 2)
+    monkeypatch.setattr(get_settings().importer, "max_errors", 1)
+    user, project = make_owner(db)
+    titles = [random_string() for _ in range(5)]
+    data = upload(project.id, titles) + upload(random_project.id, ["foreign"]) + b'{"title": 1}\n'
+
+    issue_import = loop.run_until_complete(
+        import_stream(db, chunks(data, 7), format=ExportFormat.ndjson, user=user)
+    )
+
+    assert (issue_import.imported, issue_import.failed) == (5, 2)
+    assert issue_import.errors == [
+        {"line": 6, "errors": [{"loc": ["project_id"], "msg": "Not enough permissions", "type": "value_error"}]}
+    ]
+    stored = crud_issue.list_by_project(db, project_id=project.id, limit=10)
+    assert [issue.title for issue in stored] == titles
+    assert all(issue.version == 1 and issue.is_deleted is False for issue in stored)
+
+
+def test_import_stream_async_session(loop, async_db, db: Session) -> None:
+    user, project = make_owner(db)
+    titles = ["", random_string()]
+    data = upload(project.id, titles) + upload(-1, ["missing"])
+
+    issue_import = loop.run_until_complete(
+        import_stream(async_db, chunks(data, 1 << 16), format=ExportFormat.ndjson, user=user)
+    )
+
+    assert (issue_import.imported, issue_import.failed) == (2, 1)
+    assert issue_import.errors[0]["errors"][0]["msg"] == "Project not found"
+    db.expire_all()
+    assert [issue.title for issue in crud_issue.list_by_project(db, project_id=project.id)] == titles
+
+
+def test_import_stream_admin(loop, db: Session) -> None:
+    admin = crud_user.create(db, obj=UserCreate(email=random_email(), password=random_string(), is_admin=True))
+    with pytest.raises(PermissionException):
+        loop.run_until_complete(import_stream(db, chunks(b"", 1), format=ExportFormat.csv, user=admin))
@@ -0,0 +1,413 @@
+import inspect
+import json
+import os
+import re
+import pytest
+
+from collections import Counter
+from sqlalchemy import event
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+from benchmarks.dataset import Dataset, PASSWORD, generate
+from test_project.crud.issue import issue as crud_issue
+from test_project.crud.issue_counter import issue_counter as crud_issue_counter
+from test_project.crud.outbox import outbox as crud_outbox
+from test_project.crud.project import project as crud_project
+from test_project.crud.user import user as crud_user
+from test_project.models.models import Issue, Project, User
+from test_project.models.schemas import IssueCreate, IssueUpdate, ProjectCreate, UserCreate
+from tests.conftest import engine
+
+CRUDS = {
+    "issue": crud_issue,
+    "issue_counter": crud_issue_counter,
+    "outbox": crud_outbox,
+    "project": crud_project,
+    "user": crud_user,
+}
+
+# the plans and timings every query is held to, rewritten by a run with RECORD_QUERY_PLANS=1
+RECORDED_PLANS = os.path.join(os.path.dirname(__file__), "query_plans.json")
+RECORD = os.environ.get("RECORD_QUERY_PLANS") == "1"
+# a query fails once it runs this many times slower than recorded, plus the slack for timer noise
+TIME_FACTOR = 3
+TIME_SLACK_MS = 5
+
+# statements EXPLAIN accepts; savepoints, locks and the EXPLAIN the estimated counts run are skipped
+PLANNABLE = re.compile(r"\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b", re.IGNORECASE)
+
+
+def member(id: int) -> User:
+    return User(id=id, is_admin=False)
+
+
+def new_issue(data: Dataset, title: str = "new issue") -> IssueCreate:
+    return IssueCreate(title=title, type="Bug", status="To Do", project_id=data.big_project)
+
+
+# query -> indexes its plans must use. Each one is called with a session inside the seeded transaction and
+# the generated Dataset; "big"/"small" and "heavy"/"light" aim it at both ends of the skew
+HOT_QUERIES: Dict[str, Tuple[Callable[[Session, Dataset], Any], set]] = {
+    "issue.retrieve": (lambda db, data: crud_issue.retrieve(db, id=data.big_project_issue), {"issue_pkey"}),
+    "issue.list": (lambda db, data: crud_issue.list(db), {"issue_pkey"}),
+    "issue.list after id": (lambda db, data: crud_issue.list(db, after_id=data.issues[0]), {"issue_pkey"}),
+    "issue.count": (lambda db, data: crud_issue.count(db), set()),
+    # a sixth of all issues: walking the primary key fills the page after a few hundred rows
+    "issue.list_by_project big": (
+        lambda db, data: crud_issue.list_by_project(db, project_id=data.big_project), {"issue_pkey"}
+    ),
+    "issue.list_by_project small": (
+        lambda db, data: crud_issue.list_by_project(db, project_id=data.small_project), {"ix_issue_project_id_id"}
+    ),
+    "issue.list_by_project after id": (
+        lambda db, data: crud_issue.list_by_project(db, project_id=data.big_project, after_id=data.big_project_issue),
+        {"issue_pkey"},
+    ),
+    "issue.count_by_project big": (
+        lambda db, data: crud_issue.count_by_project(db, project_id=data.big_project), set()
+    ),
+    "issue.count_by_project small": (
+        lambda db, data: crud_issue.count_by_project(db, project_id=data.small_project), {"ix_issue_project_id_id"}
+    ),
+    "issue.retrieve_authorized": (
+        lambda db, data: crud_issue.retrieve_authorized(db, id=data.big_project_issue, user=member(data.light_user)),
+        {"issue_pkey", "project_pkey"},
+    ),
+    "issue.list_by_project_authorized big": (
+        lambda db, data: crud_issue.list_by_project_authorized(
+            db, project_id=data.big_project, user=member(data.heavy_user)
+        ),
+        {"project_pkey", "ix_issue_project_id_id"},
+    ),
+    "issue.list_by_project_authorized small": (
+        lambda db, data: crud_issue.list_by_project_authorized(
+            db, project_id=data.small_project, user=member(data.light_user)
+        ),
+        {"project_pkey", "ix_issue_project_id_id"},
+    ),
+    # the heavy user sees a fifth of all issues, the same walk with a project lookup per issue
+    "issue.list_by_user_projects heavy": (
+        lambda db, data: crud_issue.list_by_user_projects(db, user_id=data.heavy_user), {"issue_pkey", "project_pkey"}
+    ),
+    "issue.list_by_user_projects light": (
+        lambda db, data: crud_issue.list_by_user_projects(db, user_id=data.light_user),
+        {"ix_project_owner_id_id", "ix_project_assigned_id_id", "ix_issue_project_id_id"},
+    ),
+    "issue.count_by_user_projects heavy": (
+        lambda db, data: crud_issue.count_by_user_projects(db, user_id=data.heavy_user),
+        {"ix_project_owner_id_id", "ix_project_assigned_id_id"},
+    ),
+    "issue.count_by_user_projects light": (
+        lambda db, data: crud_issue.count_by_user_projects(db, user_id=data.light_user),
+        {"ix_project_owner_id_id", "ix_project_assigned_id_id", "ix_issue_project_id_id"},
+    ),
+    "issue.search frequent": (lambda db, data: crud_issue.search(db, q=data.words[0]), set()),
+    "issue.search common": (lambda db, data: crud_issue.search(db, q=data.words[100]), {"ix_issue_title_search"}),
+    "issue.search rare": (lambda db, data: crud_issue.search(db, q=data.words[-1]), {"ix_issue_title_search"}),
+    # a member's few projects are the narrower side, matches are filtered on @@ from there
+    "issue.search visible": (
+        lambda db, data: crud_issue.search(db, q=data.words[0], user_id=data.light_user),
+        {"ix_project_owner_id_id", "ix_project_assigned_id_id", "ix_issue_project_id_id"},
+    ),
+    # streamed like the export endpoint does, so it is planned as a cursor: for its first rows, without a sort
+    "issue.export_statement": (
+        lambda db, data: db.execute(
+            crud_issue.export_statement(project_id=data.big_project, columns=[Issue.id, Issue.title])
+            .execution_options(stream_results=True)
+        ).all(),
+        {"issue_pkey"},
+    ),
+    "issue.create": (lambda db, data: crud_issue.create(db, obj=new_issue(data)), {"issue_pkey"}),
+    "issue.create_with_project": (
+        lambda db, data: crud_issue.create_with_project(db, obj=new_issue(data)), {"issue_pkey"}
+    ),
+    "issue.create_bulk": (
+        lambda db, data: crud_issue.create_bulk(db, objs=[new_issue(data, f"bulk {i}") for i in range(100)]), set()
+    ),
+    "issue.copy_create": (
+        lambda db, data: crud_issue.copy_create(db, objs=[new_issue(data, f"copy {i}") for i in range(100)]), set()
+    ),
+    "issue.update": (
+        lambda db, data: crud_issue.update(db, db_obj=Issue(id=data.big_project_issue), obj=IssueUpdate(title="new")),
+        {"issue_pkey"},
+    ),
+    "issue.update_by_id status": (
+        lambda db, data: crud_issue.update_by_id(db, id=data.big_project_issue, obj={"status": "Done"}),
+        {"issue_pkey"},
+    ),
+    "issue.delete": (lambda db, data: crud_issue.delete(db, id=data.big_project_issue), {"issue_pkey"}),
+    "issue.lock_for_transition": (
+        lambda db, data: crud_issue.lock_for_transition(db, ids=[data.big_project_issue]),
+        {"issue_pkey", "project_pkey"},
+    ),
+    "issue.transition_status": (
+        lambda db, data: crud_issue.transition_status(db, ids=[data.big_project_issue], status="Done"), {"issue_pkey"}
+    ),
+    "issue_counter.apply": (
+        lambda db, data: crud_issue_counter.apply(db, deltas=Counter({(data.big_project, "Done", "Bug"): 1})), set()
+    ),
+    "issue_counter.list_by_project": (
+        lambda db, data: crud_issue_counter.list_by_project(db, project_id=data.big_project), {"issue_counter_pkey"}
+    ),
+    "issue_counter.reconcile": (
+        lambda db, data: crud_issue_counter.reconcile(db, project_id=data.small_project), {"issue_counter_pkey"}
+    ),
+    "issue_counter.reconcile all": (lambda db, data: crud_issue_counter.reconcile(db), set()),
+    "outbox.add_many": (
+        lambda db, data: crud_outbox.add_many(db, recipient="user@example.com", payloads=[{"issue_id": 1}] * 10),
+        set(),
+    ),
+    "outbox.claim_batch": (
+        lambda db, data: crud_outbox.claim_batch(db, limit=100), {"ix_notification_outbox_pending"}
+    ),
+    "outbox.claim_digest_batch": (
+        lambda db, data: crud_outbox.claim_digest_batch(db, limit=100, window=60), {"ix_notification_outbox_pending"}
+    ),
+    "outbox.mark_sent": (lambda db, data: crud_outbox.mark_sent(db, ids=[1, 2]), {"notification_outbox_pkey"}),
+    "project.retrieve": (lambda db, data: crud_project.retrieve(db, id=data.big_project), {"project_pkey"}),
+    "project.retrieve_authorized": (
+        lambda db, data: crud_project.retrieve_authorized(db, id=data.big_project, user=member(data.light_user)),
+        {"project_pkey"},
+    ),
+    "project.list": (lambda db, data: crud_project.list(db), {"project_pkey"}),
+    "project.count": (lambda db, data: crud_project.count(db), set()),
+    "project.list_by_ids": (
+        lambda db, data: crud_project.list_by_ids(db, ids=[data.big_project, data.small_project]), {"project_pkey"}
+    ),
+    "project.list_by_user heavy": (
+        lambda db, data: crud_project.list_by_user(db, user_id=data.heavy_user), {"project_pkey"}
+    ),
+    "project.list_by_user light": (
+        lambda db, data: crud_project.list_by_user(db, user_id=data.light_user),
+        {"ix_project_owner_id_id", "ix_project_assigned_id_id"},
+    ),
+    "project.count_by_user heavy": (
+        lambda db, data: crud_project.count_by_user(db, user_id=data.heavy_user),
+        {"ix_project_owner_id_id", "ix_project_assigned_id_id"},
+    ),
+    "project.count_by_user light": (
+        lambda db, data: crud_project.count_by_user(db, user_id=data.light_user),
+        {"ix_project_owner_id_id", "ix_project_assigned_id_id"},
+    ),
+    "project.create": (lambda db, data: crud_project.create(db, obj=ProjectCreate(title="new")), {"project_pkey"}),
+    "project.create_with_owner": (
+        lambda db, data: crud_project.create_with_owner(db, obj=ProjectCreate(title="new"), owner_id=data.light_user),
+        {"project_pkey"},
+    ),
+    "project.update": (
+        lambda db, data: crud_project.update(db, db_obj=Project(id=data.big_project), obj={"title": "new"}),
+        {"project_pkey"},
+    ),
+    "project.update_by_id": (
+        lambda db, data: crud_project.update_by_id(db, id=data.small_project, obj={"title": "new"}), {"project_pkey"}
+    ),
+    "project.delete": (lambda db, data: crud_project.delete(db, id=data.small_project), {"project_pkey"}),
+    "project.delete_cascade": (lambda db, data: crud_project.delete_cascade(db, id=data.big_project), {"project_pkey"}),
+    "project.restore_cascade": (
+        lambda db, data: crud_project.restore_cascade(db, id=data.deleted_project),
+        {"project_pkey", "ix_issue_project_id_cascaded"},
+    ),
+    "user.retrieve": (lambda db, data: crud_user.retrieve(db, id=data.heavy_user), {"user_pkey"}),
+    "user.retrieve_by_email": (
+        lambda db, data: crud_user.retrieve_by_email(db, email=f"user{data.heavy_user}@example.com"), {"ix_user_email"}
+    ),
+    "user.authenticate": (
+        lambda db, data: crud_user.authenticate(db, email=f"user{data.heavy_user}@example.com", password=PASSWORD),
+        {"ix_user_email"},
+    ),
+    "user.list": (lambda db, data: crud_user.list(db), {"user_pkey"}),
+    "user.count": (lambda db, data: crud_user.count(db), set()),
+    "user.create": (
+        lambda db, data: crud_user.create(db, obj=UserCreate(email="new@example.com", password=PASSWORD)),
+        {"user_pkey"},
+    ),
+    "user.create_with_hash": (
+        lambda db, data: crud_user.create_with_hash(
+            db, obj=UserCreate(email="new@example.com", password=PASSWORD), hashed_password=""
+        ),
+        {"user_pkey"},
+    ),
+    "user.update": (
+        lambda db, data: crud_user.update(db, db_obj=User(id=data.light_user), obj={"name": "new"}), {"user_pkey"}
+    ),
+    "user.update_by_id": (
+        lambda db, data: crud_user.update_by_id(db, id=data.light_user, obj={"name": "new"}), {"user_pkey"}
+    ),
+    "user.delete": (lambda db, data: crud_user.delete(db, id=data.light_user), {"user_pkey"}),
+}
+
+# query -> why its plan may read a whole table
+SEQ_SCANS_ALLOWED = {
+    "issue.count": "the capped count stops after exact_count_limit rows",
+    "issue.count_by_project big": "the capped count stops after exact_count_limit of a sixth of all issues",
+    "issue.count_by_user_projects heavy": "the capped count stops after exact_count_limit of a fifth of all issues",
+    "issue.search frequent": "a word in half of all titles: every match is ranked, reading them all is cheaper",
+    # maintenance only; an index for it would be updated by every issue write
+    "issue_counter.reconcile": "counts issues deleted with their project, which the partial issue indexes leave out",
+    "issue_counter.reconcile all": "rebuilds every counter from every issue",
+    "project.count": "the capped count stops after exact_count_limit rows",
+    "project.delete_cascade": "updates a sixth of all issues, reading them all is cheaper",
+    "user.count": "the capped count stops after exact_count_limit rows",
+}
+
+# CRUD methods taking a session that have no query of their own to plan
+NOT_PLANNED = {
+    "outbox.add": "stages a row on the session, the caller's commit writes it",
+    "outbox.mark_failed": "sets attributes on a claimed row, the caller's commit writes them",
+}
+
+
+def restart_savepoint(db: Session, transaction: Any) -> None:
+    # a commit in the code under test releases the session's savepoint; the next one opens right away,
+    # so nothing ever reaches the seeded transaction
+    if transaction.nested and not transaction._parent.nested:
+        db.begin_nested()
+
+
+def capture_statements(
+    conn: Connection, data: Dataset, query: Callable[[Session, Dataset], Any]
+) -> List[Tuple[str, Any]]:
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if PLANNABLE.match(statement):
+            if context.execution_options.get("stream_results"):
+                # a server-side cursor is planned for its first rows
+                statement = f"DECLARE plan_cursor NO SCROLL CURSOR FOR {statement}"
+            # a multi-row write is planned once, with its first row
+            statements.append((statement, parameters[0] if executemany else parameters))
+
+    # whatever the query writes and commits is rolled back with this savepoint
+    savepoint = conn.begin_nested()
+    db = Session(bind=conn, expire_on_commit=False)
+    db.begin_nested()
+    event.listen(db, "after_transaction_end", restart_savepoint)
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        query(db, data)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+        db.close()
+        if savepoint.is_active:
+            savepoint.rollback()
+    return statements
+
+
+def plan_nodes(plan: Dict) -> Iterator[Dict]:
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def plan_shape(plan: Dict, depth: int = 0) -> Iterator[str]:
+    # node types and the relations and indexes they read; estimates and costs are left out
+    line = "  " * depth + plan["Node Type"]
+    if "Relation Name" in plan:
+        line += f" on {plan['Relation Name']}"
+    if "Index Name" in plan:
+        line += f" using {plan['Index Name']}"
+    yield line
+    for child in plan.get("Plans", []):
+        yield from plan_shape(child, depth + 1)
+
+
+def explain(conn: Connection, statements: List[Tuple[str, Any]], runs: int = 3) -> Tuple[List[Dict], float]:
+    """
+    The plans of the statements and their fastest total execution time in ms. They run in order, each
+    seeing what the ones before it wrote, and their writes are rolled back.
+    """
+    times = []
+    for _ in range(runs):
+        plans, ms = [], 0.0
+        savepoint = conn.begin_nested()
+        try:
+            for statement, parameters in statements:
+                explained = conn.exec_driver_sql(f"EXPLAIN (ANALYZE, FORMAT JSON) {statement}", parameters).scalar()[0]
+                plans.append(explained["Plan"])
+                ms += explained["Execution Time"]
+        finally:
+            savepoint.rollback()
+        times.append(ms)
+    return plans, min(times)
+
+
+def vacuum() -> None:
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        # FULL rewrites the tables compactly, a plain VACUUM keeps the pages it frees
+        conn.exec_driver_sql('VACUUM FULL ANALYZE "user", project, issue, issue_counter, notification_outbox')
+
+
+# users, projects, issues and notifications at a tenth of production, skewed like it; the ids stay clear
+# of the rows other tests create and everything is rolled back afterwards
+@pytest.fixture(scope="module")
+def seeded():
+    # rows other tests deleted or rolled back leave the heap bloated, and so do the ones rolled back below;
+    # the planner costs a table by its pages, so either would change the plans
+    vacuum()
+    with engine.connect() as conn:
+        transaction = conn.begin()
+        # ANALYZE then reads every row instead of a random sample, so the plans are the same every run
+        conn.exec_driver_sql("SET LOCAL default_statistics_target = 1000")
+        data = generate(conn, users=1000, projects=10000, issues=100000, notifications=50000, first_id=1000000)
+        try:
+            yield conn, data
+        finally:
+            transaction.rollback()
+    vacuum()
+
+
+@pytest.fixture(scope="module")
+def recorded_plans():
+    try:
+        with open(RECORDED_PLANS) as f:
+            recorded = json.load(f)
+    except FileNotFoundError:
+        recorded = {}
+    observed = {}
+    yield recorded, observed
+    if RECORD:
+        with open(RECORDED_PLANS, "w") as f:
+            json.dump({**recorded, **observed}, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+
+def test_every_crud_query_is_planned() -> None:
+    methods = {
+        f"{name}.{method}"
+        for name, crud in CRUDS.items()
+        for method, fn in inspect.getmembers(type(crud), inspect.isfunction)
+        if not method.startswith("_") and "db" in inspect.signature(fn).parameters
+    }
+    planned = {name.split(" ")[0] for name in HOT_QUERIES}
+    assert methods - planned - NOT_PLANNED.keys() == set()
+
+
+@pytest.mark.parametrize("name", HOT_QUERIES)
+def test_query_plan(seeded: Tuple[Connection, Dataset], recorded_plans: Tuple[Dict, Dict], name: str) -> None:
+    conn, data = seeded
+    recorded, observed = recorded_plans
+    query, expected_indexes = HOT_QUERIES[name]
+    statements = capture_statements(conn, data, query)
+
+    assert statements
+    plans, total_ms = explain(conn, statements)
+    used_indexes = set()
+    for (statement, _), plan in zip(statements, plans):
+        nodes = list(plan_nodes(plan))
+        if name not in SEQ_SCANS_ALLOWED:
+            assert [node["Relation Name"] for node in nodes if node["Node Type"] == "Seq Scan"] == [], statement
+        used_indexes.update(node["Index Name"] for node in nodes if "Index Name" in node)
+    assert expected_indexes <= used_indexes
+
+    shapes = [list(plan_shape(plan)) for plan in plans]
+
+    observed[name] = {"plans": shapes, "ms": round(total_ms, 3)}
+    if RECORD:
+        return
+    assert name in recorded, "no recorded plan, run the test with RECORD_QUERY_PLANS=1"
+    if name not in SEQ_SCANS_ALLOWED:
+        # an allowed scan costs about what an index walk would, which one wins depends on the table's state
+        assert shapes == recorded[name]["plans"], "plan changed, rerun with RECORD_QUERY_PLANS=1 if that is intended"
+    assert total_ms <= recorded[name]["ms"] * TIME_FACTOR + TIME_SLACK_MS, f"{total_ms:.2f}ms"
@@ -0,0 +1,128 @@
+from datetime import datetime, timezone
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from test_project.core.exceptions import MailCircuitOpenException
+from test_project.core.settings import get_settings
+from test_project.crud.outbox import async_outbox as async_crud_outbox, outbox as crud_outbox
+from test_project.models.models import NotificationOutbox as model_outbox
+from test_project.models.schemas import BULK_MAX_ITEMS
+from test_project.worker import collapse_transitions, process_batch
+from tests.conftest import random_email
+
+
+class FakeMail:
+    def __init__(self, error: Exception = None):
+        self.error = error
+        self.delivered = []
+
+    def notification_message(self, user_email: str, data_mail: dict) -> str:
+        return f"{user_email}:{data_mail['issue_id']}"
+
+    def digest_message(self, user_email: str, data_mails: list) -> str:
+        return f"{user_email}:" + ",".join(
+            f"{data_mail['issue_id']}:{data_mail['from_status']}->{data_mail['to_status']}" for data_mail in data_mails
+        )
+
+    def deliver(self, messages):
+        if self.error:
+            raise self.error
+        self.delivered.extend(messages)
+
+
+def transition(issue_id: int, from_status: str, to_status: str) -> dict:
+    return {"issue_id": issue_id, "project_id": 1, "from_status": from_status, "to_status": to_status}
+
+
+def add_notification(db: Session, recipient: str, issue_id: int = 1) -> model_outbox:
+    crud_outbox.add(db, recipient=recipient, payload=transition(issue_id, "To Do", "Done"))
+    db.commit()
+    return db.query(model_outbox).filter(model_outbox.recipient == recipient).one()
+
+
+def drain(db: Session, sender: FakeMail) -> None:
+    while process_batch(db, sender):
+        pass
+
+
+def test_add_many_max_batch(loop, async_db, db: Session) -> None:
+    # one notification per issue of a full bulk transition, past what one statement may bind, on either driver
+    recipient = random_email()
+    payloads = [transition(issue_id, "To Do", "Done") for issue_id in range(BULK_MAX_ITEMS)]
+    try:
+        crud_outbox.add_many(db, recipient=recipient, payloads=payloads)
+        loop.run_until_complete(async_crud_outbox.add_many(async_db, recipient=recipient, payloads=payloads))
+        queued = select(func.count()).where(model_outbox.recipient == recipient)
+        assert db.scalar(queued) == BULK_MAX_ITEMS
+        assert loop.run_until_complete(async_db.scalar(queued)) == BULK_MAX_ITEMS
+    finally:
+        # nothing committed, the worker tests below drain the queue
+        db.rollback()
+        loop.run_until_complete(async_db.rollback())
+
+
+def test_process_batch_marks_sent(db: Session) -> None:
+    recipient = random_email()
+    row = add_notification(db, recipient)
+    sender = FakeMail()
+
+    drain(db, sender)
+
+    db.refresh(row)
+    assert f"{recipient}:1" in sender.delivered
+    assert row.status == "sent"
+    assert row.sent_at is not None
+
+
+def test_process_batch_backs_off_on_failure(db: Session) -> None:
+    row = add_notification(db, random_email())
+
+    drain(db, FakeMail(error=ConnectionRefusedError()))
+
+    db.refresh(row)
+    assert row.status == "pending"
+    assert row.attempts == 1
+    assert row.available_at > datetime.now(timezone.utc)
+    assert "ConnectionRefusedError" in row.last_error
+
+
+def test_process_batch_keeps_attempts_while_circuit_open(db: Session) -> None:
+    row = add_notification(db, random_email())
+
+    process_batch(db, FakeMail(error=MailCircuitOpenException()))
+
+    db.refresh(row)
+    assert row.status == "pending"
+    assert row.attempts == 0
+
+
+def test_collapse_transitions() -> None:
+    collapsed = collapse_transitions([
+        transition(1, "To Do", "In Progress"),
+        transition(2, "To Do", "Done"),
+        transition(1, "In Progress", "Done"),
+        transition(3, "Done", "To Do"),
+        transition(3, "To Do", "Done"),
+    ])
+
+    assert collapsed == [transition(1, "To Do", "Done"), transition(2, "To Do", "Done")]
+
+
+def test_process_batch_sends_digest(db: Session, monkeypatch) -> None:
+    monkeypatch.setattr(get_settings().outbox, "digest", True)
+    monkeypatch.setattr(get_settings().outbox, "digest_window", 0)
+    recipient = random_email()
+    for payload in [transition(1, "To Do", "In Progress"), transition(1, "In Progress", "Done"),
+                    transition(2, "Done", "To Do"), transition(2, "To Do", "Done")]:
+        crud_outbox.add(db, recipient=recipient, payload=payload)
+    db.commit()
+    sender = FakeMail()
+
+    drain(db, sender)
+
+    assert [message for message in sender.delivered if message.startswith(recipient)] == [
+        f"{recipient}:1:To Do->Done"
+    ]
+    rows = db.query(model_outbox).filter(model_outbox.recipient == recipient).all()
+    assert len(rows) == 4
+    assert all(row.status == "sent" for row in rows)
@@ -0,0 +1,7 @@
+import logging
+
+from test_project.worker import run
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    run()